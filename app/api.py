@@ -0,0 +1,350 @@
+"""
+HTTP API (JSON) поверх сервисного слоя для интеграций (ERP, BI).
+
+Запуск:
+    python app/api.py --port 8502
+
+Эндпоинты:
+    GET /api/parts, /api/equipment, /api/workshops, /api/replacement-types, /api/replacements
+        ?offset=&limit=            - постраничный список
+        ?format=ndjson             - потоковая выгрузка всей таблицы (или Accept: application/x-ndjson)
+        /api/replacements?format=ndjson&archive=1 - выгрузка всей истории замен вместе с архивом
+    GET /api/<ресурс>/<id>         - одна запись
+    GET /api/procurement-plan      ?equipment_id=&only_critical=1&offset=&limit=&format=ndjson
+    GET /api/dashboard             ?as_of=YYYY-MM-DD - агрегаты Dashboard (на дату)
+    GET /api/forecast              ?horizon_days=180&trials=10000&seed=0&offset=&limit= - прогноз потребности (P50/P90)
+    POST /api/scenario             ?include_plan=1 - сценарий "что если" (тело см. ScenarioHandler)
+    GET /api/schedule              ?horizon_days=91&window_days=7&improve=1 - расписание замен по мастерским
+
+Ответы снабжаются ETag по версиям данных (таблица data_version), поэтому повторный
+запрос с If-None-Match получает 304 без обращения к данным.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+from datetime import date, datetime
+from enum import Enum
+
+import numpy as np
+import tornado.ioloop
+import tornado.web
+
+from core.db import SessionLocal, init_db
+from core.models import COMPUTED_TABLES
+from core.scenarios import ScenarioEngine
+from core.scheduler import DEFAULT_HORIZON_DAYS, WINDOW_DAYS
+from core.services import CRITICAL_ZONES, ServiceContainer
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NDJSON_BATCH_SIZE = 1000
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# ресурс -> (атрибут ServiceContainer, таблицы, от которых зависит ответ)
+RESOURCES = {
+    "parts": ("parts", ("part",)),
+    "equipment": ("equipment", ("equipment",)),
+    "workshops": ("workshops", ("workshop",)),
+    "replacement-types": ("replacement_types", ("replacement_type",)),
+    "replacements": ("replacements", ("replacement_log",)),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def to_dict(obj) -> dict:
+    """Сериализация ORM-объекта по колонкам его таблицы."""
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+def dumps(data) -> str:
+    return json.dumps(data, default=_json_default, ensure_ascii=False)
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    """Сессия БД на запрос + ETag по версиям данных."""
+
+    def prepare(self):
+        self.db = SessionLocal()
+        self.services = ServiceContainer(self.db)
+
+    def on_finish(self):
+        self.db.close()
+
+    def write_error(self, status_code, **kwargs):
+        message = self._reason
+        exc_info = kwargs.get("exc_info")
+        if exc_info and isinstance(exc_info[1], tornado.web.HTTPError) and exc_info[1].log_message:
+            message = exc_info[1].log_message
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.finish(dumps({"error": message}))
+
+    async def run(self, fn, *args, **kwargs):
+        """Синхронные запросы к БД выполняются вне IOLoop."""
+        return await tornado.ioloop.IOLoop.current().run_in_executor(None, lambda: fn(*args, **kwargs))
+
+    async def check_etag(self, tables) -> bool:
+        """
+        Выставляет ETag по версиям таблиц, текущей дате (износ зависит от неё) и URI.
+        Возвращает True, если клиент уже имеет актуальную версию (ответ 304 отправлен).
+        """
+        versions = await self.run(self.services.data_versions.get, *tables)
+        raw = dumps([sorted(versions.items()), date.today(), self.request.uri, self.request.headers.get("Accept")])
+        etag = '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+        self.set_header("ETag", etag)
+        if self.check_etag_header():
+            self.set_status(304)
+            self.finish()
+            return True
+        return False
+
+    def compute_etag(self):
+        # ETag выставляется вручную в check_etag, хэш тела ответа не нужен
+        return None
+
+    def wants_ndjson(self) -> bool:
+        return (
+            self.get_query_argument("format", None) == "ndjson"
+            or NDJSON_CONTENT_TYPE in self.request.headers.get("Accept", "")
+        )
+
+    def get_int_argument(self, name, default=None, minimum=0, maximum=None):
+        raw = self.get_query_argument(name, None)
+        if raw is None:
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            raise tornado.web.HTTPError(400, f"Параметр {name} должен быть целым числом")
+        if value < minimum:
+            raise tornado.web.HTTPError(400, f"Параметр {name} должен быть >= {minimum}")
+        if maximum is not None:
+            value = min(value, maximum)
+        return value
+
+    def write_json(self, data):
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.finish(dumps(data))
+
+    async def stream_ndjson(self, batches):
+        """Потоковая отдача: каждая пачка строк сериализуется и сбрасывается клиенту отдельно."""
+        self.set_header("Content-Type", f"{NDJSON_CONTENT_TYPE}; charset=UTF-8")
+        iterator = iter(batches)
+        while True:
+            batch = await self.run(next, iterator, None)
+            if batch is None:
+                break
+            self.write("".join(dumps(item) + "\n" for item in batch))
+            await self.flush()
+        self.finish()
+
+
+class ResourceListHandler(BaseHandler):
+    async def get(self, resource):
+        attr, tables = RESOURCES[resource]
+        if await self.check_etag(tables):
+            return
+        service = getattr(self.services, attr)
+
+        if self.wants_ndjson():
+            if resource == "replacements" and self.get_query_argument("archive", "0") in ("1", "true"):
+                await self.stream_ndjson(service.history_batches(NDJSON_BATCH_SIZE))
+                return
+            batches = ([to_dict(obj) for obj in batch] for batch in service.iter_batches(NDJSON_BATCH_SIZE))
+            await self.stream_ndjson(batches)
+            return
+
+        offset = self.get_int_argument("offset", 0)
+        limit = self.get_int_argument("limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+
+        def load():
+            return [to_dict(obj) for obj in service.list(offset=offset, limit=limit)], service.count()
+
+        items, total = await self.run(load)
+        self.write_json({"items": items, "offset": offset, "limit": limit, "total": total})
+
+
+class ResourceItemHandler(BaseHandler):
+    async def get(self, resource, obj_id):
+        attr, tables = RESOURCES[resource]
+        if await self.check_etag(tables):
+            return
+        service = getattr(self.services, attr)
+
+        def load():
+            obj = service.get(int(obj_id))
+            return to_dict(obj) if obj else None
+
+        item = await self.run(load)
+        if item is None:
+            raise tornado.web.HTTPError(404, "Запись не найдена")
+        self.write_json(item)
+
+
+class ProcurementPlanHandler(BaseHandler):
+    async def get(self):
+        if await self.check_etag(COMPUTED_TABLES):
+            return
+        equipment_id = self.get_int_argument("equipment_id")
+        only_critical = self.get_query_argument("only_critical", "0") in ("1", "true")
+        zones = self.get_query_arguments("zone") or (CRITICAL_ZONES if only_critical else None)
+        horizon = self.get_int_argument("horizon")
+
+        filters = {"equipment_id": equipment_id, "zones": zones, "horizon": horizon}
+        procurement = self.services.procurement
+
+        if self.wants_ndjson():
+            # Страницы плана читаются по мере отправки; первая - до заголовков ответа,
+            # чтобы ошибка фильтра вернулась как 400
+            batches = procurement.plan_batches(NDJSON_BATCH_SIZE, **filters)
+            try:
+                first = await self.run(next, batches, [])
+            except ValueError as e:
+                raise tornado.web.HTTPError(400, str(e))
+            await self.stream_ndjson(itertools.chain([first], batches))
+            return
+
+        offset = self.get_int_argument("offset", 0)
+        limit = self.get_int_argument("limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+
+        # Страница и число строк - в SQL: износ досчитывается только для строк страницы
+        def load():
+            return procurement.plan(offset=offset, limit=limit, **filters), procurement.plan_count(**filters)
+
+        try:
+            items, total = await self.run(load)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e))
+        self.write_json({"items": items, "offset": offset, "limit": limit, "total": total})
+
+
+class DashboardHandler(BaseHandler):
+    async def get(self):
+        if await self.check_etag(COMPUTED_TABLES):
+            return
+        raw_as_of = self.get_query_argument("as_of", None)
+        try:
+            as_of = date.fromisoformat(raw_as_of) if raw_as_of else None
+        except ValueError:
+            raise tornado.web.HTTPError(400, "Параметр as_of должен быть датой в формате YYYY-MM-DD")
+        self.write_json(await self.run(self.services.dashboard.summary, as_of))
+
+
+class ForecastHandler(BaseHandler):
+    async def get(self):
+        if await self.check_etag(COMPUTED_TABLES):
+            return
+        horizon_days = self.get_int_argument("horizon_days", 180, minimum=1, maximum=730)
+        trials = self.get_int_argument("trials", 10_000, minimum=100, maximum=100_000)
+        # Фиксированный seed по умолчанию: одинаковый запрос даёт одинаковый ответ (и ETag)
+        seed = self.get_int_argument("seed", 0)
+
+        forecast = self.services.forecast
+        if self.wants_ndjson():
+            # Симуляция - один раз, строки собираются и отправляются пачками
+            await self.stream_ndjson(
+                forecast.demand_forecast_batches(NDJSON_BATCH_SIZE, horizon_days=horizon_days, trials=trials, seed=seed)
+            )
+            return
+
+        offset = self.get_int_argument("offset", 0)
+        limit = self.get_int_argument("limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        # Строки ответа собираются только для окон страницы
+        items, total = await self.run(
+            forecast.demand_forecast_page, horizon_days=horizon_days, trials=trials, seed=seed,
+            offset=offset, limit=limit,
+        )
+        self.write_json({"items": items, "offset": offset, "limit": limit, "total": total})
+
+
+class ScenarioHandler(BaseHandler):
+    """
+    Тело запроса (JSON):
+        {"parts": {"<id>": {"lead_time_days": 60, "useful_life_days": 300, "qty_in_stock": 2,
+                            "purchase_days": [5, 20]}},
+         "equipment": {"<id>": {...}},
+         "purchase_days": [10, 25]}
+    Ответ: сводка и изменившиеся установки (и полный план при include_plan=1). БД не изменяется.
+    """
+
+    async def post(self):
+        try:
+            body = json.loads(self.request.body or b"{}")
+            parts = {int(k): v for k, v in (body.get("parts") or {}).items()}
+            equipment = {int(k): v for k, v in (body.get("equipment") or {}).items()}
+        except (ValueError, AttributeError):
+            raise tornado.web.HTTPError(400, "Тело запроса должно быть JSON-объектом сценария")
+        include_plan = self.get_query_argument("include_plan", "0") in ("1", "true")
+
+        def run():
+            engine = ScenarioEngine.from_services(self.services)
+            return engine.run(parts=parts, equipment=equipment, purchase_days=body.get("purchase_days"))
+
+        try:
+            result = await self.run(run)
+        except (ValueError, TypeError) as e:
+            raise tornado.web.HTTPError(400, str(e))
+        response = {"summary": result.summary, "diff": result.diff.to_dict("records")}
+        if include_plan:
+            response["plan"] = result.plan.to_dict("records")
+        self.write_json(response)
+
+
+class ScheduleHandler(BaseHandler):
+    """Ответ: сводка, замены по мастерским и дням, замены без места и загрузка мастерских по дням."""
+
+    async def get(self):
+        if await self.check_etag(COMPUTED_TABLES):
+            return
+        horizon_days = self.get_int_argument("horizon_days", DEFAULT_HORIZON_DAYS, minimum=1, maximum=365)
+        window_days = self.get_int_argument("window_days", WINDOW_DAYS)
+        improve = self.get_query_argument("improve", "1") in ("1", "true")
+
+        result = await self.run(
+            self.services.schedule.schedule, horizon_days=horizon_days, improve=improve, window_days=window_days
+        )
+        self.write_json({
+            "summary": result.summary,
+            "assignments": result.assignments.to_dict("records"),
+            "unscheduled": result.unscheduled.to_dict("records"),
+            "calendar": result.calendar.to_dict("records"),
+        })
+
+
+def make_app() -> tornado.web.Application:
+    resources = "|".join(RESOURCES)
+    return tornado.web.Application([
+        (rf"/api/({resources})", ResourceListHandler),
+        (rf"/api/({resources})/(\d+)", ResourceItemHandler),
+        (r"/api/procurement-plan", ProcurementPlanHandler),
+        (r"/api/dashboard", DashboardHandler),
+        (r"/api/forecast", ForecastHandler),
+        (r"/api/scenario", ScenarioHandler),
+        (r"/api/schedule", ScheduleHandler),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API журнала запасных частей")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    init_db()
+    app = make_app()
+    app.listen(args.port, address=args.host)
+    print(f"API доступно по адресу http://{args.host}:{args.port}/api/")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == "__main__":
+    main()
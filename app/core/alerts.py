@@ -0,0 +1,178 @@
+"""
+Планировщик оповещений о событиях незаменённых установок.
+
+События - переход в жёлтую и красную зону и крайний срок заявки на закупку - берутся
+из предрасчитанной таблицы zone_transition и хранятся в куче по дате. Планировщик
+спит до ближайшего события (или до очередной проверки изменений), выдаёт наступившие
+события в alert_outbox (и, при необходимости, в файл) и снова засыпает.
+
+Изменения подхватываются инкрементально: каждая перезапись строк zone_transition
+получает новый номер revision, и планировщик читает только строки с номером больше
+уже прочитанного. Устаревшие события из кучи не удаляются, а отбрасываются при
+извлечении: событие действительно, только если строка установки всё ещё существует
+с тем же revision (установку могли закрыть или пересчитать). Полного перечитывания
+журнала замен нет.
+"""
+import heapq
+import json
+import time
+from datetime import date, datetime
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import AlertOutbox, ZoneTransition
+
+# Вид события -> колонка zone_transition с его датой
+ALERT_KINDS = {
+    "yellow": ZoneTransition.yellow_date,
+    "red": ZoneTransition.red_date,
+    "latest_init": ZoneTransition.latest_init_date,
+}
+# Ограничение числа параметров в одном запросе IN (...)
+VALIDATE_BATCH_SIZE = 500
+# Куча чистится от устаревших событий, когда их становится больше действительных
+COMPACT_RATIO = 2
+
+
+class FileSink:
+    """Дописывает оповещения в файл по одному JSON на строку."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, alerts):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, default=str, ensure_ascii=False) + "\n")
+
+
+class AlertScheduler:
+    """
+    Куча ближайших событий по всем незаменённым установкам.
+
+    Элемент кучи - (дата события (ordinal), вид, id установки, revision строки).
+    Оповещения всегда записываются в alert_outbox; уникальный ключ (установка, вид,
+    дата) делает повторную выдачу (после перезапуска или пересчёта) безопасной.
+    Дополнительные получатели (sinks) получают только новые оповещения.
+    """
+
+    def __init__(self, db: Session, sinks=()):
+        self.db = db
+        self.sinks = list(sinks)
+        self.heap = []
+        self.revision = -1
+        # Последний прочитанный revision по установке
+        self.latest = {}
+
+    def refresh(self) -> int:
+        """Загружает в кучу события строк, изменившихся с прошлого вызова. Возвращает число строк."""
+        rows = self.db.execute(
+            select(ZoneTransition.replacement_id, ZoneTransition.revision, *ALERT_KINDS.values())
+            .where(ZoneTransition.revision > self.revision)
+        ).all()
+        for replacement_id, revision, *dates in rows:
+            for kind, event_date in zip(ALERT_KINDS, dates):
+                heapq.heappush(self.heap, (event_date.toordinal(), kind, replacement_id, revision))
+            self.latest[replacement_id] = revision
+            self.revision = max(self.revision, revision)
+        if len(self.heap) > (COMPACT_RATIO + 1) * len(ALERT_KINDS) * len(self.latest):
+            self._compact()
+        return len(rows)
+
+    def _compact(self):
+        """Удаляет события, перекрытые более поздним пересчётом той же установки."""
+        self.heap = [item for item in self.heap if self.latest.get(item[2]) == item[3]]
+        heapq.heapify(self.heap)
+
+    def next_event_date(self) -> date | None:
+        return date.fromordinal(self.heap[0][0]) if self.heap else None
+
+    def _pop_due(self, today: date):
+        due = []
+        while self.heap and self.heap[0][0] <= today.toordinal():
+            due.append(heapq.heappop(self.heap))
+        return due
+
+    def _current_rows(self, replacement_ids):
+        """Актуальные строки zone_transition по id установок (для проверки событий)."""
+        ids = sorted(set(replacement_ids))
+        current = {}
+        for i in range(0, len(ids), VALIDATE_BATCH_SIZE):
+            for row in self.db.execute(
+                select(ZoneTransition.replacement_id, ZoneTransition.revision,
+                       ZoneTransition.part_id, ZoneTransition.equipment_id)
+                .where(ZoneTransition.replacement_id.in_(ids[i:i + VALIDATE_BATCH_SIZE]))
+            ):
+                current[row.replacement_id] = row
+        return current
+
+    def emit_due(self, today: date | None = None) -> list[dict]:
+        """Выдаёт наступившие (на today) действительные события. Возвращает новые оповещения."""
+        today = today or date.today()
+        due = self._pop_due(today)
+        if not due:
+            return []
+
+        current = self._current_rows(replacement_id for _, _, replacement_id, _ in due)
+        now = datetime.now()
+        alerts = []
+        for ordinal, kind, replacement_id, revision in due:
+            row = current.get(replacement_id)
+            if row is None:
+                # Установка закрыта или удалена
+                self.latest.pop(replacement_id, None)
+                continue
+            if row.revision != revision:
+                continue
+            alerts.append({
+                "replacement_id": replacement_id,
+                "part_id": row.part_id,
+                "equipment_id": row.equipment_id,
+                "kind": kind,
+                "event_date": date.fromordinal(ordinal),
+                "created_at": now,
+            })
+        if not alerts:
+            return []
+
+        inserted = self.db.execute(
+            insert(AlertOutbox)
+            .on_conflict_do_nothing(index_elements=["replacement_id", "kind", "event_date"])
+            .returning(AlertOutbox.replacement_id, AlertOutbox.kind, AlertOutbox.event_date),
+            alerts,
+        ).all()
+        self.db.commit()
+
+        new_keys = {tuple(row) for row in inserted}
+        new_alerts = [a for a in alerts if (a["replacement_id"], a["kind"], a["event_date"]) in new_keys]
+        if new_alerts:
+            for sink in self.sinks:
+                sink(new_alerts)
+        return new_alerts
+
+    def seconds_until_next_event(self, now: datetime | None = None) -> float | None:
+        """Сколько спать до начала дня ближайшего события (0, если оно уже наступило)."""
+        next_date = self.next_event_date()
+        if next_date is None:
+            return None
+        now = now or datetime.now()
+        return max(0.0, (datetime.combine(next_date, datetime.min.time()) - now).total_seconds())
+
+    def run(self, poll_seconds: float = 60, once: bool = False, on_emit=None):
+        """
+        Основной цикл. Между событиями раз в poll_seconds проверяются изменения
+        (индексный запрос по revision) - кучу при этом не нужно перестраивать.
+        """
+        while True:
+            self.refresh()
+            alerts = self.emit_due()
+            # Завершаем транзакцию чтения, чтобы следующая проверка видела новые фиксации
+            self.db.rollback()
+            if on_emit and alerts:
+                on_emit(alerts)
+            if once:
+                return
+            wait = self.seconds_until_next_event()
+            time.sleep(poll_seconds if wait is None else min(poll_seconds, max(wait, 1.0)))
@@ -0,0 +1,71 @@
+"""
+Архивирование закрытой истории замен.
+
+Большая часть журнала - закрытые записи (есть дата замены), но горячие запросы
+(списки, Dashboard, план закупки) работают только с незаменёнными установками и
+последними заменами. Закрытые записи старше ARCHIVE_AGE_DAYS переносятся в таблицу
+replacement_log_archive с теми же id и колонками: горячая таблица и её индексы
+остаются небольшими.
+
+Запросы, которым нужна вся история (история по оборудованию, фактические сроки
+службы, снимки износа, выгрузки), читают подзапрос replacement_history() -
+объединение горячей и архивной таблиц с одинаковыми колонками.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .models import ReplacementLog, ReplacementLogArchive
+
+# Закрытые записи старше этого срока (по дате замены) переносятся в архив
+ARCHIVE_AGE_DAYS = 730
+
+HISTORY_COLUMNS = (
+    "id",
+    "part_id",
+    "equipment_id",
+    "unit_serial_number",
+    "workshop_id",
+    "replacement_type_id",
+    "installation_date",
+    "replacement_date",
+    "comments",
+    "closed_by_retire",
+)
+
+
+def replacement_history(name: str = "replacement_history"):
+    """
+    Подзапрос со всей историей замен: горячая таблица и архив (UNION ALL).
+    Колонка is_archived отличает архивные записи.
+    """
+    hot = select(*(ReplacementLog.__table__.c[column] for column in HISTORY_COLUMNS), literal(False).label("is_archived"))
+    cold = select(*(ReplacementLogArchive.__table__.c[column] for column in HISTORY_COLUMNS), literal(True).label("is_archived"))
+    return union_all(hot, cold).subquery(name)
+
+
+def archive_closed(session: Session, older_than_days: int = ARCHIVE_AGE_DAYS, today: date | None = None) -> int:
+    """
+    Переносит в архив закрытые записи, заменённые раньше чем older_than_days дней
+    назад. Копирование и удаление выполняются в одной транзакции (фиксирует вызывающий).
+    Возвращает число перенесённых записей. id архивных записей не выдаются повторно:
+    replacement_log объявлена с AUTOINCREMENT.
+    """
+    today = today or date.today()
+    cutoff = today - timedelta(days=older_than_days)
+    condition = (
+        ReplacementLog.replacement_date.is_not(None),
+        ReplacementLog.replacement_date < cutoff,
+    )
+
+    moved = session.execute(
+        insert(ReplacementLogArchive).from_select(
+            [*HISTORY_COLUMNS, "archived_at"],
+            select(*(ReplacementLog.__table__.c[column] for column in HISTORY_COLUMNS), literal(today))
+            .where(*condition),
+        )
+    ).rowcount
+    if moved:
+        session.execute(delete(ReplacementLog).where(*condition))
+    return moved
@@ -1,14 +1,106 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func, inspect, select
 from sqlalchemy.orm import sessionmaker
-from .models import Base
+from .models import Base, ReplacementLogArchive
+from .search import backfill_search_keys
+from .stock import backfill_stock_ledger
+from .zones import backfill_zone_transitions
 import os
 
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "spares.db")
+DB_PATH = os.environ.get(
+    "PARTS_JOURNAL_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "spares.db"),
+)
 
 engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
 
 SessionLocal = sessionmaker(bind=engine)
 
+
+def _column_default_sql(column) -> str:
+    arg = column.server_default.arg
+    return f"'{arg}'" if isinstance(arg, str) else str(arg.text)
+
+
+def _rebuild_with_autoincrement(conn, table):
+    """
+    Пересоздаёт существующую таблицу по модели с AUTOINCREMENT (SQLite не меняет
+    это объявление через ALTER TABLE): копия строк в новую таблицу с теми же
+    индексами, триггеры таблицы создаются заново. Старая таблица переименовывается
+    в режиме legacy_alter_table, чтобы внешние ключи других таблиц продолжали
+    ссылаться на имя table.
+    """
+    triggers = [sql for (sql,) in conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table.name,)
+    )]
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}_old")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for index in table.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    table.create(conn)
+    columns = ", ".join(column.name for column in table.columns)
+    conn.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old")
+    conn.exec_driver_sql(f"DROP TABLE {table.name}_old")
+    for sql in triggers:
+        conn.exec_driver_sql(sql)
+
+
+def migrate_schema(bind=engine):
+    """
+    Доводит схему существующей БД до моделей: create_all создаёт только отсутствующие
+    таблицы, а новые колонки и индексы в уже существующих таблицах добавляются здесь.
+    Новые колонки должны допускать NULL или иметь server_default. Индексы приложения
+    (с префиксом idx_), которых больше нет в моделях, удаляются. Таблицы, объявленные
+    с sqlite_autoincrement, но созданные без него, пересоздаются.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                sql = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    sql += f" DEFAULT {_column_default_sql(column)}"
+                if not column.nullable:
+                    sql += " NOT NULL"
+                conn.exec_driver_sql(sql)
+            declared = {index.name for index in table.indexes}
+            for index in inspector.get_indexes(table.name):
+                if index["name"].startswith("idx_") and index["name"] not in declared:
+                    conn.exec_driver_sql(f"DROP INDEX {index['name']}")
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+            if table.dialect_options["sqlite"]["autoincrement"]:
+                sql = conn.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+                ).scalar()
+                if "AUTOINCREMENT" not in sql.upper():
+                    _rebuild_with_autoincrement(conn, table)
+        # id журнала замен не выдаются повторно и после переноса записей в архив:
+        # счётчик AUTOINCREMENT не ниже наибольшего id архива
+        archived = conn.execute(select(func.max(ReplacementLogArchive.id))).scalar()
+        if archived:
+            conn.exec_driver_sql(
+                "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'replacement_log'", (archived,)
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT 'replacement_log', ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'replacement_log')",
+                (archived,),
+            )
+
+
 # Создание таблиц при первом запуске
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    with SessionLocal() as session:
+        backfill_zone_transitions(session)
+        backfilled = backfill_stock_ledger(session)
+        backfilled += backfill_search_keys(session)
+        if backfilled:
+            session.commit()
@@ -0,0 +1,279 @@
+"""
+Прогноз потребности в запчастях методом Монте-Карло.
+
+Срок службы каждой запчасти моделируется распределением Вейбулла, параметры
+которого подбираются по фактическим срокам из журнала замен. Для незаменённых
+установок разыгрывается остаточный срок (с учётом уже отработанных дней),
+после отказа запчасть заменяется новой и процесс повторяется до конца горизонта.
+Отказы раскладываются по окнам закупки (между датами закупки 10-го и 25-го числа).
+"""
+import math
+from datetime import date
+
+import numpy as np
+
+# Минимальное число наблюдаемых отказов для собственной оценки распределения
+MIN_FAILURES = 3
+# Форма распределения по умолчанию (износовые отказы) для запчастей без истории
+DEFAULT_WEIBULL_SHAPE = 3.0
+# Ограничение на число отказов (и элементов матрицы изношенных установок) в одной
+# порции симуляции
+CHUNK_ELEMENTS = 2_000_000
+# Вероятность отказа на горизонте, с которой установка разыгрывается во всех испытаниях
+WORN_FAILURE = 0.25
+# Плотный подсчёт по парам (запчасть-окно, испытание), если их не больше стольких на отказ
+DENSE_KEYS_PER_FAILURE = 4
+
+
+def weibull_scale_for_mean(mean_days: float, shape: float) -> float:
+    """Масштаб распределения Вейбулла с заданным средним."""
+    return mean_days / math.gamma(1.0 + 1.0 / shape)
+
+
+def fit_weibull(durations, observed=None, max_iter: int = 100, tol: float = 1e-8):
+    """
+    Оценка параметров Вейбулла (форма, масштаб) методом максимального правдоподобия.
+
+    durations - сроки службы в днях; observed - признак отказа (False для
+    цензурированных наблюдений, т.е. ещё работающих запчастей). Возвращает
+    None, если отказов меньше MIN_FAILURES.
+    """
+    x = np.asarray(durations, dtype=float)
+    events = np.ones(len(x), dtype=bool) if observed is None else np.asarray(observed, dtype=bool)
+    keep = x > 0
+    x, events = x[keep], events[keep]
+    r = int(events.sum())
+    if r < MIN_FAILURES:
+        return None
+
+    # Уравнение правдоподобия для формы k инвариантно к масштабу: нормируем сроки
+    # на максимум, чтобы x^k не переполнялся при больших k
+    x_max = x.max()
+    log_y = np.log(x / x_max)
+    mean_log_failures = log_y[events].mean()
+
+    # g(k) = sum(y^k ln y) / sum(y^k) - 1/k - mean(ln y | отказ) = 0, метод Ньютона
+    k = 1.0
+    for _ in range(max_iter):
+        yk = np.exp(k * log_y)
+        s0 = yk.sum()
+        s1 = (yk * log_y).sum()
+        s2 = (yk * log_y * log_y).sum()
+        g = s1 / s0 - 1.0 / k - mean_log_failures
+        dg = (s2 * s0 - s1 * s1) / (s0 * s0) + 1.0 / (k * k)
+        k_new = k - g / dg
+        if k_new <= 0:
+            k_new = k / 2
+        if abs(k_new - k) < tol:
+            k = k_new
+            break
+        k = k_new
+
+    scale = x_max * (np.exp(k * log_y).sum() / r) ** (1.0 / k)
+    return float(k), float(scale)
+
+
+def sample_weibull(rng, inv_shape, scale, size):
+    """Выборка из распределения Вейбулла: scale * E^(1/shape), E ~ Exp(1)."""
+    sample = rng.standard_exponential(size, dtype=np.float32)
+    np.power(sample, inv_shape, out=sample)
+    sample *= scale
+    return sample
+
+
+def failing_trials(rng, p, n_trials: int):
+    """
+    Испытания, в которых установка откажет на горизонте (p - вероятность отказа
+    по установке): процесс Бернулли по номерам испытаний с геометрическими
+    промежутками между отказами. Стоимость пропорциональна числу отказов, а не
+    испытаниям x установкам. Возвращает массивы (испытание, установка).
+    """
+    p = np.asarray(p, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        log_miss = np.log1p(-p)
+    inst = np.flatnonzero(p > 0)
+    position = np.full(inst.size, -1, dtype=np.int64)
+    trials, insts = [], []
+    while inst.size:
+        # Промежутков - с запасом на ожидаемое число отказов; не хватило - следующий круг
+        expected = p[inst] * (n_trials - 1 - position)
+        draws = np.minimum(np.ceil(expected + 3 * np.sqrt(expected) + 1), n_trials - 1 - position).astype(np.int64)
+        owner = np.repeat(np.arange(inst.size), draws)
+        # Промежуток ~ Geom(p) обращением функции распределения; U из (0, 1]
+        steps = np.floor(np.log(1.0 - rng.random(owner.size)) / log_miss[inst[owner]])
+        cumulative = np.cumsum(np.minimum(steps, n_trials).astype(np.int64) + 1)
+        ends = np.cumsum(draws)
+        before = np.concatenate(([0], cumulative[ends[:-1] - 1]))
+        trial = position[owner] + cumulative - before[owner]
+        keep = trial < n_trials
+        trials.append(trial[keep])
+        insts.append(inst[owner[keep]])
+        # Установки, у которых промежутки кончились раньше последнего испытания
+        position = trial[ends - 1]
+        more = position < n_trials - 1
+        inst, position = inst[more], position[more]
+    if not trials:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(trials), np.concatenate(insts)
+
+
+def sample_residual_weibull(rng, inv_shape, scale, aged, size):
+    """
+    Полный срок службы при условии, что запчасть уже проработала age дней:
+    T = scale * ((age/scale)^shape + E)^(1/shape), E ~ Exp(1).
+    aged = (age/scale)^shape передаётся заранее посчитанным по установке.
+    """
+    return scale * np.power(aged + rng.standard_exponential(size, dtype=np.float32), inv_shape)
+
+
+def sample_failing_residual_weibull(rng, inv_shape, scale, aged, fail):
+    """
+    То же при условии, что запчасть откажет до конца горизонта: E усекается до
+    limit - aged обращением функции распределения. fail = 1 - exp(aged - limit),
+    где limit = ((age + горизонт)/scale)^shape, передаётся посчитанным по установке.
+    """
+    uniform = rng.random(fail.shape, dtype=np.float32)
+    return scale * np.power(aged - np.log1p(-uniform * fail), inv_shape)
+
+
+def simulate_demand(part_index, age_days, shape, scale, n_parts, window_edges,
+                    trials: int = 10_000, quantiles=(0.5, 0.9), seed=None):
+    """
+    Векторизованная симуляция отказов по окнам закупки.
+
+    part_index, age_days - по каждой незаменённой установке: индекс запчасти и
+    отработанные дни. shape, scale - параметры Вейбулла по индексу запчасти.
+    window_edges - границы окон в днях от текущей даты (возрастающие, первая 0,
+    последняя - горизонт).
+
+    Возвращает (mean, {q: массив}) - массивы формы (n_parts, n_windows).
+    Изношенные установки (вероятность отказа на горизонте не ниже WORN_FAILURE)
+    разыгрываются матрицей по всем испытаниям, для остальных испытания с отказом
+    выбираются геометрическими промежутками и разыгрывается только срок отказа.
+    Число отказов по паре (запчасть-окно, испытание) считается по упакованному
+    ключу: сортировкой, если пар заметно больше, чем отказов, иначе плотным
+    подсчётом. Вместо счётчиков по испытаниям накапливается гистограмма числа
+    отказов для каждой пары (запчасть, окно): время и память пропорциональны
+    числу отказов, а не испытаниям x установкам или испытаниям x парам.
+    """
+    rng = np.random.default_rng(seed)
+    part_index = np.asarray(part_index, dtype=np.int64)
+    age_days = np.asarray(age_days, dtype=np.float64)
+    shape = np.asarray(shape, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    window_edges = np.asarray(window_edges, dtype=np.int64)
+
+    n_windows = len(window_edges) - 1
+    horizon = int(window_edges[-1])
+    n_inst = len(part_index)
+
+    # Симулируются только запчасти с незаменёнными установками: у остальных
+    # отказов на горизонте нет, их строки результата - нули
+    active_parts, inst_part = np.unique(part_index, return_inverse=True)
+    n_active = len(active_parts)
+    n_cells = n_active * n_windows
+
+    histogram = np.zeros((n_cells, 1), dtype=np.int64)
+
+    inst_shape = shape[part_index]
+    inst_scale = scale[part_index]
+    inst_aged = (age_days / inst_scale) ** inst_shape
+    # Вероятность отказа на горизонте: 1 - exp(aged - limit)
+    inst_fail = -np.expm1(inst_aged - ((age_days + horizon) / inst_scale) ** inst_shape)
+    # Изношенные установки разыгрываются матрицей (испытание, установка), остальные - по отказам
+    worn = np.flatnonzero(inst_fail >= WORN_FAILURE)
+    fresh = np.flatnonzero((inst_fail > 0) & (inst_fail < WORN_FAILURE))
+    # Параметры дальше нужны с одинарной точностью: отказ округляется до дня
+    inst_inv_shape = (1.0 / inst_shape).astype(np.float32)
+    inst_scale, inst_aged, inst_fail = (a.astype(np.float32) for a in (inst_scale, inst_aged, inst_fail))
+    age_days = age_days.astype(np.float32)
+    worn_inv_shape, worn_scale, worn_aged, worn_age = (
+        a[worn] for a in (inst_inv_shape, inst_scale, inst_aged, age_days)
+    )
+    # Параметры повторных отказов - по запчасти
+    part_inv_shape = (1.0 / shape[active_parts]).astype(np.float32)
+    part_scale = scale[active_parts].astype(np.float32)
+    # Порция испытаний ограничена ожидаемым числом первых отказов и матрицей изношенных
+    chunk = max(1, int(CHUNK_ELEMENTS // max(1.0, float(inst_fail.sum()), worn.size)))
+
+    for start in range(0, trials if n_inst else 0, chunk):
+        n_trials = min(chunk, trials - start)
+        # Ключ (пара запчасть-окно, испытание) в 32 битах, если помещается: сортировка вдвое быстрее
+        key_type = np.int32 if n_cells * n_trials < 2**31 else np.int64
+        # Номер окна по номеру дня от сегодня сразу в единицах ключа
+        day_to_key = ((np.searchsorted(window_edges, np.arange(horizon), side="right") - 1) * n_trials).astype(key_type)
+
+        # Изношенные: остаточный срок по всей матрице (испытание, установка),
+        # параметры берутся трансляцией без копирования
+        t = sample_residual_weibull(rng, worn_inv_shape, worn_scale, worn_aged, (n_trials, worn.size))
+        t -= worn_age
+        t = t.ravel()
+        hits = np.flatnonzero(t < horizon)
+        worn_trial, slot = np.divmod(hits, worn.size)
+        worn_t = t[hits]
+        # Остальные: только испытания с отказом и срок при условии отказа
+        fresh_trial, fresh_inst = failing_trials(rng, inst_fail[fresh], n_trials)
+        fresh_inst = fresh[fresh_inst]
+        fresh_t = sample_failing_residual_weibull(
+            rng, inst_inv_shape[fresh_inst], inst_scale[fresh_inst], inst_aged[fresh_inst], inst_fail[fresh_inst]
+        ) - age_days[fresh_inst]
+
+        trial = np.concatenate((worn_trial, fresh_trial))
+        inst = np.concatenate((worn[slot], fresh_inst))
+        # Погрешность округления не выводит первый отказ за границы горизонта
+        t = np.clip(np.concatenate((worn_t, fresh_t)), 0, horizon - 1)
+        # Ключ (пара запчасть-окно, испытание) без окна; дальше нужна только запчасть
+        part = inst_part[inst]
+        base = (part * (n_windows * n_trials) + trial).astype(key_type)
+
+        keys = []
+        while t.size:
+            keys.append(base + day_to_key[t.astype(np.intp)])
+            # Отказавшая запчасть заменяется новой: следующий отказ через новый срок службы
+            t += sample_weibull(rng, part_inv_shape.take(part), part_scale.take(part), t.shape)
+            active = np.flatnonzero(t < horizon)
+            base, part, t = base.take(active), part.take(active), t.take(active)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=key_type)
+
+        if n_cells * n_trials <= DENSE_KEYS_PER_FAILURE * keys.size:
+            # Отказов много на пару: счётчики по всем парам подсчётом без сортировки
+            cells = np.arange(n_cells)[:, np.newaxis]
+            counts = np.bincount(keys, minlength=n_cells * n_trials).reshape(n_cells, n_trials)
+        else:
+            # Отказы одной пары (запчасть-окно, испытание) после сортировки идут подряд
+            keys.sort()
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            counts = np.diff(np.append(starts, keys.size))
+            cells = keys[starts] // n_trials
+
+        max_count = int(counts.max()) if counts.size else 0
+        if max_count + 1 > histogram.shape[1]:
+            histogram = np.pad(histogram, ((0, 0), (0, max_count + 1 - histogram.shape[1])))
+        n_bins = histogram.shape[1]
+        flat = (cells * n_bins + counts).ravel()
+        histogram += np.bincount(flat, minlength=n_cells * n_bins).reshape(n_cells, n_bins)
+
+    # Испытания без отказов в паре - нулевой столбец (при сортировке пустые пары не встречаются)
+    histogram[:, 0] = trials - histogram[:, 1:].sum(axis=1)
+
+    # Результаты симулированных запчастей раскладываются по полному индексу запчастей
+    cumulative = np.cumsum(histogram, axis=1)
+    result = {}
+    for q in quantiles:
+        # Наименьшее число отказов, доля испытаний до которого не меньше q
+        threshold = np.ceil(q * trials)
+        result[q] = np.zeros((n_parts, n_windows), dtype=np.int64)
+        result[q][active_parts] = np.argmax(cumulative >= threshold, axis=1).reshape(n_active, n_windows)
+    mean = np.zeros((n_parts, n_windows), dtype=np.float64)
+    totals = histogram @ np.arange(histogram.shape[1])
+    mean[active_parts] = (totals / trials).reshape(n_active, n_windows)
+    return mean, result
+
+
+def window_edges(today: date, horizon_days: int, purchase_dates) -> np.ndarray:
+    """
+    Границы окон закупки в днях от today: сегодня, даты закупки внутри горизонта
+    и конец горизонта.
+    """
+    inner = sorted({(d - today).days for d in purchase_dates if 0 < (d - today).days < horizon_days})
+    return np.array([0, *inner, horizon_days], dtype=float)
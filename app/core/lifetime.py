@@ -0,0 +1,58 @@
+"""
+Оценка фактического срока службы по журналу замен.
+
+Закрытые записи (есть дата замены) - наблюдаемые отказы, незаменённые установки -
+цензурированные справа наблюдения: известно лишь, что запчасть проработала не меньше
+текущего срока. Поэтому используются методы анализа выживаемости: оценка Каплана-Мейера
+и распределение Вейбулла с учётом цензурирования.
+"""
+import math
+
+import numpy as np
+
+from .forecast import fit_weibull
+
+
+def kaplan_meier(durations, observed):
+    """
+    Оценка Каплана-Мейера функции выживания.
+    Возвращает (моменты отказов, S(t) сразу после каждого момента).
+    """
+    x = np.asarray(durations, dtype=float)
+    events = np.asarray(observed, dtype=bool)
+    times = np.unique(x[events])
+    if times.size == 0:
+        return times, times
+
+    x_sorted = np.sort(x)
+    # Под риском в момент t - все, кто проработал не меньше t
+    at_risk = x.size - np.searchsorted(x_sorted, times, side="left")
+    failures_sorted = np.sort(x[events])
+    failures = np.searchsorted(failures_sorted, times, side="right") - np.searchsorted(failures_sorted, times, side="left")
+    survival = np.cumprod(1.0 - failures / at_risk)
+    return times, survival
+
+
+def km_median(times, survival):
+    """Медиана по Каплану-Мейеру: первый момент, когда S(t) <= 0.5 (None, если не достигнута)."""
+    reached = np.flatnonzero(survival <= 0.5)
+    return float(times[reached[0]]) if reached.size else None
+
+
+def summarize_lifetimes(durations, observed) -> dict:
+    """Сводка по срокам службы группы установок."""
+    x = np.asarray(durations, dtype=float)
+    events = np.asarray(observed, dtype=bool)
+
+    times, survival = kaplan_meier(x, events)
+    weibull = fit_weibull(x, events)
+
+    return {
+        "n_failures": int(events.sum()),
+        "n_censored": int((~events).sum()),
+        "mean_observed_days": float(x[events].mean()) if events.any() else None,
+        "km_median_days": km_median(times, survival),
+        "weibull_shape": weibull[0] if weibull else None,
+        "weibull_scale": weibull[1] if weibull else None,
+        "weibull_mean_days": weibull[1] * math.gamma(1.0 + 1.0 / weibull[0]) if weibull else None,
+    }
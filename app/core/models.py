@@ -1,14 +1,47 @@
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column, relationship, validates
 from enum import Enum
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import Integer, String, Column, ForeignKey, CheckConstraint, Index
-from datetime import date
+from sqlalchemy import Integer, String, Float, Boolean, Column, ForeignKey, CheckConstraint, Index, UniqueConstraint, DDL, event, text
+from datetime import date, datetime
+from .search import search_key
 
 
 class Base(DeclarativeBase):
     pass
 
-class Equipment(Base):
+class Versioned:
+    """
+    Оптимистическая блокировка редактируемых записей: ORM увеличивает version при
+    каждом UPDATE и выполняет его с условием WHERE version = <загруженная версия>.
+    Если запись успела изменить другая сессия, UPDATE не находит строку и ORM
+    поднимает StaleDataError (сервисы превращают его в ConflictError).
+    """
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("1"))
+
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.version}
+
+class Searchable:
+    """
+    Справочник с поиском по началу названия (core/search.py): name_key - название
+    в нормализованном виде, обновляется при каждой записи name.
+    """
+    name_key: Mapped[str | None] = mapped_column(String(100), nullable=True)
+
+    @validates("name")
+    def _update_name_key(self, key, value):
+        self.name_key = search_key(value)
+        return value
+
+class Retirable:
+    """
+    Справочник с выводом из эксплуатации (core/retire.py): retired_at - дата вывода,
+    NULL - действующая запись. Выведенные записи не предлагаются в полях выбора.
+    """
+    retired_at: Mapped[date | None] = mapped_column(nullable=True)
+
+class Equipment(Retirable, Searchable, Versioned, Base):
     __tablename__ = "equipment"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -21,21 +54,28 @@ class Equipment(Base):
 
     __table_args__ = (
         CheckConstraint('available_units >= 0', name='check_available_units_positive'),
+        Index('idx_equipment_name_key', 'name_key'),
     )
 
     def __repr__(self) -> str:
         return f"Equipment(id={self.id!r}, name={self.name!r}, available units={self.available_units!r})"
 
-class Workshop(Base):
+class Workshop(Retirable, Searchable, Versioned, Base):
     __tablename__ = "workshop"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(50), nullable=False)
     addr: Mapped[str] = mapped_column(String(100), nullable=False)
+    # Мощность: сколько замен мастерская выполняет за рабочий день (расписание замен, core/scheduler.py)
+    daily_capacity: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("4"))
 
     # Relationships
     replacement_logs: Mapped[list["ReplacementLog"]] = relationship("ReplacementLog", back_populates="workshop")
 
+    __table_args__ = (
+        Index('idx_workshop_name_key', 'name_key'),
+    )
+
     def __repr__(self) -> str:
         return f"Workshop(id={self.id!r}, name={self.name!r}, address={self.addr!r})"
 
@@ -44,7 +84,7 @@ class Replacements(Enum):
     SCHEDULED = "scheduled replacement"
     UNSCHEDULED = "unscheduled replacement"
 
-class ReplacementType(Base):
+class ReplacementType(Versioned, Base):
     __tablename__ = "replacement_type"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -60,7 +100,39 @@ class ReplacementType(Base):
     def __repr__(self) -> str:
         return f"ReplacementType(id={self.id!r}, name={self.name.value!r})"
 
-class Part(Base):
+class Supplier(Versioned, Base):
+    """Поставщик запчастей со своими днями закупки."""
+    __tablename__ = "supplier"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+    # Числа месяца через запятую, например "10,25"
+    purchase_days: Mapped[str] = mapped_column(String(100), default="10,25", nullable=False)
+    # Перенос закупки, выпавшей на праздник: next / previous
+    holiday_shift: Mapped[str] = mapped_column(String(10), default="next", nullable=False)
+
+    # Relationships
+    parts: Mapped[list["Part"]] = relationship("Part", back_populates="supplier")
+
+    __table_args__ = (
+        CheckConstraint("holiday_shift IN ('next', 'previous')", name='check_holiday_shift'),
+    )
+
+    def __repr__(self) -> str:
+        return f"Supplier(id={self.id!r}, name={self.name!r}, purchase_days={self.purchase_days!r})"
+
+class Holiday(Versioned, Base):
+    """Нерабочий день: закупка, выпавшая на него, переносится."""
+    __tablename__ = "holiday"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    holiday_date: Mapped[date] = mapped_column(unique=True, nullable=False)
+    name: Mapped[str] = mapped_column(String(50), default="", nullable=False)
+
+    def __repr__(self) -> str:
+        return f"Holiday(holiday_date={self.holiday_date!r}, name={self.name!r})"
+
+class Part(Retirable, Searchable, Versioned, Base):
     __tablename__ = "part"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -70,9 +142,14 @@ class Part(Base):
     qty_per_unit: Mapped[int] = mapped_column(Integer, nullable=False)
     qty_in_stock: Mapped[int] = mapped_column(Integer, nullable=False)
     lead_time_days: Mapped[int] = mapped_column(Integer, default=2, nullable=False)
+    # Поставщик задаёт календарь закупки; без поставщика - закупка 10 и 25 числа
+    supplier_id: Mapped[int | None] = mapped_column(ForeignKey("supplier.id"), nullable=True)
 
     # Relationships
     parent_equipment: Mapped["Equipment"] = relationship("Equipment", back_populates="parts")
+    supplier: Mapped["Supplier | None"] = relationship("Supplier", back_populates="parts")
+    stock_movements: Mapped[list["StockMovement"]] = relationship("StockMovement", cascade="all, delete-orphan")
+    stock_checkpoints: Mapped[list["StockCheckpoint"]] = relationship("StockCheckpoint", cascade="all, delete-orphan")
     replacement_logs: Mapped[list["ReplacementLog"]] = relationship("ReplacementLog", back_populates="part")
 
     __table_args__ = (
@@ -81,12 +158,14 @@ class Part(Base):
         CheckConstraint('qty_in_stock >= 0', name='check_qty_in_stock_non_negative'),
         CheckConstraint('lead_time_days >= 0', name='check_lead_time_non_negative'),
         Index('idx_part_equipment', 'parent_equipment_id'),
+        Index('idx_part_supplier', 'supplier_id'),
+        Index('idx_part_name_key', 'name_key'),
     )
 
     def __repr__(self) -> str:
         return f"Part(id={self.id!r}, name={self.name!r}, equipment_id={self.parent_equipment_id!r})"
 
-class ReplacementLog(Base):
+class ReplacementLog(Versioned, Base):
     __tablename__ = "replacement_log"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -98,6 +177,9 @@ class ReplacementLog(Base):
     installation_date: Mapped[date] = mapped_column(nullable=False)
     replacement_date: Mapped[date | None] = mapped_column(nullable=True)
     comments: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    # Установка закрыта выводом оборудования или запчасти из эксплуатации (core/retire.py),
+    # а не заменой после отказа: для сроков службы - цензурированное наблюдение
+    closed_by_retire: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("0"))
 
     # Relationships
     part: Mapped["Part"] = relationship("Part", back_populates="replacement_logs")
@@ -110,10 +192,251 @@ class ReplacementLog(Base):
             'replacement_date IS NULL OR replacement_date >= installation_date',
             name='check_replacement_date_after_installation'
         ),
-        Index('idx_replacement_equipment', 'equipment_id'),
+        # История по оборудованию (новые первыми) - без сортировки во временном B-дереве
+        Index('idx_replacement_equipment_date', 'equipment_id', 'installation_date'),
         Index('idx_replacement_part', 'part_id'),
+        Index('idx_replacement_workshop', 'workshop_id'),
         Index('idx_replacement_installation_date', 'installation_date'),
+        # Закрытые записи по дате замены: архивирование и снимки износа (replacement_date > ?).
+        # Частичный, чтобы запросы незаменённых (IS NULL) шли по idx_replacement_open
+        Index('idx_replacement_closed', 'replacement_date', sqlite_where=text('replacement_date IS NOT NULL')),
+        # Незаменённые установки (план закупки, Dashboard, zone_transition): частичный
+        # покрывающий индекс - закрытые записи в него не попадают
+        Index(
+            'idx_replacement_open', 'part_id', 'installation_date', 'equipment_id', 'unit_serial_number',
+            'replacement_date', sqlite_where=text('replacement_date IS NULL'),
+        ),
+        # id не выдаются повторно после удаления записей с наибольшими id: с теми же
+        # id записи лежат в архиве (core/archive.py) и оповещениях
+        {"sqlite_autoincrement": True},
     )
 
+    @validates("replacement_date")
+    def _reset_closed_by_retire(self, key, value):
+        # Дату, введённую или исправленную вручную, задаёт фактическая замена
+        self.closed_by_retire = False
+        return value
+
     def __repr__(self) -> str:
         return f"ReplacementLog(id={self.id!r}, part_id={self.part_id!r}, equipment_id={self.equipment_id!r}, installation_date={self.installation_date!r})"
+
+
+class ReplacementLogArchive(Base):
+    """
+    Архив закрытых записей журнала замен (см. core/archive.py). Колонки и id те же,
+    что в replacement_log: история читается объединением горячей и архивной таблиц.
+    """
+    __tablename__ = "replacement_log_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    part_id: Mapped[int] = mapped_column(ForeignKey("part.id"), nullable=False)
+    equipment_id: Mapped[int] = mapped_column(ForeignKey("equipment.id"), nullable=False)
+    unit_serial_number: Mapped[str] = mapped_column(String(30), nullable=False)
+    workshop_id: Mapped[int] = mapped_column(ForeignKey("workshop.id"), nullable=False)
+    replacement_type_id: Mapped[int] = mapped_column(ForeignKey("replacement_type.id"), nullable=False)
+    installation_date: Mapped[date] = mapped_column(nullable=False)
+    replacement_date: Mapped[date] = mapped_column(nullable=False)
+    comments: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    closed_by_retire: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=text("0"))
+    archived_at: Mapped[date] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        Index('idx_replacement_archive_equipment', 'equipment_id', 'installation_date'),
+        Index('idx_replacement_archive_part', 'part_id'),
+        Index('idx_replacement_archive_workshop', 'workshop_id'),
+        Index('idx_replacement_archive_replacement_date', 'replacement_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"ReplacementLogArchive(id={self.id!r}, part_id={self.part_id!r}, replacement_date={self.replacement_date!r})"
+
+
+class StockMovement(Base):
+    """
+    Движение склада: приход, списание на установку или корректировка. qty - изменение
+    остатка со знаком, balance_after - остаток запчасти после движения.
+    """
+    __tablename__ = "stock_movement"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    part_id: Mapped[int] = mapped_column(ForeignKey("part.id"), nullable=False)
+    movement_date: Mapped[date] = mapped_column(nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # receipt / issue / adjustment
+    qty: Mapped[int] = mapped_column(Integer, nullable=False)
+    balance_after: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Установка, на которую списана запчасть (без внешнего ключа: запись может уйти в архив)
+    replacement_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    comment: Mapped[str | None] = mapped_column(String(200), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint("kind IN ('receipt', 'issue', 'adjustment')", name='check_stock_movement_kind'),
+        CheckConstraint('balance_after >= 0', name='check_stock_balance_non_negative'),
+        # Остаток на дату: сумма движений запчасти после контрольной точки (покрывающий индекс)
+        Index('idx_stock_movement_part_date', 'part_id', 'movement_date', 'qty'),
+    )
+
+    def __repr__(self) -> str:
+        return f"StockMovement(part_id={self.part_id!r}, kind={self.kind!r}, qty={self.qty!r}, balance_after={self.balance_after!r})"
+
+class StockCheckpoint(Base):
+    """Остаток запчасти на конец дня: отсюда начинается подсчёт остатка на более позднюю дату."""
+    __tablename__ = "stock_checkpoint"
+
+    part_id: Mapped[int] = mapped_column(ForeignKey("part.id"), primary_key=True)
+    checkpoint_date: Mapped[date] = mapped_column(primary_key=True)
+    balance: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('idx_stock_checkpoint_date', 'checkpoint_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"StockCheckpoint(part_id={self.part_id!r}, checkpoint_date={self.checkpoint_date!r}, balance={self.balance!r})"
+
+class ZoneTransition(Base):
+    """
+    Предрасчитанные даты переходов незаменённой установки между зонами износа
+    и даты плана закупки. Поддерживается в актуальном состоянии при записи
+    (см. core/zones.py), поэтому зона на любую дату - индексный запрос по датам.
+    """
+    __tablename__ = "zone_transition"
+
+    replacement_id: Mapped[int] = mapped_column(ForeignKey("replacement_log.id"), primary_key=True)
+    part_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    equipment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    installation_date: Mapped[date] = mapped_column(nullable=False)
+    # Последняя незаменённая установка запчасти (по ней Dashboard определяет зону запчасти)
+    is_latest: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    # Получила ли установка запчасть со склада при распределении запаса
+    has_stock: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    yellow_date: Mapped[date] = mapped_column(nullable=False)
+    red_date: Mapped[date] = mapped_column(nullable=False)
+    failure_date: Mapped[date] = mapped_column(nullable=False)
+    latest_init_date: Mapped[date] = mapped_column(nullable=False)
+    latest_purchase_date: Mapped[date] = mapped_column(nullable=False)
+    receipt_date: Mapped[date] = mapped_column(nullable=False)
+    # Номер пересчёта, записавшего строку (счётчик data_version 'zone_transition'):
+    # по нему планировщик оповещений забирает только изменившиеся строки
+    revision: Mapped[int] = mapped_column(Integer, nullable=False, server_default=text("0"))
+
+    __table_args__ = (
+        Index('idx_zone_transition_part', 'part_id'),
+        Index('idx_zone_transition_yellow', 'is_latest', 'yellow_date'),
+        Index('idx_zone_transition_red', 'is_latest', 'red_date'),
+        Index('idx_zone_transition_revision', 'revision'),
+        # План закупок: сортировка по дате инициации, в том числе внутри оборудования
+        Index('idx_zone_transition_init', 'latest_init_date'),
+        Index('idx_zone_transition_equipment', 'equipment_id', 'latest_init_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"ZoneTransition(replacement_id={self.replacement_id!r}, yellow_date={self.yellow_date!r}, red_date={self.red_date!r})"
+
+class WearSnapshot(Base):
+    """
+    Ежедневный агрегат износа по оборудованию и зоне: сколько установок было в зоне
+    на дату и их средний запас прочности. Заполняется core/snapshots.py.
+    """
+    __tablename__ = "wear_snapshot"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    snapshot_date: Mapped[date] = mapped_column(nullable=False)
+    equipment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    zone: Mapped[str] = mapped_column(String(10), nullable=False)  # green / yellow / red
+    n_installations: Mapped[int] = mapped_column(Integer, nullable=False)
+    mean_percentage_left: Mapped[float] = mapped_column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('snapshot_date', 'equipment_id', 'zone', name='uq_wear_snapshot_key'),
+        Index('idx_wear_snapshot_equipment', 'equipment_id', 'snapshot_date'),
+    )
+
+    def __repr__(self) -> str:
+        return f"WearSnapshot(snapshot_date={self.snapshot_date!r}, equipment_id={self.equipment_id!r}, zone={self.zone!r})"
+
+class AlertOutbox(Base):
+    """Оповещение о наступлении события установки (переход в жёлтую/красную зону, крайний срок заявки)."""
+    __tablename__ = "alert_outbox"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    replacement_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    part_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    equipment_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # yellow / red / latest_init
+    event_date: Mapped[date] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(nullable=False)
+    # Заполняется получателем после доставки оповещения
+    delivered_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('replacement_id', 'kind', 'event_date', name='uq_alert_outbox_event'),
+        Index('idx_alert_outbox_pending', 'delivered_at', 'id'),
+    )
+
+    def __repr__(self) -> str:
+        return f"AlertOutbox(replacement_id={self.replacement_id!r}, kind={self.kind!r}, event_date={self.event_date!r})"
+
+class LifetimeStat(Base):
+    """Фактический срок службы по группе установок (запчасть, оборудование или мастерская)."""
+    __tablename__ = "lifetime_stat"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    scope: Mapped[str] = mapped_column(String(20), nullable=False)  # part / equipment / workshop
+    scope_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    n_failures: Mapped[int] = mapped_column(Integer, nullable=False)
+    n_censored: Mapped[int] = mapped_column(Integer, nullable=False)
+    mean_observed_days: Mapped[float | None] = mapped_column(Float, nullable=True)
+    km_median_days: Mapped[float | None] = mapped_column(Float, nullable=True)
+    weibull_shape: Mapped[float | None] = mapped_column(Float, nullable=True)
+    weibull_scale: Mapped[float | None] = mapped_column(Float, nullable=True)
+    weibull_mean_days: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Сигнатура исходных записей группы: при её совпадении пересчёт не нужен
+    signature: Mapped[str] = mapped_column(String(100), nullable=False)
+    as_of: Mapped[date] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('scope', 'scope_id', name='uq_lifetime_stat_scope'),
+    )
+
+    def __repr__(self) -> str:
+        return f"LifetimeStat(scope={self.scope!r}, scope_id={self.scope_id!r}, km_median_days={self.km_median_days!r})"
+
+class DataVersion(Base):
+    """Счётчик изменений таблицы: увеличивается триггерами при каждой записи."""
+    __tablename__ = "data_version"
+
+    table_name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"DataVersion(table_name={self.table_name!r}, version={self.version!r})"
+
+
+# Таблицы, изменения которых отслеживаются в data_version (используется для ETag в API)
+VERSIONED_TABLES = ("equipment", "part", "workshop", "replacement_type", "replacement_log", "supplier", "holiday", "stock_movement")
+# Счётчики, которые увеличиваются кодом приложения, а не триггерами
+COUNTER_TABLES = ("zone_transition",)
+# Таблицы, от которых зависят рассчитанные данные (износ, зоны, план закупок с
+# календарями поставщиков и праздниками, прогноз, расписание замен): ключ кэша
+# страниц (core.utils.cached) и ETag расчётных ответов API
+COMPUTED_TABLES = ("equipment", "part", "replacement_log", "supplier", "holiday", "zone_transition", "workshop")
+
+
+def _data_version_ddl():
+    statements = [
+        DDL(f"INSERT OR IGNORE INTO data_version (table_name, version) VALUES ('{table}', 0)")
+        for table in (*VERSIONED_TABLES, *COUNTER_TABLES)
+    ]
+    for table in VERSIONED_TABLES:
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(DDL(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version AFTER {op} ON {table} "
+                f"BEGIN UPDATE data_version SET version = version + 1 WHERE table_name = '{table}'; END"
+            ))
+    return statements
+
+
+# Триггеры создаются после всех таблиц, поэтому вешаем их на metadata, а не на таблицу
+for _ddl in _data_version_ddl():
+    event.listen(Base.metadata, "after_create", _ddl.execute_if(dialect="sqlite"))
@@ -0,0 +1,241 @@
+"""
+Профилирование перезапуска страницы.
+
+Страница вызывает start_profile() в начале и finish_profile() в конце, а её этапы
+(запросы, расчёт износа, построение DataFrame, таблицы, графики matplotlib)
+обёрнуты в span("имя"): вложенные интервалы времени. Без включённого профилирования
+span ничего не делает. Кроме интервалов за один перезапуск можно снять cProfile
+(самые долгие функции) и tracemalloc (места с наибольшим приростом памяти).
+
+Включение (значения - режимы через запятую: spans, cprofile, memory или all; "1" -
+только интервалы):
+- переменная окружения PARTS_JOURNAL_PROFILE - для всех сессий;
+- параметр адреса ?profile=... - для открытой страницы;
+- страница Admin - для текущей сессии браузера.
+
+Последние PROFILE_HISTORY профилей всех сессий хранятся в памяти процесса,
+страница Admin показывает их и выгружает в JSON или в формат speedscope
+(https://www.speedscope.app). Фрагмент, перезапущенный отдельно от страницы, не
+профилируется: start_profile выполняется только при перезапуске всей страницы.
+"""
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, fields
+from datetime import datetime
+
+import streamlit as st
+
+PROFILE_MODES = ("spans", "cprofile", "memory")
+# Сколько последних профилей хранится в памяти процесса
+PROFILE_HISTORY = 20
+# Сколько строк cProfile и tracemalloc попадает в профиль
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 20
+# Режимы профилирования текущей сессии (страница Admin)
+SESSION_MODES_KEY = "profile_modes"
+# Незавершённый профиль сессии (страница остановлена st.stop или st.rerun до finish_profile)
+SESSION_PROFILE_KEY = "_rerun_profile"
+
+_current: ContextVar["RerunProfile | None"] = ContextVar("rerun_profile", default=None)
+# tracemalloc - один на процесс: память снимает только один профиль одновременно
+_tracemalloc_lock = threading.Lock()
+
+
+@dataclass
+class Span:
+    """Интервал этапа перезапуска: начало от старта профиля и длительность, мс; depth - вложенность."""
+    name: str
+    start_ms: float
+    duration_ms: float
+    depth: int
+
+
+@dataclass
+class RerunProfile:
+    """Профиль одного перезапуска страницы."""
+    page: str
+    started_at: datetime
+    modes: tuple
+    spans: list = field(default_factory=list)
+    total_ms: float = 0.0
+    completed: bool = False
+    functions: list = field(default_factory=list)
+    allocations: list = field(default_factory=list)
+    memory_peak_kb: float | None = None
+    _started: float = field(default=0.0, repr=False)
+    _depth: int = field(default=0, repr=False)
+    _profiler: cProfile.Profile | None = field(default=None, repr=False)
+    _snapshot: tracemalloc.Snapshot | None = field(default=None, repr=False)
+    _owns_tracemalloc: bool = field(default=False, repr=False)
+
+    def to_dict(self) -> dict:
+        """Профиль для выгрузки в JSON."""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+        data["started_at"] = self.started_at.isoformat(timespec="seconds")
+        data["spans"] = [asdict(span) for span in self.spans]
+        return data
+
+    def to_speedscope(self) -> dict:
+        """Интервалы профиля в формате speedscope (evented profile)."""
+        frames = list(dict.fromkeys(span.name for span in self.spans))
+        index = {name: i for i, name in enumerate(frames)}
+        events = []
+        for span in self.spans:
+            events.append((span.start_ms, 1, span.depth, "O", index[span.name]))
+            events.append((span.start_ms + span.duration_ms, 0, -span.depth, "C", index[span.name]))
+        # В одной точке времени сначала закрываются интервалы (глубокие раньше), затем открываются
+        events.sort()
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.page} {self.started_at:%Y-%m-%d %H:%M:%S}",
+            "shared": {"frames": [{"name": name} for name in frames]},
+            "profiles": [{
+                "type": "evented",
+                "name": self.page,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": self.total_ms,
+                "events": [{"type": kind, "frame": frame, "at": at} for at, _, _, kind, frame in events],
+            }],
+        }
+
+
+def _parse_modes(value: str | None) -> frozenset:
+    modes = set()
+    for mode in (value or "").lower().split(","):
+        mode = mode.strip()
+        if mode in ("1", "true", "spans"):
+            modes.add("spans")
+        elif mode == "all":
+            modes.update(PROFILE_MODES)
+        elif mode in PROFILE_MODES:
+            modes.update(("spans", mode))
+    return frozenset(modes)
+
+
+def profile_modes() -> frozenset:
+    """Режимы профилирования перезапуска: переменная окружения, параметр адреса и настройка сессии."""
+    return (
+        _parse_modes(os.environ.get("PARTS_JOURNAL_PROFILE"))
+        | _parse_modes(st.query_params.get("profile"))
+        | frozenset(st.session_state.get(SESSION_MODES_KEY, ()))
+    )
+
+
+@st.cache_resource
+def get_profile_store() -> deque:
+    """Последние профили всех сессий браузера (один список на процесс)."""
+    return deque(maxlen=PROFILE_HISTORY)
+
+
+def current_profile() -> RerunProfile | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Интервал этапа name в профиле текущего перезапуска; без профилирования ничего не делает."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    profile._depth += 1
+    try:
+        yield
+    finally:
+        profile._depth -= 1
+        profile.spans.append(Span(
+            name, (start - profile._started) * 1000, (time.perf_counter() - start) * 1000, profile._depth
+        ))
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def start_profile(page: str) -> RerunProfile | None:
+    """Начинает профиль перезапуска страницы page, если профилирование включено."""
+    dangling = st.session_state.pop(SESSION_PROFILE_KEY, None)
+    if dangling is not None:
+        _finish(dangling, completed=False)
+
+    modes = profile_modes()
+    if not modes:
+        return None
+    profile = RerunProfile(page=page, started_at=datetime.now(), modes=tuple(m for m in PROFILE_MODES if m in modes))
+    if "memory" in modes and _tracemalloc_lock.acquire(blocking=False):
+        profile._owns_tracemalloc = not tracemalloc.is_tracing()
+        if profile._owns_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profile._snapshot = _take_snapshot()
+    if "cprofile" in modes:
+        profile._profiler = cProfile.Profile()
+        profile._profiler.enable()
+    profile._started = time.perf_counter()
+    _current.set(profile)
+    st.session_state[SESSION_PROFILE_KEY] = profile
+    return profile
+
+
+def finish_profile() -> RerunProfile | None:
+    """Завершает профиль перезапуска и добавляет его в список последних профилей."""
+    profile = _current.get()
+    if profile is None:
+        return None
+    st.session_state.pop(SESSION_PROFILE_KEY, None)
+    _finish(profile, completed=True)
+    st.caption(f"Профиль перезапуска: {profile.total_ms:.0f} мс (страница Admin)")
+    return profile
+
+
+def _finish(profile: RerunProfile, completed: bool):
+    """
+    Останавливает cProfile и tracemalloc профиля и сохраняет его. Профиль, не
+    завершённый finish_profile (completed=False), закрывается при следующем
+    перезапуске сессии; его длительность - до конца последнего этапа (время между
+    перезапусками - ожидание пользователя, а не работа страницы).
+    """
+    if completed:
+        profile.total_ms = (time.perf_counter() - profile._started) * 1000
+    else:
+        profile.total_ms = max((span.start_ms + span.duration_ms for span in profile.spans), default=0.0)
+    profile.completed = completed
+    if _current.get() is profile:
+        _current.set(None)
+
+    if profile._profiler is not None:
+        profile._profiler.disable()
+
+    # Снимок памяти - до разбора статистики cProfile, чтобы не учитывать её память
+    if profile._snapshot is not None:
+        snapshot = _take_snapshot()
+        profile.memory_peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        if profile._owns_tracemalloc:
+            tracemalloc.stop()
+        _tracemalloc_lock.release()
+        profile.allocations = [
+            {"location": str(stat.traceback[0]), "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+            for stat in snapshot.compare_to(profile._snapshot, "lineno")[:TOP_ALLOCATIONS]
+        ]
+        profile._snapshot = None
+
+    if profile._profiler is not None:
+        stats = pstats.Stats(profile._profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP_FUNCTIONS]
+        profile.functions = [
+            {"function": f"{function} ({os.path.basename(filename)}:{line})", "calls": calls,
+             "own_ms": own * 1000, "total_ms": total * 1000}
+            for (filename, line, function), (_, calls, own, total, _) in rows
+        ]
+        profile._profiler = None
+
+    get_profile_store().append(profile)
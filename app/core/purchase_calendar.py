@@ -0,0 +1,203 @@
+"""
+Календарь закупок.
+
+Закупка возможна в фиксированные числа месяца: по умолчанию 10 и 25, у поставщика
+могут быть свои (таблица supplier). Дата закупки, попавшая на праздник (таблица
+holiday), переносится на следующий непраздничный день (или на предыдущий). Все
+правила календаря собраны здесь.
+
+Календарь заранее строит отсортированный массив дат закупки (date.toordinal) на
+горизонте и отвечает на запросы "следующая дата закупки" и "последняя дата закупки
+не позже" для целых колонок дат двоичным поиском (np.searchsorted). Горизонт
+расширяется, если запрос выходит за его пределы.
+"""
+from calendar import monthrange
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Holiday, Supplier
+
+PURCHASE_DAYS = (10, 25)
+# Перенос даты закупки, попавшей на праздник
+HOLIDAY_SHIFTS = ("next", "previous")
+# Даты закупки ищутся не дальше чем за столько месяцев до месяца отказа
+MAX_MONTHS_BACK = 12
+# Запас горизонта при его построении и расширении, дней
+HORIZON_MARGIN_DAYS = 400
+# Код "без поставщика" в массивах supplier_id (id поставщиков начинаются с 1)
+NO_SUPPLIER = 0
+
+# Дата 1970-01-01 в нумерации date.toordinal(): перевод ordinal <-> datetime64[D]
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def parse_purchase_days(value) -> tuple:
+    """Дни закупки из строки "10, 25" или последовательности чисел (отсортированы, без повторов)."""
+    if isinstance(value, str):
+        value = [part for part in value.replace(";", ",").split(",") if part.strip()]
+    days = tuple(sorted({int(day) for day in value}))
+    if not days or days[0] < 1 or days[-1] > 31:
+        raise ValueError("Дни закупки должны быть числами от 1 до 31")
+    return days
+
+
+def supplier_codes(values) -> np.ndarray:
+    """Колонка supplier_id (с пропусками) в массив кодов; NO_SUPPLIER - без поставщика."""
+    return pd.to_numeric(pd.Series(values), errors="coerce").fillna(NO_SUPPLIER).to_numpy(dtype=np.int64)
+
+
+def _months(ordinals):
+    """Номер месяца (от 1970-01) для массива ordinal."""
+    return (np.asarray(ordinals) - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+class PurchaseCalendar:
+    """Даты закупки по числам месяца с переносом праздничных дат."""
+
+    def __init__(self, purchase_days=PURCHASE_DAYS, holidays=(), holiday_shift: str = "next"):
+        if holiday_shift not in HOLIDAY_SHIFTS:
+            raise ValueError(f"Перенос праздничной закупки должен быть одним из: {', '.join(HOLIDAY_SHIFTS)}")
+        self.purchase_days = parse_purchase_days(purchase_days)
+        self.holidays = frozenset(d.toordinal() if isinstance(d, date) else int(d) for d in holidays)
+        self.holiday_shift = holiday_shift
+        self._first = self._last = None
+        self._ordinals = np.zeros(0, dtype=np.int64)
+
+    def __repr__(self) -> str:
+        return f"PurchaseCalendar(purchase_days={self.purchase_days!r}, holidays={len(self.holidays)}, shift={self.holiday_shift!r})"
+
+    def _shift(self, ordinal: int) -> int:
+        step = 1 if self.holiday_shift == "next" else -1
+        while ordinal in self.holidays:
+            ordinal += step
+        return ordinal
+
+    def _build(self, first: int, last: int):
+        """Даты закупки всех месяцев, пересекающихся с [first, last] (ordinal)."""
+        start, end = date.fromordinal(first), date.fromordinal(last)
+        ordinals = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            _, last_day = monthrange(year, month)
+            for day in self.purchase_days:
+                # Числа, которых нет в месяце (например, 31), пропускаются
+                if day <= last_day:
+                    ordinals.append(self._shift(date(year, month, day).toordinal()))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        self._ordinals = np.unique(np.array(ordinals, dtype=np.int64))
+        # Перенос может вывести дату за край месяца, поэтому краевые месяцы не считаются покрытыми
+        self._first, self._last = first + 31, last - 31
+
+    def _ensure(self, lo: int, hi: int):
+        if self._first is not None and self._first <= lo and hi <= self._last:
+            return
+        if self._first is not None:
+            lo, hi = min(lo, self._first), max(hi, self._last)
+        self._build(lo - HORIZON_MARGIN_DAYS, hi + HORIZON_MARGIN_DAYS)
+
+    def ordinals_between(self, start: date, end: date) -> np.ndarray:
+        """Даты закупки в [start, end] - отсортированный массив ordinal."""
+        lo, hi = start.toordinal(), end.toordinal()
+        if lo > hi:
+            return np.zeros(0, dtype=np.int64)
+        self._ensure(lo, hi)
+        i = np.searchsorted(self._ordinals, lo, side="left")
+        j = np.searchsorted(self._ordinals, hi, side="right")
+        return self._ordinals[i:j]
+
+    def dates_between(self, start: date, end: date) -> list[date]:
+        return [date.fromordinal(int(ordinal)) for ordinal in self.ordinals_between(start, end)]
+
+    def next_after(self, ordinals) -> np.ndarray:
+        """Для каждой даты (ordinal) - ближайшая дата закупки строго после неё."""
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        if ordinals.size == 0:
+            return ordinals
+        self._ensure(int(ordinals.min()), int(ordinals.max()))
+        return self._ordinals[np.searchsorted(self._ordinals, ordinals, side="right")]
+
+    def previous_on_or_before(self, ordinals) -> np.ndarray:
+        """Для каждой даты (ordinal) - последняя дата закупки не позже неё."""
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        if ordinals.size == 0:
+            return ordinals
+        self._ensure(int(ordinals.min()), int(ordinals.max()))
+        return self._ordinals[np.searchsorted(self._ordinals, ordinals, side="right") - 1]
+
+    def next_purchase_day(self, target_date: date) -> date:
+        return date.fromordinal(int(self.next_after([target_date.toordinal()])[0]))
+
+    def previous_purchase_day(self, target_date: date) -> date:
+        return date.fromordinal(int(self.previous_on_or_before([target_date.toordinal()])[0]))
+
+    def latest_init_dates(self, failure_ordinal, lead_time_days, supplier_ids=None):
+        """
+        Самая поздняя дата закупки - последняя дата календаря не позже
+        failure_date - lead_time_days, но не раньше чем за MAX_MONTHS_BACK месяцев до
+        месяца отказа. Инициация - 1-е число месяца, предшествующего месяцу закупки.
+        Возвращает (latest_init, latest_purchase, receipt) - массивы ordinal.
+        supplier_ids не используется (общий интерфейс с PurchaseCalendars).
+        """
+        failure_ordinal = np.asarray(failure_ordinal, dtype=np.int64)
+        lead_time_days = np.asarray(lead_time_days, dtype=np.int64)
+        if failure_ordinal.size == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        purchase = self.previous_on_or_before(failure_ordinal - lead_time_days)
+        found = _months(purchase) >= _months(failure_ordinal) - MAX_MONTHS_BACK
+        init = (
+            (purchase - EPOCH_ORDINAL).astype("datetime64[D]").astype("datetime64[M]") - 1
+        ).astype("datetime64[D]").astype(np.int64) + EPOCH_ORDINAL
+
+        fallback_purchase = failure_ordinal - (lead_time_days + 30)
+        purchase = np.where(found, purchase, fallback_purchase)
+        init = np.where(found, init, fallback_purchase - 30)
+        return init, purchase, purchase + lead_time_days
+
+
+class PurchaseCalendars:
+    """Календари по поставщикам: default - для запчастей без поставщика."""
+
+    def __init__(self, default: PurchaseCalendar | None = None, by_supplier: dict | None = None):
+        self.default = default or PurchaseCalendar()
+        self.by_supplier = dict(by_supplier or {})
+
+    @classmethod
+    def load(cls, session: Session) -> "PurchaseCalendars":
+        """Календари из таблиц supplier и holiday (праздники общие для всех поставщиков)."""
+        holidays = session.execute(select(Holiday.holiday_date)).scalars().all()
+        by_supplier = {
+            supplier_id: PurchaseCalendar(purchase_days, holidays, holiday_shift)
+            for supplier_id, purchase_days, holiday_shift in session.execute(
+                select(Supplier.id, Supplier.purchase_days, Supplier.holiday_shift)
+            )
+        }
+        return cls(PurchaseCalendar(PURCHASE_DAYS, holidays), by_supplier)
+
+    def for_supplier(self, supplier_id) -> PurchaseCalendar:
+        return self.by_supplier.get(supplier_id, self.default)
+
+    def with_days(self, purchase_days) -> PurchaseCalendar:
+        """Календарь с другими днями закупки и теми же праздниками (для сценариев)."""
+        return PurchaseCalendar(purchase_days, self.default.holidays, self.default.holiday_shift)
+
+    def latest_init_dates(self, failure_ordinal, lead_time_days, supplier_ids=None):
+        """Как PurchaseCalendar.latest_init_dates, каждая строка - по календарю своего поставщика."""
+        failure_ordinal = np.asarray(failure_ordinal, dtype=np.int64)
+        lead_time_days = np.asarray(lead_time_days, dtype=np.int64)
+        if supplier_ids is None or not self.by_supplier:
+            return self.default.latest_init_dates(failure_ordinal, lead_time_days)
+
+        supplier_ids = np.asarray(supplier_ids, dtype=np.int64)
+        init, purchase, receipt = (np.zeros(failure_ordinal.size, dtype=np.int64) for _ in range(3))
+        for supplier_id in np.unique(supplier_ids).tolist():
+            rows = supplier_ids == supplier_id
+            init[rows], purchase[rows], receipt[rows] = self.for_supplier(supplier_id).latest_init_dates(
+                failure_ordinal[rows], lead_time_days[rows]
+            )
+        return init, purchase, receipt
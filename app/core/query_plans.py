@@ -0,0 +1,183 @@
+"""
+Проверка планов запросов сервисного слоя (EXPLAIN QUERY PLAN).
+
+Каждый сценарий из SERVICE_QUERIES вызывает метод сервиса на отдельной БД в памяти
+с небольшим набором данных; все выполненные при этом запросы перехватываются и для
+каждого строится план SQLite. Проверка не проходит, если запрос читает таблицу
+полным перебором (SCAN без индекса), кроме таблиц, которые сценарий и так читает
+целиком (полный список, агрегат по всей истории) - они перечислены в сценарии явно.
+
+Запуск: python app/jobs.py query-plans [--verbose]
+"""
+import re
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from .models import Base, Replacements
+
+# Полный перебор таблицы: "SCAN <таблица>" без "USING ... INDEX"
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+# Запросы без таблиц (SELECT 1, INSERT ... VALUES) не проверяются
+HAS_TABLE = re.compile(r"\b(FROM|UPDATE)\b", re.IGNORECASE)
+# Записей журнала в проверочной БД
+SEED_REPLACEMENTS = 2000
+
+
+class QueryPlan:
+    """План одного запроса: сценарий, SQL, строки плана и таблицы с полным перебором."""
+
+    def __init__(self, scenario: str, statement: str, details: list, full_scans: list):
+        self.scenario = scenario
+        self.statement = statement
+        self.details = details
+        self.full_scans = full_scans
+
+
+def _seed(services):
+    """
+    Небольшой набор данных с пропорциями рабочей БД (большая часть журнала - закрытые
+    записи), по которому ANALYZE собирает статистику для планировщика.
+    """
+    today = date.today()
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshops = services.workshops.create_many([{"name": f"Мастерская {i}", "addr": "-"} for i in range(2)])
+    equipment = services.equipment.create_many([{"name": f"Оборудование {i}", "available_units": 2} for i in range(5)])
+    parts = services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment[i % len(equipment)].id, "useful_life_days": 100,
+         "qty_per_unit": 1, "qty_in_stock": i % 2, "lead_time_days": 10}
+        for i in range(20)
+    ])
+    n_closed = SEED_REPLACEMENTS - len(parts)
+    rows = []
+    for i in range(SEED_REPLACEMENTS):
+        part = parts[i % len(parts)]
+        # Замены идут каждые 5 дней, последняя установка каждой запчасти не заменена
+        installation_date = today - timedelta(days=5 * (SEED_REPLACEMENTS - i) + 100)
+        rows.append({
+            "part_id": part.id, "equipment_id": part.parent_equipment_id, "unit_serial_number": f"SN{i}",
+            "workshop_id": workshops[i % len(workshops)].id, "replacement_type_id": 1,
+            "installation_date": installation_date,
+            "replacement_date": installation_date + timedelta(days=100) if i < n_closed else None,
+        })
+    services.replacements.create_many(rows)
+    services.replacements.archive(older_than_days=365)
+    services.wear_snapshots.refresh(start=today - timedelta(days=30))
+    services.db.execute(text("ANALYZE"))
+    services.db.commit()
+
+
+# Сценарий -> (вызов сервиса, таблицы, которые сценарий читает целиком по смыслу)
+SERVICE_QUERIES = {
+    "parts.list_rows": (lambda s: s.parts.list_rows(), {"part"}),
+    "parts.list_rows(оборудование)": (lambda s: s.parts.list_rows(parent_equipment_id=1), set()),
+    "parts.count(оборудование)": (lambda s: s.parts.count(parent_equipment_id=1), set()),
+    # Поиск по началу названия: диапазон по idx_<таблица>_name_key, без поиска - первые по алфавиту
+    "parts.search": (lambda s: s.parts.search("запчасть 1"), set()),
+    "parts.search(без префикса)": (lambda s: s.parts.search(""), set()),
+    "parts.option": (lambda s: s.parts.option(1), set()),
+    "equipment.search": (lambda s: s.equipment.search("обор"), set()),
+    "workshops.search": (lambda s: s.workshops.search("маст"), set()),
+    "equipment.list_rows": (lambda s: s.equipment.list_rows(), {"equipment"}),
+    "workshops.list_rows": (lambda s: s.workshops.list_rows(), {"workshop"}),
+    "replacement_types.list_rows": (lambda s: s.replacement_types.list_rows(), {"replacement_type"}),
+    "replacements.list_rows": (lambda s: s.replacements.list_rows(), {"replacement_log"}),
+    # Справочник запчастей может быть внешним циклом соединения с индексом незаменённых
+    "replacements.list_rows(открытые)": (lambda s: s.replacements.list_rows(replacement_date=None), {"part"}),
+    # Страница по первичному ключу: перебор в порядке id останавливается на LIMIT
+    "replacements.arrow(страница)": (lambda s: s.replacements.arrow(offset=0, limit=10), {"replacement_log"}),
+    "replacements.iter_batches": (lambda s: list(s.replacements.iter_batches(3)), set()),
+    "replacements.history_rows(оборудование)": (lambda s: s.replacements.history_rows(1), set()),
+    "replacements.history_count(мастерская)": (lambda s: s.replacements.history_count(workshop_id=1), set()),
+    "replacements.get_by_equipment": (lambda s: s.replacements.get_by_equipment(1), set()),
+    "replacements.list_open": (lambda s: s.replacements.list_open(), set()),
+    "replacements.open_installations_frame": (lambda s: s.replacements.open_installations_frame(), set()),
+    "replacements.open_installations_frame(запчасти)": (
+        lambda s: s.replacements.open_installations_frame(part_ids=[1, 2]), set(),
+    ),
+    "procurement.plan": (lambda s: s.procurement.plan(), set()),
+    "procurement.plan(оборудование)": (lambda s: s.procurement.plan(equipment_id=1), set()),
+    "procurement.plan(зоны)": (lambda s: s.procurement.plan(zones=("yellow", "red")), set()),
+    "procurement.plan(горизонт, limit)": (lambda s: s.procurement.plan(horizon=30, limit=10), set()),
+    "procurement.plan(страница)": (lambda s: s.procurement.plan(zones=("yellow", "red"), offset=10, limit=10), set()),
+    "procurement.plan_count": (lambda s: s.procurement.plan_count(), set()),
+    "procurement.plan_count(зоны)": (lambda s: s.procurement.plan_count(zones=("yellow", "red")), set()),
+    # Расписание: задания - диапазон по idx_zone_transition_red, мастерские, праздники и поставщики - целиком
+    "schedule.schedule": (lambda s: s.schedule.schedule(), {"workshop", "holiday", "supplier"}),
+    "dashboard.summary": (lambda s: s.dashboard.summary(), {"part"}),
+    "zones.turning": (lambda s: s.zones.turning("red"), set()),
+    "forecast.fit_part_lifetimes": (
+        lambda s: s.forecast.fit_part_lifetimes(), {"part", "replacement_log", "replacement_log_archive"},
+    ),
+    "lifetime_stats.refresh": (
+        lambda s: s.lifetime_stats.refresh(full=True), {"replacement_log", "replacement_log_archive", "lifetime_stat"},
+    ),
+    "wear_snapshots.refresh(сегодня)": (lambda s: s.wear_snapshots.refresh(start=date.today()), set()),
+    "wear_snapshots.trend": (lambda s: s.wear_snapshots.trend(date.today() - timedelta(days=14), date.today()), set()),
+    "alerts.pending": (lambda s: s.alerts.pending(limit=10), set()),
+    "data_versions.get": (lambda s: s.data_versions.get("part", "replacement_log"), set()),
+    "parts.update(срок службы)": (lambda s: s.parts.update(1, useful_life_days=120), {"supplier"}),
+    "replacements.close_many": (lambda s: s.replacements.close_many([2], date.today()), set()),
+    "replacements.archive": (lambda s: s.replacements.archive(older_than_days=200), set()),
+    "stock.receive": (lambda s: s.stock.receive(1, 2), {"supplier"}),
+    "stock.set_balance": (lambda s: s.stock.set_balance(1, 7), {"supplier"}),
+    "stock.movements": (lambda s: s.stock.movements(1, limit=10), set()),
+    "stock.as_of(запчасть)": (lambda s: s.stock.as_of(date.today(), part_ids=[1]), set()),
+    # Контрольные точки пишутся по всем запчастям с движениями
+    "stock.write_checkpoints": (lambda s: s.stock.write_checkpoints(), {"stock_movement"}),
+    # Вывод из эксплуатации и удаление - по условию на ключи (core/retire.py), в конце: записи исчезают
+    "search(с выведенными)": (lambda s: s.parts.search("запчасть", include_retired=True), set()),
+    "parts.retire": (lambda s: s.parts.retire(2), set()),
+    "equipment.retire": (lambda s: s.equipment.retire(3), set()),
+    "workshops.delete(перенос истории)": (lambda s: s.workshops.delete(2, reassign_to=1), set()),
+    "parts.delete(с историей)": (lambda s: s.parts.delete(4, with_history=True), set()),
+    "equipment.delete(с историей)": (lambda s: s.equipment.delete(5, with_history=True), set()),
+}
+
+
+def collect_query_plans(scenarios=None) -> list[QueryPlan]:
+    """
+    Выполняет сценарии (все из SERVICE_QUERIES, если не заданы) на БД в памяти и
+    возвращает планы всех выполненных запросов SELECT/UPDATE/DELETE.
+    """
+    from .services import ServiceContainer
+
+    scenarios = SERVICE_QUERIES if scenarios is None else scenarios
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    captured = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT INTO", "WITH")):
+            captured.append((statement, parameters))
+
+    plans = []
+    with Session(engine) as session:
+        services = ServiceContainer(session)
+        _seed(services)
+        for name, (call, full_reads) in scenarios.items():
+            captured.clear()
+            call(services)
+            session.rollback()
+            for statement, parameters in list(captured):
+                if not HAS_TABLE.search(statement):
+                    continue
+                rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                details = [row[-1] for row in rows]
+                scans = [
+                    match.group(1) for match in map(FULL_SCAN.match, details)
+                    if match and match.group(1) in Base.metadata.tables and match.group(1) not in full_reads
+                ]
+                plans.append(QueryPlan(name, statement, details, scans))
+            captured.clear()
+    engine.dispose()
+    return plans
+
+
+def full_scan_violations(plans) -> list[QueryPlan]:
+    """Запросы с полным перебором таблицы, не объявленным в сценарии."""
+    return [plan for plan in plans if plan.full_scans]
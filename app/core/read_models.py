@@ -0,0 +1,108 @@
+"""
+Модели только для чтения для списков и таблиц.
+
+Вместо полноценных ORM-объектов (отслеживание изменений, ленивые связи) списки
+строятся запросом нужных колонок через Core select. Строка - неизменяемый dataclass
+со __slots__, названия связанных записей приходят сразу из join. Для больших
+выгрузок те же запросы отдаются колонками в pyarrow.Table.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+import pyarrow as pa
+
+
+@dataclass(frozen=True, slots=True)
+class OptionRow:
+    """Вариант выбора в поле поиска: id, название и уточнение (оборудование, адрес)."""
+    id: int
+    name: str
+    detail: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class EquipmentRow:
+    id: int
+    name: str
+    available_units: int
+    part_count: int
+    retired_at: date | None
+
+
+@dataclass(frozen=True, slots=True)
+class WorkshopRow:
+    id: int
+    name: str
+    addr: str
+    daily_capacity: int
+    replacement_count: int
+    retired_at: date | None
+
+
+@dataclass(frozen=True, slots=True)
+class ReplacementTypeRow:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class PartRow:
+    id: int
+    name: str
+    parent_equipment_id: int
+    equipment_name: str
+    useful_life_days: int
+    qty_per_unit: int
+    qty_in_stock: int
+    lead_time_days: int
+    supplier_id: int | None
+    retired_at: date | None
+
+
+@dataclass(frozen=True, slots=True)
+class ReplacementRow:
+    id: int
+    part_id: int
+    part_name: str
+    equipment_id: int
+    equipment_name: str
+    unit_serial_number: str
+    workshop_id: int
+    workshop_name: str
+    replacement_type_id: int
+    type_name: str
+    installation_date: date
+    replacement_date: date | None
+    comments: str | None
+
+
+# Типы колонок Arrow по python-типу колонки SQLAlchemy: схема не зависит от данных
+# (например, колонка из одних NULL не становится типом null)
+ARROW_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    date: pa.date32(),
+}
+
+
+def _arrow_type(column):
+    try:
+        return ARROW_TYPES.get(column.type.python_type)
+    except NotImplementedError:
+        return None
+
+
+def to_arrow(result, columns) -> pa.Table:
+    """
+    Результат запроса в pyarrow.Table. columns - выбранные колонки запроса
+    (stmt.selected_columns), по ним задаются имена и типы.
+    """
+    columns = list(columns)
+    rows = result.all()
+    values = zip(*rows) if rows else ([] for _ in columns)
+    return pa.table({
+        column.key: pa.array(list(column_values), type=_arrow_type(column))
+        for column, column_values in zip(columns, values)
+    })
@@ -0,0 +1,271 @@
+"""
+Удаление и вывод из эксплуатации оборудования, запчастей и мастерских набором
+SQL-операций.
+
+Удаление через ORM (session.delete с cascade) загружает каждую дочернюю запись и
+удаляет её отдельным DELETE, а записи журнала замен, ссылающиеся на удалённые
+запчасти, остаются без владельца. Здесь каждая таблица обрабатывается оператором
+DELETE/UPDATE ... WHERE с условием по ключам (записи запчастей оборудования - по
+подзапросу или по списку их id частями), все - в транзакции вызывающего
+(фиксирует сервис).
+
+Журнал замен при удалении:
+- оборудование и запчасти с историей замен (включая архив) не удаляются
+  (ReferencedError), если не передан with_history=True - тогда история, её строки
+  zone_transition и оповещения удаляются вместе с ними;
+- мастерская с историей не удаляется, если не указана мастерская reassign_to, на
+  которую история переносится.
+
+Вывод из эксплуатации (retire) - мягкое удаление: заполняется retired_at, история
+сохраняется. Незаменённые установки выводимого оборудования или запчасти
+закрываются датой вывода одним UPDATE и уходят из износа, плана закупок и
+оповещений. Такие записи помечаются closed_by_retire: это не отказы, и для
+статистики сроков службы и прогноза они - цензурированные наблюдения. Запчасти выводимого оборудования выводятся вместе с ним. Выведенные
+записи не предлагаются в полях выбора, но остаются в списках и истории.
+
+Операции обходят отслеживание изменений ORM, поэтому пересчёт zone_transition и
+снимков износа отмечается явно (mark_parts_dirty, mark_snapshots_dirty).
+"""
+from datetime import date
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from .archive import replacement_history
+from .models import (
+    AlertOutbox,
+    Equipment,
+    Part,
+    ReplacementLog,
+    ReplacementLogArchive,
+    StockCheckpoint,
+    StockMovement,
+    WearSnapshot,
+    Workshop,
+    ZoneTransition,
+)
+from .snapshots import mark_snapshots_dirty
+
+# Операции по условию: объекты сессии не сверяются с изменёнными строками (сервис
+# помечает их устаревшими после операции)
+BULK = {"synchronize_session": False}
+# Ограничение числа параметров в одном запросе IN (...) для удаления по списку id
+BATCH_SIZE = 500
+
+
+class ReferencedError(ValueError):
+    """На удаляемые записи ссылается история замен."""
+
+    def __init__(self, table: str, count: int):
+        self.table = table
+        self.count = count
+        super().__init__(f"На удаляемые записи {table} ссылается история замен: {count} записей")
+
+
+def _chunks(ids):
+    """Список id - частями по BATCH_SIZE, подзапрос - целиком."""
+    if not isinstance(ids, list):
+        return [ids]
+    return [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+
+
+def _history_refs(equipment_ids=None, part_ids=None) -> list:
+    """
+    Условия "запись ссылается на удаляемые записи" для таблиц с колонками
+    equipment_id и part_id (журнал, архив, zone_transition): функции колонок ->
+    условие. part_ids - список id (условие на каждую часть списка) или подзапрос.
+    Условия не пересекаются и каждое ищется по своему индексу (equipment_id IN ...
+    OR part_id IN ... SQLite выполняет полным просмотром таблицы).
+    """
+    conditions = []
+    if equipment_ids is not None:
+        conditions.append(lambda columns: columns.equipment_id.in_(equipment_ids))
+    if part_ids is not None:
+        for chunk in _chunks(part_ids):
+            if equipment_ids is None:
+                conditions.append(lambda columns, chunk=chunk: columns.part_id.in_(chunk))
+            else:
+                conditions.append(
+                    lambda columns, chunk=chunk: columns.part_id.in_(chunk) & columns.equipment_id.not_in(equipment_ids)
+                )
+    return conditions
+
+
+def _delete_history(session: Session, table: str, refs: list, with_history: bool) -> int:
+    """
+    Удаляет историю замен по условиям refs (или отклоняет удаление, ReferencedError
+    с именем таблицы table). Возвращает число удалённых записей.
+    """
+    history = replacement_history()
+    count = sum(
+        session.execute(select(func.count()).select_from(history).where(condition(history.c))).scalar()
+        for condition in refs
+    )
+    if not count:
+        return 0
+    if not with_history:
+        raise ReferencedError(table, count)
+
+    from .zones import mark_parts_dirty
+
+    # Снимки оборудования пересчитываются с самой ранней удаляемой установки, а
+    # оставшиеся установки тех же запчастей - заново (запас распределяется по всем)
+    from_dates = {}
+    for condition in refs:
+        for equipment_id, from_date in session.execute(
+            select(history.c.equipment_id, func.min(history.c.installation_date))
+            .where(condition(history.c))
+            .group_by(history.c.equipment_id)
+        ):
+            from_dates[equipment_id] = min(from_date, from_dates.get(equipment_id, from_date))
+    mark_snapshots_dirty(session, from_dates)
+    for condition in refs:
+        mark_parts_dirty(session, session.execute(
+            select(ZoneTransition.part_id).where(condition(ZoneTransition)).distinct()
+        ).scalars())
+
+    for condition in refs:
+        # Оповещения - по id записей журнала (уникальный индекс replacement_id), пока записи есть
+        for table in (ReplacementLog, ReplacementLogArchive):
+            session.execute(
+                delete(AlertOutbox).where(AlertOutbox.replacement_id.in_(select(table.id).where(condition(table)))),
+                execution_options=BULK,
+            )
+        for model in (ZoneTransition, ReplacementLogArchive, ReplacementLog):
+            session.execute(delete(model).where(condition(model)), execution_options=BULK)
+    return count
+
+
+def _delete_stock(session: Session, part_ids: list):
+    """Журнал склада и контрольные точки остатков удаляемых запчастей."""
+    for chunk in _chunks(part_ids):
+        session.execute(delete(StockMovement).where(StockMovement.part_id.in_(chunk)), execution_options=BULK)
+        session.execute(delete(StockCheckpoint).where(StockCheckpoint.part_id.in_(chunk)), execution_options=BULK)
+
+
+def delete_equipment(session: Session, equipment_ids, with_history: bool = False) -> int:
+    """Удаляет оборудование вместе с его запчастями. Возвращает число удалённых единиц оборудования."""
+    equipment_ids = list(dict.fromkeys(equipment_ids))
+    # id запчастей - одним запросом по индексу: со списком условия на журнал и склад
+    # ищутся по индексам при любой статистике планировщика
+    parts = list(session.execute(select(Part.id).where(Part.parent_equipment_id.in_(equipment_ids))).scalars())
+    _delete_history(session, "equipment", _history_refs(equipment_ids, parts), with_history)
+    _delete_stock(session, parts)
+    session.execute(delete(WearSnapshot).where(WearSnapshot.equipment_id.in_(equipment_ids)), execution_options=BULK)
+    session.execute(delete(Part).where(Part.parent_equipment_id.in_(equipment_ids)), execution_options=BULK)
+    return session.execute(delete(Equipment).where(Equipment.id.in_(equipment_ids)), execution_options=BULK).rowcount
+
+
+def delete_parts(session: Session, part_ids, with_history: bool = False) -> int:
+    """Удаляет запчасти с журналом склада. Возвращает число удалённых."""
+    part_ids = list(dict.fromkeys(part_ids))
+    _delete_history(session, "part", _history_refs(part_ids=part_ids), with_history)
+    _delete_stock(session, part_ids)
+    return sum(
+        session.execute(delete(Part).where(Part.id.in_(chunk)), execution_options=BULK).rowcount
+        for chunk in _chunks(part_ids)
+    )
+
+
+def delete_workshops(session: Session, workshop_ids, reassign_to: int | None = None) -> int:
+    """
+    Удаляет мастерские. История замен удаляемых мастерских переносится на
+    reassign_to; без него мастерская с историей не удаляется. Возвращает число удалённых.
+    """
+    workshop_ids = list(dict.fromkeys(workshop_ids))
+    if reassign_to in workshop_ids:
+        raise ValueError("Мастерская для переноса истории не может быть среди удаляемых")
+    if reassign_to is None:
+        history = replacement_history()
+        count = session.execute(
+            select(func.count()).select_from(history).where(history.c.workshop_id.in_(workshop_ids))
+        ).scalar()
+        if count:
+            raise ReferencedError("workshop", count)
+    else:
+        session.execute(
+            update(ReplacementLog)
+            .where(ReplacementLog.workshop_id.in_(workshop_ids))
+            .values(workshop_id=reassign_to, version=ReplacementLog.version + 1),
+            execution_options=BULK,
+        )
+        session.execute(
+            update(ReplacementLogArchive)
+            .where(ReplacementLogArchive.workshop_id.in_(workshop_ids))
+            .values(workshop_id=reassign_to),
+            execution_options=BULK,
+        )
+    return session.execute(delete(Workshop).where(Workshop.id.in_(workshop_ids)), execution_options=BULK).rowcount
+
+
+def close_installations(session: Session, refs: list, closed_on: date) -> int:
+    """
+    Закрывает незаменённые установки по условиям refs (_history_refs) датой closed_on
+    (не раньше даты установки) с отметкой closed_by_retire одним UPDATE на условие.
+    Возвращает число закрытых установок.
+    """
+    from .zones import mark_parts_dirty
+
+    closed = 0
+    for condition in refs:
+        open_refs = condition(ReplacementLog) & ReplacementLog.replacement_date.is_(None)
+        affected = session.execute(
+            select(ReplacementLog.part_id, ReplacementLog.equipment_id).where(open_refs).distinct()
+        ).all()
+        if not affected:
+            continue
+        session.execute(
+            delete(AlertOutbox).where(
+                AlertOutbox.replacement_id.in_(select(ReplacementLog.id).where(open_refs)),
+                AlertOutbox.delivered_at.is_(None),
+            ),
+            execution_options=BULK,
+        )
+        closed += session.execute(
+            update(ReplacementLog)
+            .where(open_refs)
+            .values(
+                replacement_date=func.max(ReplacementLog.installation_date, closed_on),
+                closed_by_retire=True,
+                version=ReplacementLog.version + 1,
+            ),
+            execution_options=BULK,
+        ).rowcount
+        mark_parts_dirty(session, {part_id for part_id, _ in affected})
+        mark_snapshots_dirty(session, {equipment_id: closed_on for _, equipment_id in affected})
+    return closed
+
+
+def _retire(session: Session, model, condition, retired_on: date) -> int:
+    return session.execute(
+        update(model)
+        .where(condition, model.retired_at.is_(None))
+        .values(retired_at=retired_on, version=model.version + 1),
+        execution_options=BULK,
+    ).rowcount
+
+
+def retire_equipment(session: Session, equipment_ids, retired_on: date | None = None) -> int:
+    """
+    Выводит оборудование из эксплуатации вместе с его запчастями и закрывает их
+    незаменённые установки. Возвращает число выведенных единиц оборудования.
+    """
+    equipment_ids = list(dict.fromkeys(equipment_ids))
+    retired_on = retired_on or date.today()
+    parts = select(Part.id).where(Part.parent_equipment_id.in_(equipment_ids)).scalar_subquery()
+    close_installations(session, _history_refs(equipment_ids, parts), retired_on)
+    _retire(session, Part, Part.parent_equipment_id.in_(equipment_ids), retired_on)
+    return _retire(session, Equipment, Equipment.id.in_(equipment_ids), retired_on)
+
+
+def retire_parts(session: Session, part_ids, retired_on: date | None = None) -> int:
+    """Выводит запчасти из эксплуатации и закрывает их незаменённые установки. Возвращает число выведенных."""
+    part_ids = list(dict.fromkeys(part_ids))
+    retired_on = retired_on or date.today()
+    close_installations(session, _history_refs(part_ids=part_ids), retired_on)
+    return _retire(session, Part, Part.id.in_(part_ids), retired_on)
+
+
+def retire_workshops(session: Session, workshop_ids, retired_on: date | None = None) -> int:
+    """Выводит мастерские из эксплуатации (установки не закрываются). Возвращает число выведенных."""
+    return _retire(session, Workshop, Workshop.id.in_(list(dict.fromkeys(workshop_ids))), retired_on or date.today())
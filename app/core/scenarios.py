@@ -0,0 +1,185 @@
+"""
+Сценарии "что если": изменение срока доставки, срока службы, складского запаса
+и дней закупки до правки справочника запчастей.
+
+Базовый расчёт (износ, зоны, даты переходов и план закупки по всем незаменённым
+установкам) выполняется один раз при создании ScenarioEngine. Сценарий пересчитывает
+только установки затронутых запчастей: складской запас распределяется внутри одной
+запчасти, поэтому остальные строки совпадают с базовыми. Всё считается в памяти,
+БД не изменяется; базовый кадр не модифицируется, поэтому на одном движке можно
+считать много сценариев (в том числе параллельно).
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .purchase_calendar import EPOCH_ORDINAL, PurchaseCalendars, parse_purchase_days
+from .zones import plan_frame
+
+# Поля запчасти, которые можно переопределить в сценарии
+OVERRIDE_FIELDS = ("lead_time_days", "useful_life_days", "qty_in_stock", "purchase_days")
+# Колонки, изменение которых попадает в разницу с базовым расчётом
+DIFF_COLUMNS = ("zone", "remaining_days", "has_stock", "yellow_ordinal", "red_ordinal", "init_ordinal")
+DATE_COLUMNS = {
+    "failure_ordinal": "failure_date",
+    "yellow_ordinal": "yellow_date",
+    "red_ordinal": "red_date",
+    "init_ordinal": "latest_init_date",
+    "purchase_ordinal": "latest_purchase_date",
+    "receipt_ordinal": "receipt_date",
+}
+
+
+def _dates(ordinals):
+    return (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]").tolist()
+
+
+class ScenarioResult:
+    """
+    Результат сценария:
+    plan - план закупок по всем установкам (как ProcurementPlanService.plan, но кадром),
+    diff - изменившиеся установки со значениями до/после,
+    summary - сводка: зоны до/после, число изменившихся установок и просроченных заявок.
+    """
+
+    def __init__(self, plan: pd.DataFrame, diff: pd.DataFrame, summary: dict):
+        self.plan = plan
+        self.diff = diff
+        self.summary = summary
+
+
+class ScenarioEngine:
+    def __init__(self, frame: pd.DataFrame, part_equipment: dict, today: date | None = None,
+                 calendars: PurchaseCalendars | None = None):
+        """
+        frame - незаменённые установки (ReplacementService.open_installations_frame),
+        part_equipment - part_id -> parent_equipment_id (для переопределений по оборудованию),
+        calendars - календари закупок поставщиков (по умолчанию закупка 10 и 25 числа).
+        """
+        self.today = today or date.today()
+        self.part_equipment = dict(part_equipment)
+        self.calendars = calendars or PurchaseCalendars()
+        self.baseline = plan_frame(frame, today=self.today, calendars=self.calendars)
+
+    @classmethod
+    def from_services(cls, services, today: date | None = None) -> "ScenarioEngine":
+        frame = services.replacements.open_installations_frame()
+        part_equipment = {part.id: part.parent_equipment_id for part in services.parts.list_rows()}
+        return cls(frame, part_equipment, today=today, calendars=PurchaseCalendars.load(services.db))
+
+    def resolve_overrides(self, parts=None, equipment=None, purchase_days=None) -> dict:
+        """
+        Переопределения по запчастям: part_id -> {поле: значение}. Переопределение
+        оборудования распространяется на все его запчасти, переопределение запчасти
+        имеет приоритет; purchase_days без привязки - календарь для всех запчастей.
+        """
+        overrides = {}
+        if purchase_days is not None:
+            for part_id in self.part_equipment:
+                overrides[part_id] = {"purchase_days": purchase_days}
+        for equipment_id, fields in (equipment or {}).items():
+            for part_id, parent_id in self.part_equipment.items():
+                if parent_id == equipment_id:
+                    overrides.setdefault(part_id, {}).update(fields)
+        for part_id, fields in (parts or {}).items():
+            overrides.setdefault(part_id, {}).update(fields)
+
+        for part_id, fields in overrides.items():
+            unknown = set(fields) - set(OVERRIDE_FIELDS)
+            if unknown:
+                raise ValueError(f"Неизвестные поля сценария: {', '.join(sorted(unknown))}")
+            for field in ("lead_time_days", "useful_life_days", "qty_in_stock"):
+                if field in fields and int(fields[field]) < 0:
+                    raise ValueError(f"Значение {field} не может быть отрицательным")
+            if "purchase_days" in fields:
+                fields["purchase_days"] = parse_purchase_days(fields["purchase_days"])
+        return overrides
+
+    def run(self, parts=None, equipment=None, purchase_days=None) -> ScenarioResult:
+        """
+        Расчёт сценария. parts / equipment - {id: {поле: значение}} с полями из
+        OVERRIDE_FIELDS, purchase_days - дни закупки для всех запчастей.
+        """
+        overrides = self.resolve_overrides(parts, equipment, purchase_days)
+        base = self.baseline
+        affected = base["part_id"].isin(list(overrides)).to_numpy()
+
+        changed = base.loc[affected, list(self._input_columns())].copy()
+        for field in ("lead_time_days", "useful_life_days", "qty_in_stock"):
+            values = {part_id: fields[field] for part_id, fields in overrides.items() if field in fields}
+            if values:
+                mapped = changed["part_id"].map(values)
+                changed[field] = mapped.fillna(changed[field]).astype(np.int64)
+
+        # Запчасти с разными днями закупки считаются отдельными группами; без
+        # переопределения дней - по календарям своих поставщиков
+        purchase_days = changed["part_id"].map(
+            {part_id: fields.get("purchase_days") for part_id, fields in overrides.items()}
+        )
+        recalculated = [
+            plan_frame(
+                group, today=self.today,
+                calendars=self.calendars.with_days(days) if isinstance(days, tuple) else self.calendars,
+            )
+            for days, group in changed.groupby(purchase_days, sort=False, dropna=False)
+        ]
+
+        scenario = pd.concat([base.loc[~affected], *recalculated]) if recalculated else base
+        diff = self._diff(base.loc[affected], pd.concat(recalculated) if recalculated else base.iloc[0:0])
+        summary = {
+            "affected_installations": int(affected.sum()),
+            "changed_installations": len(diff),
+            "zones_before": self._zone_counts(base),
+            "zones_after": self._zone_counts(scenario),
+            "overdue_before": int((base["init_ordinal"] < self.today.toordinal()).sum()),
+            "overdue_after": int((scenario["init_ordinal"] < self.today.toordinal()).sum()),
+        }
+        return ScenarioResult(self._plan(scenario), diff, summary)
+
+    def compare(self, scenarios: dict) -> dict:
+        """Несколько сценариев на одном базовом расчёте: имя -> ScenarioResult."""
+        return {name: self.run(**spec) for name, spec in scenarios.items()}
+
+    def _input_columns(self):
+        columns = [
+            "replacement_id", "part_id", "equipment_id", "unit_serial_number", "installation_date",
+            "part_name", "useful_life_days", "lead_time_days", "qty_in_stock", "qty_per_unit",
+            "supplier_id", "equipment_name", "available_units",
+        ]
+        return [column for column in columns if column in self.baseline.columns]
+
+    @staticmethod
+    def _zone_counts(frame) -> dict:
+        counts = frame["zone"].value_counts()
+        return {zone: int(counts.get(zone, 0)) for zone in ("green", "yellow", "red")}
+
+    def _plan(self, frame: pd.DataFrame) -> pd.DataFrame:
+        plan = frame.sort_values(["init_ordinal", "replacement_id"]).reset_index(drop=True)
+        for ordinal_column, date_column in DATE_COLUMNS.items():
+            plan[date_column] = _dates(plan[ordinal_column])
+        return plan.drop(columns=["installation_ordinal", *DATE_COLUMNS])
+
+    def _diff(self, before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+        merged = before.merge(after, on="replacement_id", suffixes=("_before", "_after"))
+        changed = np.zeros(len(merged), dtype=bool)
+        for column in DIFF_COLUMNS:
+            changed |= (merged[f"{column}_before"] != merged[f"{column}_after"]).to_numpy()
+        merged = merged[changed]
+
+        diff = pd.DataFrame({
+            "replacement_id": merged["replacement_id"],
+            "part_id": merged["part_id_before"],
+            "part_name": merged["part_name_before"],
+            "equipment_name": merged["equipment_name_before"],
+            "unit_serial_number": merged["unit_serial_number_before"],
+        })
+        for column in ("zone", "remaining_days", "has_stock"):
+            diff[f"{column}_before"] = merged[f"{column}_before"]
+            diff[f"{column}_after"] = merged[f"{column}_after"]
+        for column in ("yellow_ordinal", "red_ordinal", "init_ordinal"):
+            name = DATE_COLUMNS[column]
+            diff[f"{name}_before"] = _dates(merged[f"{column}_before"])
+            diff[f"{name}_after"] = _dates(merged[f"{column}_after"])
+        diff["init_shift_days"] = (merged["init_ordinal_after"] - merged["init_ordinal_before"]).astype(np.int64)
+        return diff.sort_values(["latest_init_date_after", "replacement_id"]).reset_index(drop=True)
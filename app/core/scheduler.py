@@ -0,0 +1,351 @@
+"""
+Расписание замен по мастерским с учётом их мощности.
+
+План закупок отвечает, когда заказать запчасть, расписание - когда и в какой
+мастерской её поставить. Задание - незаменённая установка, срок службы которой
+истекает до конца горизонта: срок задания - дата отказа, а выполнить замену можно
+не раньше поступления запчасти (со склада - сразу, иначе - по плану закупки).
+Мастерская выполняет не больше daily_capacity замен за рабочий день (будни без
+праздников таблицы holiday); выведенные из эксплуатации мастерские не планируются.
+
+Расписание строится в два этапа:
+1. Жадный проход по рабочим дням: задание попадает в кучу (heapq) за window_days
+   до отказа (но не раньше поступления запчасти), места дня получают задания с
+   самым ранним сроком (earliest deadline first) - в своей мастерской (где была
+   установка), если там есть место, иначе в самой свободной.
+2. Локальный поиск (improve=True): перенос задания на свободное место и обмен
+   местами просроченного задания с более ранним, пока они уменьшают стоимость
+   расписания. Стоимость задания - просрочка (дни после отказа с весом
+   LATE_WEIGHT), замена раньше срока (неиспользованные дни службы запчасти) и
+   TRANSFER_COST за замену не в своей мастерской; незапланированное задание
+   дороже любого места на горизонте. Места задания оцениваются сразу всей
+   матрицей "мастерская x рабочий день" (numpy), без цикла по дням.
+
+Всё считается в памяти, БД не изменяется (данные загружает ReplacementScheduleService).
+"""
+import heapq
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .purchase_calendar import EPOCH_ORDINAL
+
+# Горизонт расписания по умолчанию - квартал, дней
+DEFAULT_HORIZON_DAYS = 91
+# За сколько дней до отказа задание начинает претендовать на место в жадном проходе
+WINDOW_DAYS = 7
+# Рабочие дни недели (date.weekday): понедельник - пятница
+WORK_WEEKDAYS = (0, 1, 2, 3, 4)
+# Стоимость дня просрочки относительно дня замены раньше срока
+LATE_WEIGHT = 10
+# Стоимость замены не в своей мастерской, в днях замены раньше срока
+TRANSFER_COST = 3
+# Предел проходов локального поиска (проход без улучшений завершает поиск раньше)
+MAX_PASSES = 5
+
+# Колонки заданий (ReplacementScheduleService.jobs_frame)
+JOB_COLUMNS = (
+    "replacement_id", "part_id", "part_name", "equipment_id", "equipment_name", "unit_serial_number",
+    "workshop_id", "failure_ordinal", "available_ordinal",
+)
+UNSCHEDULED_REASONS = {
+    "after_horizon": "Запчасть поступит после конца горизонта",
+    "no_capacity": "Не хватило мощности мастерских",
+}
+
+
+def _dates(ordinals):
+    return (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]").tolist()
+
+
+def work_days(start: date, end: date, holidays=()) -> np.ndarray:
+    """Рабочие дни [start, end] - отсортированный массив ordinal (будни без праздников)."""
+    ordinals = np.arange(start.toordinal(), end.toordinal() + 1, dtype=np.int64)
+    # date.fromordinal(1) - понедельник
+    weekdays = (ordinals - 1) % 7
+    holidays = np.fromiter((d.toordinal() if isinstance(d, date) else int(d) for d in holidays), dtype=np.int64)
+    return ordinals[np.isin(weekdays, WORK_WEEKDAYS) & ~np.isin(ordinals, holidays)]
+
+
+class ScheduleResult:
+    """
+    Результат расписания:
+    assignments - запланированные замены (мастерская, дата, дни до/после отказа),
+    unscheduled - задания без места с причиной,
+    calendar - загрузка мастерских по рабочим дням (мощность и число замен),
+    summary - сводка: число заданий, просрочки, переводы в чужие мастерские,
+    загрузка, стоимость после жадного прохода и после локального поиска, время этапов.
+    """
+
+    def __init__(self, assignments: pd.DataFrame, unscheduled: pd.DataFrame, calendar: pd.DataFrame, summary: dict):
+        self.assignments = assignments
+        self.unscheduled = unscheduled
+        self.calendar = calendar
+        self.summary = summary
+
+    def workshop_calendar(self, workshop_id: int) -> pd.DataFrame:
+        """Замены одной мастерской по дням."""
+        return self.assignments[self.assignments["workshop_id"] == workshop_id].reset_index(drop=True)
+
+
+class ReplacementScheduler:
+    def __init__(self, jobs: pd.DataFrame, workshops: pd.DataFrame, holidays=(), start: date | None = None,
+                 horizon_days: int = DEFAULT_HORIZON_DAYS):
+        """
+        jobs - задания (колонки JOB_COLUMNS, ordinal-даты отказа и поступления запчасти;
+        workshop_id - мастерская установки), workshops - действующие мастерские
+        (id, name, daily_capacity), holidays - праздники (date или ordinal).
+        """
+        if horizon_days < 1:
+            raise ValueError("Горизонт расписания должен быть не меньше одного дня")
+        self.start = start or date.today()
+        self.end = self.start + timedelta(days=horizon_days - 1)
+        self.days = work_days(self.start, self.end, holidays)
+        self.jobs = jobs.reset_index(drop=True)
+        self.workshops = workshops.reset_index(drop=True)
+        self.capacity = np.repeat(
+            self.workshops["daily_capacity"].to_numpy(dtype=np.int64).clip(min=0)[:, None], len(self.days), axis=1
+        )
+
+        n = len(self.jobs)
+        self.due = self.jobs["failure_ordinal"].to_numpy(dtype=np.int64)
+        available = np.maximum(self.jobs["available_ordinal"].to_numpy(dtype=np.int64), self.start.toordinal())
+        # Первый рабочий день, в который замена возможна (len(days) - только после горизонта)
+        self.release = np.searchsorted(self.days, available, side="left")
+        positions = {workshop_id: i for i, workshop_id in enumerate(self.workshops["id"].tolist())}
+        # Своя мастерская - индекс в workshops; -1 - мастерская установки выведена или не указана
+        self.home = np.fromiter(
+            (positions.get(workshop_id, -1) for workshop_id in self.jobs["workshop_id"].tolist()), dtype=np.int64, count=n
+        )
+        # Незапланированное задание дороже любого места на горизонте: и просрочки, и замены раньше срока
+        span = max(self.end.toordinal(), int(self.due.max()) if n else 0) - min(
+            self.start.toordinal(), int(self.due.min()) if n else self.start.toordinal()
+        ) + 1
+        self.unscheduled_cost = LATE_WEIGHT * span + TRANSFER_COST + 1
+
+    def _costs(self, jobs, day, workshop) -> np.ndarray:
+        """Стоимость заданий jobs на местах (day, workshop); day = -1 - задание без места."""
+        jobs, day, workshop = (np.asarray(a, dtype=np.int64) for a in (jobs, day, workshop))
+        delta = self.days[np.maximum(day, 0)] - self.due[jobs] if len(self.days) else np.zeros(len(jobs), np.int64)
+        home = self.home[jobs]
+        cost = np.where(delta > 0, LATE_WEIGHT * delta, -delta) + TRANSFER_COST * ((home >= 0) & (workshop != home))
+        return np.where(day >= 0, cost, self.unscheduled_cost)
+
+    def _lower_bounds(self) -> np.ndarray:
+        """Стоимость лучшего дня задания при свободных мастерских: задание на ней улучшать некуда."""
+        n_days = len(self.days)
+        bound = np.full(len(self.jobs), self.unscheduled_cost, dtype=np.int64)
+        if not n_days:
+            return bound
+        # Последний рабочий день не позже отказа и первый после него (если не раньше поступления)
+        before = np.searchsorted(self.days, self.due, side="right") - 1
+        after = np.maximum(before + 1, self.release)
+        ok = (before >= self.release) & (before >= 0)
+        bound[ok] = self.due[ok] - self.days[before[ok]]
+        ok = after < n_days
+        late = LATE_WEIGHT * np.maximum(self.days[np.minimum(after, n_days - 1)] - self.due, 0)
+        bound[ok] = np.minimum(bound[ok], late[ok])
+        return bound
+
+    def _greedy(self, window_days: int):
+        """Жадный проход EDF: день и мастерская каждого задания (-1 - без места) и остаток мощности."""
+        n, n_days = len(self.jobs), len(self.days)
+        day = np.full(n, -1, dtype=np.int64)
+        workshop = np.full(n, -1, dtype=np.int64)
+        free = self.capacity.copy()
+        if not n or not n_days or not free.size:
+            return day, workshop, free
+
+        # Задание претендует на место с первого рабочего дня не раньше due - window_days
+        release = np.maximum(self.release, np.searchsorted(self.days, self.due - window_days, side="left"))
+        order = np.lexsort((self.due, release)).tolist()
+        release, due, home = release.tolist(), self.due.tolist(), self.home.tolist()
+        replacement_ids = self.jobs["replacement_id"].tolist()
+        heap, position = [], 0
+        for d in range(n_days):
+            while position < n and release[order[position]] <= d:
+                j = order[position]
+                heapq.heappush(heap, (due[j], replacement_ids[j], j))
+                position += 1
+            column = free[:, d]
+            remaining = int(column.sum())
+            while heap and remaining:
+                _, _, j = heapq.heappop(heap)
+                w = home[j] if home[j] >= 0 and column[home[j]] > 0 else int(column.argmax())
+                column[w] -= 1
+                remaining -= 1
+                day[j], workshop[j] = d, w
+        return day, workshop, free
+
+    def _relocate(self, day, workshop, free, cost, bound) -> int:
+        """
+        Перенос заданий на лучшее свободное место, начиная с самых дорогих. День
+        выбирается по вектору стоимости дней (своя мастерская свободна - без
+        доплаты, занята, но есть другая - с TRANSFER_COST), мастерская дня - своя
+        или самая свободная, как в жадном проходе. Возвращает число переносов.
+        """
+        candidates = np.flatnonzero(cost > bound)
+        if not candidates.size:
+            return 0
+        n_days = len(self.days)
+        free_days = free.sum(axis=0)
+        # Без свободных мест задание может только остаться на своём
+        if not free_days.any():
+            return 0
+        moves = 0
+        for j in candidates[np.argsort(bound[candidates] - cost[candidates], kind="stable")].tolist():
+            first = int(self.release[j])
+            if first >= n_days:
+                continue
+            d, w, home = int(day[j]), int(workshop[j]), int(self.home[j])
+            # Своё место освобождается на время оценки: задание может остаться на нём
+            if d >= 0:
+                free[w, d] += 1
+                free_days[d] += 1
+            delta = self.days[first:] - self.due[j]
+            day_cost = np.where(delta > 0, LATE_WEIGHT * delta, -delta)
+            if home >= 0:
+                at_home = free[home, first:] > 0
+                day_cost = np.where(at_home, day_cost, day_cost + TRANSFER_COST)
+            day_cost = np.where(free_days[first:] > 0, day_cost, np.iinfo(np.int64).max)
+            best = int(day_cost.argmin())
+            if day_cost[best] < cost[j]:
+                d = first + best
+                w = home if home >= 0 and free[home, d] > 0 else int(free[:, d].argmax())
+                day[j], workshop[j], cost[j] = d, w, day_cost[best]
+                moves += 1
+            if d >= 0:
+                free[w, d] -= 1
+                free_days[d] -= 1
+        return moves
+
+    def _swap(self, day, workshop, cost) -> int:
+        """
+        Обмен местами просроченного задания j с заданием k, стоящим раньше: место
+        k должно быть доступно j, место j - заданию k. Кандидаты - задания, не
+        просроченные на своём месте: обмен двух просроченных переносит дни
+        просрочки с одного на другое и выигрывает только на мастерских. Они
+        упорядочены по дню, и кандидаты j - срез этого списка (обмен не меняет
+        дни мест, только их заданий). Возвращает число обменов.
+        """
+        scheduled = np.flatnonzero(day >= 0)
+        is_late = self.days[day[scheduled]] > self.due[scheduled]
+        late, on_time = scheduled[is_late], scheduled[~is_late]
+        order = on_time[np.argsort(day[on_time], kind="stable")]
+        slot_days = day[order]
+        position = np.full(len(day), -1, dtype=np.int64)
+        position[order] = np.arange(order.size)
+        moves = 0
+        for j in late[np.argsort(-cost[late], kind="stable")].tolist():
+            d, w = int(day[j]), int(workshop[j])
+            lo = int(np.searchsorted(slot_days, self.release[j], side="left"))
+            hi = int(np.searchsorted(slot_days, d, side="left"))
+            if lo >= hi:
+                continue
+            others = order[lo:hi]
+            others = others[self.release[others] <= d]
+            if not others.size:
+                continue
+            j_there = self._costs(np.full(others.size, j), day[others], workshop[others])
+            k_here = self._costs(others, np.full(others.size, d), np.full(others.size, w))
+            gain = cost[j] + cost[others] - j_there - k_here
+            best = int(gain.argmax())
+            if gain[best] <= 0:
+                continue
+            k = int(others[best])
+            day[j], workshop[j], cost[j] = day[k], workshop[k], j_there[best]
+            day[k], workshop[k], cost[k] = d, w, k_here[best]
+            # Место k в списке занимает j; k уходит на место просроченного j
+            order[position[k]] = j
+            position[j], position[k] = position[k], -1
+            moves += 1
+        return moves
+
+    def run(self, improve: bool = True, window_days: int = WINDOW_DAYS) -> ScheduleResult:
+        """Расписание: жадный проход EDF и (improve=True) локальный поиск."""
+        started = time.perf_counter()
+        day, workshop, free = self._greedy(window_days)
+        jobs = np.arange(len(self.jobs))
+        cost = self._costs(jobs, day, workshop)
+        greedy_cost = int(cost.sum())
+        greedy_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        moves = passes = 0
+        if improve and free.size and len(self.jobs):
+            bound = self._lower_bounds()
+            for passes in range(1, MAX_PASSES + 1):
+                moved = self._relocate(day, workshop, free, cost, bound) + self._swap(day, workshop, cost)
+                moves += moved
+                if not moved:
+                    break
+        improve_ms = (time.perf_counter() - started) * 1000
+
+        return self._result(day, workshop, free, cost, {
+            "greedy_cost": greedy_cost,
+            "moves": moves,
+            "passes": passes,
+            "greedy_ms": greedy_ms,
+            "improve_ms": improve_ms,
+        })
+
+    def _result(self, day, workshop, free, cost, stats: dict) -> ScheduleResult:
+        scheduled = day >= 0
+        jobs = self.jobs
+        names = self.workshops["name"].to_numpy(dtype=object)
+        workshop_ids = self.workshops["id"].to_numpy(dtype=np.int64)
+        identity = ["replacement_id", "part_id", "part_name", "equipment_id", "equipment_name", "unit_serial_number"]
+
+        slot = self.days[day[scheduled]] if scheduled.any() else np.zeros(0, dtype=np.int64)
+        due = self.due[scheduled]
+        assignments = jobs.loc[scheduled, identity].reset_index(drop=True)
+        assignments["workshop_id"] = workshop_ids[workshop[scheduled]]
+        assignments["workshop_name"] = names[workshop[scheduled]]
+        assignments["slot_date"] = _dates(slot)
+        assignments["failure_date"] = _dates(due)
+        assignments["available_date"] = _dates(np.maximum(jobs.loc[scheduled, "available_ordinal"], self.start.toordinal()))
+        assignments["days_early"] = np.maximum(due - slot, 0)
+        assignments["days_late"] = np.maximum(slot - due, 0)
+        assignments["home_workshop"] = assignments["workshop_id"].to_numpy() == jobs.loc[scheduled, "workshop_id"].to_numpy()
+        assignments = assignments.sort_values(["slot_date", "workshop_id", "failure_date"], kind="stable", ignore_index=True)
+
+        unscheduled = jobs.loc[~scheduled, identity].reset_index(drop=True)
+        unscheduled["failure_date"] = _dates(self.due[~scheduled])
+        unscheduled["available_date"] = _dates(jobs.loc[~scheduled, "available_ordinal"])
+        unscheduled["reason"] = np.where(
+            self.release[~scheduled] >= len(self.days),
+            UNSCHEDULED_REASONS["after_horizon"],
+            UNSCHEDULED_REASONS["no_capacity"],
+        )
+
+        n_workshops, n_days = self.capacity.shape
+        calendar = pd.DataFrame({
+            "workshop_id": np.repeat(workshop_ids, n_days),
+            "workshop_name": np.repeat(names, n_days),
+            "date": _dates(np.tile(self.days, n_workshops)),
+            "capacity": self.capacity.ravel(),
+            "booked": (self.capacity - free).ravel(),
+        })
+
+        total_capacity = int(self.capacity.sum())
+        late = assignments["days_late"].to_numpy()
+        summary = {
+            "start": self.start,
+            "end": self.end,
+            "work_days": n_days,
+            "workshops": n_workshops,
+            "jobs": len(jobs),
+            "scheduled": int(scheduled.sum()),
+            "unscheduled": int((~scheduled).sum()),
+            "late": int((late > 0).sum()),
+            "days_late_total": int(late.sum()),
+            "days_late_max": int(late.max()) if late.size else 0,
+            "days_early_mean": float(assignments["days_early"].mean()) if len(assignments) else 0.0,
+            "transfers": int((~assignments["home_workshop"]).sum()),
+            "utilization": float((total_capacity - free.sum()) / total_capacity) if total_capacity else 0.0,
+            "cost": int(cost.sum()),
+            **stats,
+        }
+        return ScheduleResult(assignments, unscheduled, calendar, summary)
@@ -0,0 +1,45 @@
+"""
+Поиск по началу названия в справочниках (запчасти, оборудование, мастерские).
+
+LIKE 'префикс%' в SQLite использует индекс только при регистронезависимом
+сравнении ASCII, а названия здесь кириллические. Поэтому у справочников есть
+колонка name_key - название в нормализованном виде (search_key: без учёта
+регистра, ё = е, лишние пробелы убраны), которая заполняется при записи name.
+Поиск по префиксу - диапазон name_key >= :prefix AND name_key < :upper по индексу
+idx_<таблица>_name_key с LIMIT: стоимость не зависит от размера справочника.
+"""
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+
+# Сколько строк возвращает поиск по умолчанию
+SEARCH_LIMIT = 50
+BACKFILL_BATCH_SIZE = 1000
+
+
+def search_key(value: str | None) -> str:
+    """Нормализованное название для поиска по префиксу."""
+    return " ".join((value or "").split()).casefold().replace("ё", "е")
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Наименьшая строка больше всех строк, начинающихся с prefix (непустого)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def backfill_search_keys(session: Session) -> int:
+    """Заполняет name_key в строках, записанных до появления колонки. Возвращает число строк."""
+    from .models import Equipment, Part, Workshop
+
+    filled = 0
+    for model in (Equipment, Part, Workshop):
+        table = model.__table__
+        stmt = update(table).where(table.c.id == bindparam("b_id")).values(name_key=bindparam("b_key"))
+        while True:
+            rows = session.execute(
+                select(table.c.id, table.c.name).where(table.c.name_key.is_(None)).limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            session.execute(stmt, [{"b_id": obj_id, "b_key": search_key(name)} for obj_id, name in rows])
+            filled += len(rows)
+    return filled
@@ -1,12 +1,80 @@
-from datetime import date, timedelta
+from contextlib import contextmanager
+from dataclasses import fields
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import and_, case, cast, false, func, Integer, null, or_, select, String, true, type_coerce, update
 from sqlalchemy.orm import Session
-
+from sqlalchemy.orm.exc import StaleDataError
+
+from .forecast import (
+    DEFAULT_WEIBULL_SHAPE,
+    fit_weibull,
+    simulate_demand,
+    weibull_scale_for_mean,
+    window_edges,
+)
+from .archive import ARCHIVE_AGE_DAYS, archive_closed, replacement_history
+from .purchase_calendar import (
+    EPOCH_ORDINAL,
+    PurchaseCalendar,
+    PurchaseCalendars,
+    parse_purchase_days,
+    supplier_codes,
+)
+from .lifetime import summarize_lifetimes
+from .search import SEARCH_LIMIT, prefix_upper_bound, search_key
+from .read_models import (
+    EquipmentRow,
+    OptionRow,
+    PartRow,
+    ReplacementRow,
+    ReplacementTypeRow,
+    WorkshopRow,
+    to_arrow,
+)
+from .scheduler import DEFAULT_HORIZON_DAYS, WINDOW_DAYS, ReplacementScheduler, ScheduleResult
+from .retire import (
+    ReferencedError,
+    delete_equipment,
+    delete_parts,
+    delete_workshops,
+    retire_equipment,
+    retire_parts,
+    retire_workshops,
+)
+from .snapshots import refresh_snapshots
+from .stock import (
+    ADJUSTMENT,
+    InsufficientStockError,
+    apply_movement,
+    issue,
+    receive,
+    record_opening_balances,
+    set_balance,
+    stock_as_of,
+    write_checkpoints,
+)
+from .wear import ZONES, fleet_wear, wear_arrays
+from .writer import WriteBehind
 from .models import (
     Part,
     Equipment,
     Workshop,
+    Supplier,
+    Holiday,
+    StockMovement,
     ReplacementType,
-    ReplacementLog
+    ReplacementLog,
+    ReplacementLogArchive,
+    Replacements,
+    Retirable,
+    DataVersion,
+    LifetimeStat,
+    ZoneTransition,
+    AlertOutbox,
+    WearSnapshot,
 )
 
 # -------------------------------
@@ -52,57 +120,8 @@ def compute_wear(part_useful_life_days: int, installation_date: date, replacemen
     return percentage_left, remaining_days, zone
 
 
-PURCHASE_DAYS = (10, 25)
-
-
-def nearest_purchase_day(target_date: date) -> date:
-    """
-    Возвращает ближайшую дату закупки: 10 или 25 число.
-    Если день 1-9: возвращает 10 число текущего месяца
-    Если день 10-24: возвращает 25 число текущего месяца (или 10, если уже прошло 25)
-    Если день 25-31: возвращает 10 число следующего месяца
-    """
-    day = target_date.day
-
-    if day <= 9:
-        # До 9 числа - можно закупить 10 числа текущего месяца
-        return target_date.replace(day=10)
-    elif day <= 24:
-        # До 24 числа - можно закупить 25 числа текущего месяца
-        return target_date.replace(day=25)
-    else:
-        # После 24 числа - следующая закупка 10 числа следующего месяца
-        if target_date.month == 12:
-            return date(target_date.year + 1, 1, 10)
-        return date(target_date.year, target_date.month + 1, 10)
-
-
-def previous_purchase_day(target_date: date) -> date:
-    """
-    Возвращает предыдущую дату закупки (10 или 25 число) до указанной даты.
-    Используется для расчета самой поздней даты инициации закупки.
-    """
-    day = target_date.day
-
-    if day >= 25:
-        # Если 25 или позже - можно было закупить 25 числа текущего месяца
-        return target_date.replace(day=25)
-    elif day >= 10:
-        # Если 10-24 - можно было закупить 10 числа текущего месяца
-        return target_date.replace(day=10)
-    else:
-        # Если до 10 - нужно было закупить 25 числа предыдущего месяца
-        if target_date.month == 1:
-            return date(target_date.year - 1, 12, 25)
-        # Проверяем, сколько дней в предыдущем месяце
-        from calendar import monthrange
-        prev_month = target_date.month - 1
-        prev_year = target_date.year
-        _, last_day = monthrange(prev_year, prev_month)
-        return date(prev_year, prev_month, min(25, last_day))
-
-
-def compute_latest_init_date(installation_date: date, useful_life_days: int, lead_time_days: int):
+def compute_latest_init_date(installation_date: date, useful_life_days: int, lead_time_days: int,
+                             calendar: PurchaseCalendar | None = None):
     """
     Высчитывает последнюю дату, когда можно инициировать закупку.
 
@@ -110,76 +129,18 @@ def compute_latest_init_date(installation_date: date, useful_life_days: int, lea
     инициации закупки + срок закупки запчасти."
 
     Интерпретация: если инициируем закупку в месяце M, то закупка произойдет
-    10 или 25 числа месяца M+1, а получение через lead_time_days после закупки.
-
-    Логика:
-    1. failure_date = дата окончания срока службы запчасти
-    2. Нужно получить запчасть до failure_date
-    3. Перебираем возможные даты закупки (10 и 25 числа) и находим самую позднюю,
-       такую что закупка + lead_time_days <= failure_date
-    4. От даты закупки вычисляем дату инициации (месяц до закупки)
+    в дату закупки месяца M+1, а получение через lead_time_days после закупки.
+    Даты закупки берутся из календаря (по умолчанию 10 и 25 число), см.
+    PurchaseCalendar.latest_init_dates.
     """
+    calendar = calendar or PurchaseCalendar()
     failure_date = installation_date + timedelta(days=useful_life_days)
-
-    # Перебираем возможные даты закупки (10 и 25 числа) в обратном порядке
-    # и находим самую позднюю, такую что закупка + lead_time_days <= failure_date
-    candidates = []
-
-    # Проверяем даты закупки в текущем и предыдущих месяцах
-    for months_back in range(0, 13):  # Проверяем до года назад
-        if months_back == 0:
-            check_year = failure_date.year
-            check_month = failure_date.month
-        else:
-            if failure_date.month > months_back:
-                check_year = failure_date.year
-                check_month = failure_date.month - months_back
-            else:
-                check_year = failure_date.year - 1
-                check_month = 12 - (months_back - failure_date.month)
-
-        # Проверяем 25 число
-        try:
-            purchase_25 = date(check_year, check_month, 25)
-            receipt_25 = purchase_25 + timedelta(days=lead_time_days)
-            if receipt_25 <= failure_date:
-                # Инициация должна быть в предыдущем месяце
-                if check_month == 1:
-                    init_date = date(check_year - 1, 12, 1)
-                else:
-                    init_date = date(check_year, check_month - 1, 1)
-                candidates.append((purchase_25, init_date, receipt_25))
-        except ValueError:
-            pass
-
-        # Проверяем 10 число
-        try:
-            purchase_10 = date(check_year, check_month, 10)
-            receipt_10 = purchase_10 + timedelta(days=lead_time_days)
-            if receipt_10 <= failure_date:
-                # Инициация должна быть в предыдущем месяце
-                if check_month == 1:
-                    init_date = date(check_year - 1, 12, 1)
-                else:
-                    init_date = date(check_year, check_month - 1, 1)
-                candidates.append((purchase_10, init_date, receipt_10))
-        except ValueError:
-            pass
-
-    # Находим самую позднюю дату закупки
-    if candidates:
-        latest_purchase_date, latest_init_date, receipt_date = max(candidates, key=lambda x: x[0])
-    else:
-        # Если ничего не найдено (маловероятно), используем безопасные значения
-        latest_purchase_date = failure_date - timedelta(days=lead_time_days + 30)
-        latest_init_date = latest_purchase_date - timedelta(days=30)
-        receipt_date = latest_purchase_date + timedelta(days=lead_time_days)
-
+    init, purchase, receipt = calendar.latest_init_dates([failure_date.toordinal()], [lead_time_days])
     return {
         "failure_date": failure_date,
-        "latest_init_date": latest_init_date,
-        "latest_purchase_date": latest_purchase_date,
-        "receipt_date": receipt_date,
+        "latest_init_date": date.fromordinal(int(init[0])),
+        "latest_purchase_date": date.fromordinal(int(purchase[0])),
+        "receipt_date": date.fromordinal(int(receipt[0])),
     }
 
 
@@ -187,174 +148,599 @@ def compute_latest_init_date(installation_date: date, useful_life_days: int, lea
 #  Сервисный слой
 # -------------------------------
 
-class PartService:
-    def __init__(self, db: Session):
-        self.db = db
+# Глубина вложенности services.transaction() хранится в session.info
+TRANSACTION_DEPTH_KEY = "transaction_depth"
+# Ограничение числа параметров в одном запросе IN (...)
+BATCH_QUERY_SIZE = 500
 
-    def list(self):
-        return self.db.query(Part).all()
 
-    def get(self, part_id: int):
-        return self.db.query(Part).filter(Part.id == part_id).first()
+class ConflictError(Exception):
+    """Запись изменена другой сессией после того, как её загрузили для редактирования."""
 
-    def create(self, **kwargs):
-        obj = Part(**kwargs)
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
-        return obj
+    def __init__(self, table: str, obj_id: int | None = None, expected_version: int | None = None,
+                 actual_version: int | None = None):
+        self.table = table
+        self.obj_id = obj_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+        if obj_id is None:
+            message = f"Запись таблицы {table} изменена или удалена другим пользователем"
+        else:
+            message = (f"Запись {table} #{obj_id} изменена другим пользователем "
+                       f"(версия {actual_version}, загружена {expected_version})")
+        super().__init__(message)
 
-    def update(self, part_id: int, **kwargs):
-        obj = self.get(part_id)
-        if not obj:
-            return None
-        for k, v in kwargs.items():
-            setattr(obj, k, v)
-        self.db.commit()
-        return obj
 
-    def delete(self, part_id: int):
-        obj = self.get(part_id)
-        if obj:
-            self.db.delete(obj)
-            self.db.commit()
-        return obj
+class BaseService:
+    """
+    Общие CRUD-операции над одной моделью. Наследники задают атрибут model и,
+    для списков только для чтения, row_model (core/read_models.py).
+    """
 
+    model = None
+    row_model = None
 
-class EquipmentService:
     def __init__(self, db: Session):
         self.db = db
 
-    def list(self):
-        return self.db.query(Equipment).all()
-
-    def get(self, id: int):
-        return self.db.query(Equipment).filter(Equipment.id == id).first()
+    def list(self, offset: int = 0, limit: int | None = None):
+        query = self.db.query(self.model).order_by(self.model.id)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def count(self, **filters) -> int:
+        query = self.db.query(func.count(self.model.id))
+        for name, value in filters.items():
+            query = query.filter(getattr(self.model, name) == value)
+        return query.scalar()
+
+    def _row_select(self):
+        """Запрос колонок read-модели; наследники добавляют join для связанных названий."""
+        return select(*(getattr(self.model, field.name) for field in fields(self.row_model)))
+
+    def _rows_query(self, offset: int = 0, limit: int | None = None, order_by=None, **filters):
+        stmt = self._row_select()
+        for name, value in filters.items():
+            stmt = stmt.where(getattr(self.model, name) == value)
+        stmt = stmt.order_by(*(order_by if order_by is not None else (self.model.id,)))
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return stmt
+
+    def list_rows(self, offset: int = 0, limit: int | None = None, **filters):
+        """
+        Список только для чтения: неизменяемые строки row_model без ORM-объектов.
+        filters - равенство по колонкам модели (None - IS NULL).
+        """
+        return [self.row_model(*row) for row in self.db.execute(self._rows_query(offset, limit, **filters))]
+
+    def _option_select(self):
+        """Запрос колонок OptionRow; наследники добавляют уточнение к названию."""
+        return select(self.model.id, self.model.name, null())
+
+    def search(self, prefix: str = "", limit: int = SEARCH_LIMIT, include_retired: bool = False):
+        """
+        Варианты выбора (OptionRow), название которых начинается с prefix (без учёта
+        регистра), по алфавиту, не больше limit. Для справочников с name_key
+        (Searchable): диапазон по индексу, стоимость не зависит от размера справочника.
+        Выведенные из эксплуатации записи (Retirable) - только при include_retired.
+        """
+        stmt = self._option_select()
+        if issubclass(self.model, Retirable) and not include_retired:
+            stmt = stmt.where(self.model.retired_at.is_(None))
+        key = search_key(prefix)
+        if key:
+            stmt = stmt.where(self.model.name_key >= key, self.model.name_key < prefix_upper_bound(key))
+        stmt = stmt.order_by(self.model.name_key, self.model.id).limit(limit)
+        return [OptionRow(*row) for row in self.db.execute(stmt)]
+
+    def option(self, obj_id: int) -> OptionRow | None:
+        """Вариант выбора для одной записи (уже выбранное значение поля) - поиском по id."""
+        row = self.db.execute(self._option_select().where(self.model.id == obj_id)).first()
+        return OptionRow(*row) if row else None
+
+    def arrow(self, offset: int = 0, limit: int | None = None, **filters):
+        """То же, что list_rows, но колонками в pyarrow.Table - для больших выгрузок."""
+        stmt = self._rows_query(offset, limit, **filters)
+        return to_arrow(self.db.execute(stmt), stmt.selected_columns)
+
+    def iter_batches(self, batch_size: int = 1000):
+        """
+        Постраничный обход всей таблицы по первичному ключу (keyset pagination).
+        В отличие от offset, стоимость каждой страницы не растёт с её номером.
+        """
+        last_id = 0
+        while True:
+            batch = (
+                self.db.query(self.model)
+                .filter(self.model.id > last_id)
+                .order_by(self.model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1].id
+
+    def get(self, obj_id: int):
+        return self.db.query(self.model).filter(self.model.id == obj_id).first()
+
+    def _commit(self):
+        """
+        Фиксация после изменения. Внутри services.transaction() изменения только
+        сбрасываются в БД (чтобы появились id), а фиксирует их сам контекст.
+        UPDATE/DELETE версионируемой записи, которую успела изменить другая сессия,
+        превращается в ConflictError.
+        """
+        try:
+            if self.db.info.get(TRANSACTION_DEPTH_KEY):
+                self.db.flush()
+                return False
+            self.db.commit()
+            return True
+        except StaleDataError as e:
+            self._rollback()
+            raise ConflictError(self.model.__tablename__) from e
+
+    def _rollback(self):
+        """Откат после ошибки; внутри services.transaction() откатывает сам контекст."""
+        if not self.db.info.get(TRANSACTION_DEPTH_KEY):
+            self.db.rollback()
+
+    def _check_version(self, obj, expected_version: int | None):
+        """
+        Сверка версии, с которой пользователь начал редактирование. Объект из карты
+        идентичности мог устареть, поэтому перед отказом он перечитывается.
+        """
+        if expected_version is None or obj.version == expected_version:
+            return
+        self.db.refresh(obj)
+        if obj.version != expected_version:
+            actual_version = obj.version
+            self._rollback()
+            raise ConflictError(self.model.__tablename__, obj.id, expected_version, actual_version)
+
+    def _bulk(self, operation, ids, expected_versions: dict | None = None, **kwargs) -> int:
+        """
+        Операция набором SQL-операторов над записями ids (core/retire.py) одной
+        транзакцией. expected_versions - {id: версия} для проверки конфликтов (все или
+        ничего). Объекты сессии после операции помечаются устаревшими.
+        """
+        ids = list(dict.fromkeys(ids))
+        self.db.flush()
+        if expected_versions:
+            for i in range(0, len(ids), BATCH_QUERY_SIZE):
+                batch = ids[i:i + BATCH_QUERY_SIZE]
+                for obj_id, version in self.db.execute(
+                    select(self.model.id, self.model.version).where(self.model.id.in_(batch))
+                ):
+                    expected = expected_versions.get(obj_id)
+                    if expected is not None and version != expected:
+                        self._rollback()
+                        raise ConflictError(self.model.__tablename__, obj_id, expected, version)
+        try:
+            count = operation(self.db, ids, **kwargs)
+        except Exception:
+            self._rollback()
+            raise
+        self._commit()
+        self.db.expire_all()
+        return count
+
+    def _get_many(self, ids):
+        ids = list(dict.fromkeys(ids))
+        objects = {}
+        for i in range(0, len(ids), BATCH_QUERY_SIZE):
+            for obj in self.db.query(self.model).filter(self.model.id.in_(ids[i:i + BATCH_QUERY_SIZE])):
+                objects[obj.id] = obj
+        return objects
 
     def create(self, **kwargs):
-        obj = Equipment(**kwargs)
+        obj = self.model(**kwargs)
         self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
+        if self._commit():
+            self.db.refresh(obj)
         return obj
 
-    def update(self, equipment_id: int, **kwargs):
-        obj = self.get(equipment_id)
+    def create_many(self, rows):
+        """Создание нескольких записей одной транзакцией. rows - список словарей полей."""
+        objects = [self.model(**row) for row in rows]
+        self.db.add_all(objects)
+        self._commit()
+        return objects
+
+    def update(self, obj_id: int, expected_version: int | None = None, **kwargs):
+        """
+        Изменение записи. expected_version - версия, загруженная в форму: если запись
+        с тех пор изменили, поднимается ConflictError и ничего не записывается.
+        """
+        obj = self.get(obj_id)
         if not obj:
             return None
-        for k, v in kwargs.items():
-            setattr(obj, k, v)
-        self.db.commit()
+        self._check_version(obj, expected_version)
+        self._apply(obj, kwargs, expected_version)
+        self._commit()
         return obj
 
-    def delete(self, equipment_id: int):
-        obj = self.get(equipment_id)
+    def update_many(self, changes: dict, expected_versions: dict | None = None):
+        """
+        Изменение нескольких записей одной транзакцией: changes - {id: {поле: значение}},
+        expected_versions - {id: версия} для проверки конфликтов (все или ничего).
+        Записи загружаются одним запросом; несуществующие id пропускаются.
+        Возвращает список изменённых объектов.
+        """
+        objects = self._get_many(changes)
+        for obj_id, values in changes.items():
+            obj = objects.get(obj_id)
+            if obj is None:
+                continue
+            expected_version = (expected_versions or {}).get(obj_id)
+            self._check_version(obj, expected_version)
+            self._apply(obj, values, expected_version)
+        self._commit()
+        return [objects[obj_id] for obj_id in changes if obj_id in objects]
+
+    def _apply(self, obj, values: dict, expected_version: int | None = None):
+        """
+        Запись значений полей в существующую запись, уже сверенную по версии
+        expected_version (наследникам, которые пишут в обход ORM).
+        """
+        for k, v in values.items():
+            setattr(obj, k, v)
+
+    def delete(self, obj_id: int, expected_version: int | None = None):
+        obj = self.get(obj_id)
         if obj:
+            self._check_version(obj, expected_version)
             self.db.delete(obj)
-            self.db.commit()
+            self._commit()
         return obj
 
+    def delete_many(self, ids) -> int:
+        """Удаление нескольких записей одной транзакцией. Возвращает число удалённых."""
+        objects = self._get_many(ids)
+        for obj in objects.values():
+            self.db.delete(obj)
+        self._commit()
+        return len(objects)
 
-class WorkshopService:
-    def __init__(self, db: Session):
-        self.db = db
-
-    def list(self):
-        return self.db.query(Workshop).all()
 
-    def get(self, workshop_id: int):
-        return self.db.query(Workshop).filter(Workshop.id == workshop_id).first()
+class PartService(BaseService):
+    model = Part
+    row_model = PartRow
 
     def create(self, **kwargs):
-        obj = Workshop(**kwargs)
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
-        return obj
+        # Начальный остаток записывается в журнал склада той же транзакцией
+        part = self.model(**kwargs)
+        self.db.add(part)
+        self.db.flush()
+        record_opening_balances(self.db, [part])
+        if self._commit():
+            self.db.refresh(part)
+        return part
+
+    def create_many(self, rows):
+        parts = [self.model(**row) for row in rows]
+        self.db.add_all(parts)
+        self.db.flush()
+        record_opening_balances(self.db, parts)
+        self._commit()
+        return parts
+
+    def _apply(self, obj, values: dict, expected_version: int | None = None):
+        """
+        Изменение карточки; qty_in_stock - остаток по инвентаризации (корректировка в
+        журнале склада). Корректировка пишется в обход ORM, поэтому версия сверяется
+        условным UPDATE в БД, а не по объекту карты идентичности, который мог
+        устареть: при конфликте в журнал склада ничего не попадает.
+        """
+        values = dict(values)
+        if "qty_in_stock" in values:
+            if expected_version is not None:
+                bumped = self.db.execute(
+                    update(Part)
+                    .where(Part.id == obj.id, Part.version == expected_version)
+                    .values(version=Part.version + 1)
+                    .execution_options(synchronize_session="fetch")
+                ).rowcount
+                if not bumped:
+                    self.db.refresh(obj)
+                    actual_version = obj.version
+                    self._rollback()
+                    raise ConflictError(self.model.__tablename__, obj.id, expected_version, actual_version)
+            set_balance(self.db, obj.id, values.pop("qty_in_stock"))
+        super()._apply(obj, values)
+
+    def _row_select(self):
+        return (
+            select(
+                Part.id,
+                Part.name,
+                Part.parent_equipment_id,
+                Equipment.name.label("equipment_name"),
+                Part.useful_life_days,
+                Part.qty_per_unit,
+                Part.qty_in_stock,
+                Part.lead_time_days,
+                Part.supplier_id,
+                Part.retired_at,
+            )
+            .join(Equipment, Equipment.id == Part.parent_equipment_id)
+        )
 
-    def update(self, workshop_id: int, **kwargs):
-        obj = self.get(workshop_id)
-        if not obj:
-            return None
-        for k, v in kwargs.items():
-            setattr(obj, k, v)
-        self.db.commit()
-        return obj
+    def _option_select(self):
+        return select(Part.id, Part.name, Equipment.name).join(Equipment, Equipment.id == Part.parent_equipment_id)
 
-    def delete(self, workshop_id: int):
-        obj = self.get(workshop_id)
-        if obj:
-            self.db.delete(obj)
-            self.db.commit()
-        return obj
+    def delete(self, obj_id: int, expected_version: int | None = None, with_history: bool = False) -> int:
+        """
+        Удаление запчасти с журналом склада. С историей замен - только при
+        with_history=True (вместе с историей), иначе ReferencedError.
+        """
+        return self._bulk(delete_parts, [obj_id], {obj_id: expected_version}, with_history=with_history)
 
+    def delete_many(self, ids, with_history: bool = False) -> int:
+        return self._bulk(delete_parts, ids, with_history=with_history)
+
+    def retire(self, obj_id: int, expected_version: int | None = None, retired_on: date | None = None) -> int:
+        """Вывод запчасти из эксплуатации: незаменённые установки закрываются датой вывода."""
+        return self._bulk(retire_parts, [obj_id], {obj_id: expected_version}, retired_on=retired_on)
+
+    def retire_many(self, ids, retired_on: date | None = None) -> int:
+        return self._bulk(retire_parts, ids, retired_on=retired_on)
 
-class ReplacementTypeService:
-    def __init__(self, db: Session):
-        self.db = db
 
-    def list(self):
-        return self.db.query(ReplacementType).all()
+class SupplierService(BaseService):
+    model = Supplier
 
-    def get(self, type_id: int):
-        return self.db.query(ReplacementType).filter(ReplacementType.id == type_id).first()
+    @staticmethod
+    def _normalized(fields: dict) -> dict:
+        # Дни закупки проверяются и хранятся в виде "10,25"
+        if "purchase_days" in fields:
+            fields["purchase_days"] = ",".join(map(str, parse_purchase_days(fields["purchase_days"])))
+        return fields
 
     def create(self, **kwargs):
-        obj = ReplacementType(**kwargs)
-        self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
-        return obj
+        return super().create(**self._normalized(kwargs))
 
-    def update(self, type_id: int, **kwargs):
-        obj = self.get(type_id)
-        if not obj:
-            return None
-        for k, v in kwargs.items():
-            setattr(obj, k, v)
-        self.db.commit()
-        return obj
+    def update(self, obj_id: int, expected_version: int | None = None, **kwargs):
+        return super().update(obj_id, expected_version=expected_version, **self._normalized(kwargs))
 
-    def delete(self, type_id: int):
-        obj = self.get(type_id)
-        if obj:
-            self.db.delete(obj)
-            self.db.commit()
-        return obj
 
+class HolidayService(BaseService):
+    model = Holiday
 
-class ReplacementService:
-    def __init__(self, db: Session):
-        self.db = db
+    def list(self, offset: int = 0, limit: int | None = None):
+        query = self.db.query(Holiday).order_by(Holiday.holiday_date)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
 
-    def list(self):
-        return self.db.query(ReplacementLog).all()
 
-    def get(self, replacement_id: int):
-        return self.db.query(ReplacementLog).filter(ReplacementLog.id == replacement_id).first()
+class EquipmentService(BaseService):
+    model = Equipment
+    row_model = EquipmentRow
 
-    def create(self, **kwargs):
-        obj = ReplacementLog(**kwargs)
+    def _row_select(self):
+        return (
+            select(
+                Equipment.id,
+                Equipment.name,
+                Equipment.available_units,
+                func.count(Part.id).label("part_count"),
+                Equipment.retired_at,
+            )
+            .outerjoin(Part, Part.parent_equipment_id == Equipment.id)
+            .group_by(Equipment.id)
+        )
+
+    def delete(self, obj_id: int, expected_version: int | None = None, with_history: bool = False) -> int:
+        """
+        Удаление оборудования вместе с запчастями. С историей замен - только при
+        with_history=True (вместе с историей), иначе ReferencedError.
+        """
+        return self._bulk(delete_equipment, [obj_id], {obj_id: expected_version}, with_history=with_history)
+
+    def delete_many(self, ids, with_history: bool = False) -> int:
+        return self._bulk(delete_equipment, ids, with_history=with_history)
+
+    def retire(self, obj_id: int, expected_version: int | None = None, retired_on: date | None = None) -> int:
+        """Вывод оборудования из эксплуатации вместе с запчастями; незаменённые установки закрываются."""
+        return self._bulk(retire_equipment, [obj_id], {obj_id: expected_version}, retired_on=retired_on)
+
+    def retire_many(self, ids, retired_on: date | None = None) -> int:
+        return self._bulk(retire_equipment, ids, retired_on=retired_on)
+
+
+class WorkshopService(BaseService):
+    model = Workshop
+    row_model = WorkshopRow
+
+    def _row_select(self):
+        # Число замен - по всей истории, включая архив: по подзапросу на таблицу,
+        # каждый - поиск по индексу workshop_id
+        counts = [
+            select(func.count()).where(table.c.workshop_id == Workshop.id).scalar_subquery()
+            for table in (ReplacementLog.__table__, ReplacementLogArchive.__table__)
+        ]
+        return select(
+            Workshop.id, Workshop.name, Workshop.addr, Workshop.daily_capacity,
+            (counts[0] + counts[1]).label("replacement_count"),
+            Workshop.retired_at,
+        )
+
+    def _option_select(self):
+        return select(Workshop.id, Workshop.name, Workshop.addr)
+
+    def delete(self, obj_id: int, expected_version: int | None = None, reassign_to: int | None = None) -> int:
+        """
+        Удаление мастерской. Её история замен переносится на мастерскую reassign_to;
+        без него мастерская с историей не удаляется (ReferencedError).
+        """
+        return self._bulk(delete_workshops, [obj_id], {obj_id: expected_version}, reassign_to=reassign_to)
+
+    def delete_many(self, ids, reassign_to: int | None = None) -> int:
+        return self._bulk(delete_workshops, ids, reassign_to=reassign_to)
+
+    def retire(self, obj_id: int, expected_version: int | None = None, retired_on: date | None = None) -> int:
+        """Вывод мастерской из эксплуатации: история сохраняется, в поле выбора она больше не предлагается."""
+        return self._bulk(retire_workshops, [obj_id], {obj_id: expected_version}, retired_on=retired_on)
+
+    def retire_many(self, ids, retired_on: date | None = None) -> int:
+        return self._bulk(retire_workshops, ids, retired_on=retired_on)
+
+
+# Название типа замены: в БД хранится имя элемента перечисления, в интерфейсе - его значение
+REPLACEMENT_TYPE_NAME = case(
+    {member.name: member.value for member in Replacements},
+    value=type_coerce(ReplacementType.name, String),
+)
+
+
+class ReplacementTypeService(BaseService):
+    model = ReplacementType
+    row_model = ReplacementTypeRow
+
+    def _row_select(self):
+        return select(ReplacementType.id, REPLACEMENT_TYPE_NAME.label("name"))
+
+
+class ReplacementService(BaseService):
+    model = ReplacementLog
+    row_model = ReplacementRow
+
+    def _row_select(self, source=None):
+        """source - таблица журнала или подзапрос с теми же колонками (replacement_history)."""
+        log = ReplacementLog.__table__ if source is None else source
+        return (
+            select(
+                log.c.id,
+                log.c.part_id,
+                Part.name.label("part_name"),
+                log.c.equipment_id,
+                Equipment.name.label("equipment_name"),
+                log.c.unit_serial_number,
+                log.c.workshop_id,
+                Workshop.name.label("workshop_name"),
+                log.c.replacement_type_id,
+                REPLACEMENT_TYPE_NAME.label("type_name"),
+                log.c.installation_date,
+                log.c.replacement_date,
+                log.c.comments,
+            )
+            .join(Part, Part.id == log.c.part_id)
+            .join(Equipment, Equipment.id == log.c.equipment_id)
+            .join(Workshop, Workshop.id == log.c.workshop_id)
+            .join(ReplacementType, ReplacementType.id == log.c.replacement_type_id)
+        )
+
+    def history_rows(self, equipment_id: int | None = None):
+        """
+        История замен для таблиц, включая архив: по оборудованию - новые установки первыми.
+        """
+        history = replacement_history()
+        stmt = self._row_select(history)
+        if equipment_id is None:
+            stmt = stmt.order_by(history.c.id)
+        else:
+            stmt = stmt.where(history.c.equipment_id == equipment_id).order_by(
+                history.c.installation_date.desc(), history.c.id.desc()
+            )
+        return [ReplacementRow(*row) for row in self.db.execute(stmt)]
+
+    def history_count(self, **filters) -> int:
+        """Число записей во всей истории (горячая таблица и архив)."""
+        history = replacement_history()
+        stmt = select(func.count()).select_from(history)
+        for name, value in filters.items():
+            stmt = stmt.where(history.c[name] == value)
+        return self.db.execute(stmt).scalar()
+
+    def history_batches(self, batch_size: int = 1000):
+        """Постраничный обход всей истории по id (как iter_batches), записи - словари колонок."""
+        history = replacement_history()
+        last_id = 0
+        while True:
+            batch = self.db.execute(
+                select(history).where(history.c.id > last_id).order_by(history.c.id).limit(batch_size)
+            ).mappings().all()
+            if not batch:
+                return
+            yield [dict(row) for row in batch]
+            last_id = batch[-1]["id"]
+
+    def install(self, issue_stock: bool = True, **fields):
+        """
+        Новая установка; issue_stock - списать запчасть со склада в той же транзакции.
+        При нехватке запаса (InsufficientStockError) установка не сохраняется.
+        """
+        obj = self.model(**fields)
         self.db.add(obj)
-        self.db.commit()
-        self.db.refresh(obj)
+        if issue_stock:
+            try:
+                self.db.flush()
+                issue(self.db, obj.part_id, movement_date=obj.installation_date, replacement_id=obj.id)
+            except InsufficientStockError:
+                self._rollback()
+                raise
+        if self._commit():
+            self.db.refresh(obj)
         return obj
 
-    def update(self, replacement_id: int, **kwargs):
-        obj = self.get(replacement_id)
-        if not obj:
-            return None
-        for k, v in kwargs.items():
-            setattr(obj, k, v)
-        self.db.commit()
-        return obj
+    def archive(self, older_than_days: int = ARCHIVE_AGE_DAYS, today: date | None = None) -> int:
+        """Перенос старых закрытых записей в архив (core/archive.py)."""
+        moved = archive_closed(self.db, older_than_days=older_than_days, today=today)
+        self._commit()
+        return moved
 
-    def delete(self, replacement_id: int):
-        obj = self.get(replacement_id)
-        if obj:
-            self.db.delete(obj)
-            self.db.commit()
-        return obj
+    def list_open(self):
+        """Установки, которые ещё не заменены (по запчасти и дате установки - порядок индекса idx_replacement_open)."""
+        return (
+            self.db.query(ReplacementLog)
+            .filter(ReplacementLog.replacement_date.is_(None))
+            .order_by(ReplacementLog.part_id, ReplacementLog.installation_date)
+            .all()
+        )
+
+    def open_installations_frame(self, part_ids=None) -> pd.DataFrame:
+        """
+        Все незаменённые установки (только указанных запчастей, если part_ids задан)
+        одним запросом вместе с нужными полями запчасти и оборудования.
+        """
+        query = (
+            select(
+                ReplacementLog.id.label("replacement_id"),
+                ReplacementLog.part_id,
+                ReplacementLog.equipment_id,
+                ReplacementLog.unit_serial_number,
+                ReplacementLog.installation_date,
+                Part.name.label("part_name"),
+                Part.useful_life_days,
+                Part.lead_time_days,
+                Part.qty_in_stock,
+                Part.qty_per_unit,
+                Part.supplier_id,
+                Equipment.name.label("equipment_name"),
+                Equipment.available_units,
+            )
+            .join(Part, Part.id == ReplacementLog.part_id)
+            .join(Equipment, Equipment.id == ReplacementLog.equipment_id)
+            .where(ReplacementLog.replacement_date.is_(None))
+        )
+        if part_ids is not None:
+            query = query.where(ReplacementLog.part_id.in_(list(part_ids)))
+        return pd.DataFrame(self.db.execute(query).all(), columns=list(query.selected_columns.keys()))
+
+    def close_many(self, replacement_ids, replacement_date: date):
+        """Закрытие нескольких установок одной датой замены (например, после планового ТО)."""
+        return self.update_many({replacement_id: {"replacement_date": replacement_date} for replacement_id in replacement_ids})
 
     def get_by_equipment(self, equipment_id: int):
         return (
@@ -365,18 +751,773 @@ class ReplacementService:
         )
 
 
+class StockService(BaseService):
+    """Журнал движений склада (core/stock.py); текущий остаток - Part.qty_in_stock."""
+    model = StockMovement
+
+    def receive(self, part_id: int, qty: int, movement_date: date | None = None, comment: str | None = None):
+        movement = receive(self.db, part_id, qty, movement_date=movement_date, comment=comment)
+        self._commit()
+        return movement
+
+    def issue(self, part_id: int, qty: int = 1, movement_date: date | None = None, comment: str | None = None):
+        movement = issue(self.db, part_id, qty, movement_date=movement_date, comment=comment)
+        self._commit()
+        return movement
+
+    def adjust(self, part_id: int, qty: int, movement_date: date | None = None, comment: str | None = None):
+        """Корректировка на qty (со знаком), например списание брака."""
+        movement = apply_movement(self.db, part_id, qty, ADJUSTMENT, movement_date=movement_date, comment=comment)
+        self._commit()
+        return movement
+
+    def set_balance(self, part_id: int, counted: int, movement_date: date | None = None, comment: str | None = None):
+        movement = set_balance(self.db, part_id, counted, movement_date=movement_date, comment=comment)
+        self._commit()
+        return movement
+
+    def movements(self, part_id: int, limit: int | None = None):
+        """Движения запчасти, последние первыми."""
+        query = (
+            self.db.query(StockMovement)
+            .filter(StockMovement.part_id == part_id)
+            .order_by(StockMovement.movement_date.desc(), StockMovement.id.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def as_of(self, as_of: date, part_ids=None) -> dict:
+        """Остатки на конец дня as_of: part_id -> остаток (от ближайшей контрольной точки)."""
+        return stock_as_of(self.db, as_of, part_ids=part_ids)
+
+    def write_checkpoints(self, as_of: date | None = None) -> int:
+        written = write_checkpoints(self.db, as_of)
+        self._commit()
+        return written
+
+
+# Критичные зоны (флажок "только критичные" на странице плана закупок)
+CRITICAL_ZONES = ("yellow", "red")
+# Колонки плана закупок (plan_table) в порядке вывода
+PLAN_COLUMNS = (
+    "replacement_id", "part_id", "part_name", "equipment_id", "equipment_name", "unit_serial_number",
+    "installation_date", "remaining_days", "percentage_left", "zone", "qty_in_stock", "has_stock",
+    "lead_time_days", "failure_date", "latest_init_date", "latest_purchase_date", "receipt_date",
+)
+# Сортировки плана закупок: ключ -> колонки ORDER BY
+PLAN_ORDER_BY = {
+    "latest_init_date": (ZoneTransition.latest_init_date,),
+    "failure_date": (ZoneTransition.failure_date,),
+    "red_date": (ZoneTransition.red_date,),
+    "installation_date": (ZoneTransition.installation_date,),
+}
+
+
+def zone_filter(zones, as_of: date):
+    """
+    Условие "установка в одной из зон zones на дату as_of" через даты переходов
+    zone_transition: красная - red_date <= as_of, жёлтая - yellow_date <= as_of < red_date,
+    зелёная - yellow_date > as_of. yellow_date <= red_date всегда, поэтому соседние
+    зоны сливаются в один диапазон по одной колонке.
+    """
+    zones = set(zones)
+    unknown = zones - set(ZONES)
+    if unknown:
+        raise ValueError(f"Неизвестные зоны: {', '.join(sorted(unknown))}")
+    yellow_passed = ZoneTransition.yellow_date <= as_of
+    red_passed = ZoneTransition.red_date <= as_of
+    conditions = {
+        frozenset(): false(),
+        frozenset({"red"}): red_passed,
+        frozenset({"yellow", "red"}): yellow_passed,
+        frozenset({"yellow"}): and_(yellow_passed, ~red_passed),
+        frozenset({"green"}): ~yellow_passed,
+        frozenset({"green", "yellow"}): ~red_passed,
+        frozenset({"green", "red"}): or_(~yellow_passed, red_passed),
+        frozenset(ZONES): true(),
+    }
+    return conditions[frozenset(zones)]
+
+
 class ProcurementPlanService:
     def __init__(self, db: Session):
         self.db = db
 
+    def calendars(self) -> PurchaseCalendars:
+        return PurchaseCalendars.load(self.db)
+
     def calculate_for_part(self, part: Part, installation_date: date):
-        """Расчёт плана закупки по одной запчасти."""
+        """Расчёт плана закупки по одной запчасти (по календарю её поставщика)."""
         return compute_latest_init_date(
             installation_date=installation_date,
             useful_life_days=part.useful_life_days,
             lead_time_days=part.lead_time_days,
+            calendar=self.calendars().for_supplier(part.supplier_id),
         )
 
+    def _plan_conditions(self, equipment_id: int | None, zones, horizon: int | None, today: date) -> list:
+        """Условия фильтров плана закупок на zone_transition (см. plan_table)."""
+        conditions = []
+        if equipment_id is not None:
+            conditions.append(ZoneTransition.equipment_id == equipment_id)
+        if zones is not None:
+            conditions.append(zone_filter(zones, today))
+        if horizon is not None:
+            conditions.append(ZoneTransition.latest_init_date <= today + timedelta(days=horizon))
+        return conditions
+
+    def plan_count(self, equipment_id: int | None = None, zones=None, horizon: int | None = None,
+                   today: date | None = None) -> int:
+        """Число строк плана закупок с теми же фильтрами, что у plan_table."""
+        today = today or date.today()
+        return self.db.execute(
+            select(func.count()).select_from(ZoneTransition)
+            .where(*self._plan_conditions(equipment_id, zones, horizon, today))
+        ).scalar()
+
+    def plan_table(self, equipment_id: int | None = None, zones=None, horizon: int | None = None,
+                   order_by: str = "latest_init_date", offset: int = 0, limit: int | None = None,
+                   today: date | None = None) -> pa.Table:
+        """
+        План закупок по незаменённым установкам в pyarrow.Table (колонки PLAN_COLUMNS).
+
+        Строки берутся из zone_transition: в ней только незаменённые установки, а
+        распределение складского запаса по всему парку и даты плана уже рассчитаны
+        при записи, поэтому все фильтры выполняются в SQL: оборудование, зоны zones
+        (подмножество ZONES) - как диапазоны дат переходов относительно today,
+        horizon - последняя дата инициации закупки не позже today + horizon дней.
+        order_by - ключ PLAN_ORDER_BY, offset и limit - страница строк. Износ на
+        today досчитывается по колонкам только для строк страницы.
+        """
+        if order_by not in PLAN_ORDER_BY:
+            raise ValueError(f"Сортировка плана должна быть одной из: {', '.join(PLAN_ORDER_BY)}")
+        today = today or date.today()
+        query = (
+            select(
+                ZoneTransition.replacement_id,
+                ZoneTransition.part_id,
+                Part.name.label("part_name"),
+                ZoneTransition.equipment_id,
+                Equipment.name.label("equipment_name"),
+                ReplacementLog.unit_serial_number,
+                ZoneTransition.installation_date,
+                Part.useful_life_days,
+                Part.qty_in_stock,
+                ZoneTransition.has_stock,
+                Part.lead_time_days,
+                ZoneTransition.failure_date,
+                ZoneTransition.latest_init_date,
+                ZoneTransition.latest_purchase_date,
+                ZoneTransition.receipt_date,
+            )
+            # У строки zone_transition установка, запчасть и оборудование есть всегда;
+            # LEFT JOIN SQLite не переставляет, поэтому запрос ведётся от zone_transition
+            # по индексам фильтра и сортировки, а справочники читаются по первичному ключу
+            .outerjoin(ReplacementLog, ReplacementLog.id == ZoneTransition.replacement_id)
+            .outerjoin(Part, Part.id == ZoneTransition.part_id)
+            .outerjoin(Equipment, Equipment.id == ZoneTransition.equipment_id)
+        )
+        query = query.where(*self._plan_conditions(equipment_id, zones, horizon, today))
+        query = query.order_by(*PLAN_ORDER_BY[order_by], ZoneTransition.replacement_id)
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+
+        table = to_arrow(self.db.execute(query), query.selected_columns)
+        percentage_left, remaining_days, zone = wear_arrays(
+            table["useful_life_days"].to_numpy(),
+            table["installation_date"].to_numpy().astype(np.int64) + EPOCH_ORDINAL,
+            table["lead_time_days"].to_numpy(),
+            table["has_stock"].to_numpy(zero_copy_only=False),
+            today.toordinal(),
+        )
+        table = (
+            table.append_column("remaining_days", pa.array(remaining_days, type=pa.int64()))
+            .append_column("percentage_left", pa.array(percentage_left, type=pa.float64()))
+            .append_column("zone", pa.array(ZONES[zone].tolist(), type=pa.string()))
+        )
+        return table.select(PLAN_COLUMNS)
+
+    def plan(self, **kwargs):
+        """План закупок (аргументы - как у plan_table) списком словарей."""
+        return self.plan_table(**kwargs).to_pylist()
+
+    def plan_batches(self, batch_size: int = 1000, **kwargs):
+        """
+        Весь план закупок пачками по batch_size строк (как history_batches): каждая
+        пачка - страница plan, в памяти не больше одной пачки. Дата плана одна на
+        весь обход.
+        """
+        kwargs.setdefault("today", date.today())
+        offset = 0
+        while True:
+            batch = self.plan(offset=offset, limit=batch_size, **kwargs)
+            if not batch:
+                return
+            yield batch
+            offset += batch_size
+
+
+class ReplacementScheduleService:
+    """Расписание замен по мастерским (core/scheduler.py) по данным zone_transition."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def jobs_frame(self, until: date, today: date | None = None,
+                   calendars: PurchaseCalendars | None = None) -> pd.DataFrame:
+        """
+        Задания расписания: незаменённые установки с отказом не позже until.
+
+        Дата поступления запчасти: при складском запасе - today; иначе - дата
+        поступления по плану закупки, если её последняя дата закупки ещё не
+        прошла, а если прошла - ближайшая закупка после today плюс срок доставки
+        (по календарю поставщика).
+        """
+        today = today or date.today()
+        calendars = calendars or PurchaseCalendars.load(self.db)
+        query = (
+            select(
+                ZoneTransition.replacement_id,
+                ZoneTransition.part_id,
+                Part.name.label("part_name"),
+                ZoneTransition.equipment_id,
+                Equipment.name.label("equipment_name"),
+                ReplacementLog.unit_serial_number,
+                ReplacementLog.workshop_id,
+                ZoneTransition.failure_date,
+                ZoneTransition.has_stock,
+                ZoneTransition.latest_purchase_date,
+                ZoneTransition.receipt_date,
+                Part.lead_time_days,
+                Part.supplier_id,
+            )
+            .outerjoin(ReplacementLog, ReplacementLog.id == ZoneTransition.replacement_id)
+            .outerjoin(Part, Part.id == ZoneTransition.part_id)
+            .outerjoin(Equipment, Equipment.id == ZoneTransition.equipment_id)
+            # red_date <= failure_date всегда: условие ведёт запрос по индексу (is_latest, red_date)
+            .where(
+                ZoneTransition.is_latest.in_([False, True]),
+                ZoneTransition.red_date <= until,
+                ZoneTransition.failure_date <= until,
+            )
+        )
+        # Порядок заданий - по id установки: сортировка в SQL увела бы запрос с индекса на первичный ключ
+        frame = pd.DataFrame(
+            self.db.execute(query).all(), columns=list(query.selected_columns.keys())
+        ).sort_values("replacement_id", ignore_index=True)
+        n = len(frame)
+
+        def ordinals(column):
+            return np.fromiter((d.toordinal() for d in frame[column]), dtype=np.int64, count=n)
+
+        frame["failure_ordinal"] = ordinals("failure_date")
+        available = np.full(n, today.toordinal(), dtype=np.int64)
+        if n:
+            has_stock = frame["has_stock"].to_numpy(dtype=bool)
+            purchase, receipt = ordinals("latest_purchase_date"), ordinals("receipt_date")
+            planned = ~has_stock & (purchase >= today.toordinal())
+            available[planned] = receipt[planned]
+            missed = np.flatnonzero(~has_stock & ~planned)
+            suppliers = supplier_codes(frame["supplier_id"])[missed]
+            lead_time = frame["lead_time_days"].to_numpy(dtype=np.int64)[missed]
+            for supplier_id in np.unique(suppliers).tolist():
+                rows = suppliers == supplier_id
+                next_purchase = calendars.for_supplier(supplier_id).next_after(
+                    np.full(int(rows.sum()), today.toordinal() - 1)
+                )
+                available[missed[rows]] = next_purchase + lead_time[rows]
+        frame["available_ordinal"] = available
+        return frame
+
+    def workshops_frame(self) -> pd.DataFrame:
+        """Действующие мастерские и их мощность."""
+        query = (
+            select(Workshop.id, Workshop.name, Workshop.daily_capacity)
+            .where(Workshop.retired_at.is_(None))
+            .order_by(Workshop.id)
+        )
+        return pd.DataFrame(self.db.execute(query).all(), columns=list(query.selected_columns.keys()))
+
+    def schedule(self, start: date | None = None, horizon_days: int = DEFAULT_HORIZON_DAYS, improve: bool = True,
+                 window_days: int = WINDOW_DAYS) -> ScheduleResult:
+        """Расписание замен на horizon_days дней начиная со start (по умолчанию - сегодня)."""
+        start = start or date.today()
+        calendars = PurchaseCalendars.load(self.db)
+        jobs = self.jobs_frame(start + timedelta(days=horizon_days - 1), today=start, calendars=calendars)
+        scheduler = ReplacementScheduler(
+            jobs, self.workshops_frame(), calendars.default.holidays, start=start, horizon_days=horizon_days
+        )
+        return scheduler.run(improve=improve, window_days=window_days)
+
+
+class DashboardService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def wear_rows(self, as_of: date | None = None):
+        """
+        Состояние износа по каждой запчасти на дату as_of (сегодня по умолчанию):
+        берётся последняя незаменённая установка. Зона считается с учётом
+        распределения складского запаса по всем установкам.
+        Неустановленные запчасти считаются новыми (зелёная зона), выведенные из
+        эксплуатации не показываются.
+        """
+        frame = fleet_wear(ReplacementService(self.db).open_installations_frame(), today=as_of)
+        # Последняя установка каждой запчасти
+        latest = (
+            frame.sort_values(["installation_date", "replacement_id"])
+            .drop_duplicates("part_id", keep="last")
+            .set_index("part_id")
+        )
+
+        rows = []
+        for part in self.db.query(Part).filter(Part.retired_at.is_(None)).order_by(Part.id).all():
+            if part.id not in latest.index:
+                rows.append({
+                    "part_id": part.id,
+                    "part_name": part.name,
+                    "equipment_id": None,
+                    "equipment_name": None,
+                    "installation_date": None,
+                    "useful_life_days": part.useful_life_days,
+                    "remaining_days": part.useful_life_days,
+                    "percentage_left": 1.0,
+                    "zone": "green",
+                    "qty_in_stock": part.qty_in_stock,
+                    "has_stock": part.qty_in_stock > 0,
+                    "demand": 0,
+                })
+                continue
+
+            r = latest.loc[part.id]
+            rows.append({
+                "part_id": part.id,
+                "part_name": part.name,
+                "equipment_id": int(r["equipment_id"]),
+                "equipment_name": r["equipment_name"],
+                "installation_date": r["installation_date"],
+                "useful_life_days": part.useful_life_days,
+                "remaining_days": int(r["remaining_days"]),
+                "percentage_left": float(r["percentage_left"]),
+                "zone": r["zone"],
+                "qty_in_stock": part.qty_in_stock,
+                "has_stock": bool(r["has_stock"]),
+                # Потребность: количество запчастей на единицу * количество единиц оборудования
+                "demand": part.qty_per_unit * int(r["available_units"]),
+            })
+        return rows
+
+    def summary(self, as_of: date | None = None):
+        """Агрегаты Dashboard: счётчики по зонам, красные зоны по оборудованию, склад vs потребность."""
+        rows = self.wear_rows(as_of)
+
+        red_by_equipment = {}
+        stock_vs_demand = {}
+        for row in rows:
+            if row["equipment_id"] is None:
+                continue
+            if row["zone"] == "red":
+                name = row["equipment_name"] or "N/A"
+                red_by_equipment[name] = red_by_equipment.get(name, 0) + 1
+            item = stock_vs_demand.setdefault(row["part_id"], {
+                "part_id": row["part_id"],
+                "part_name": row["part_name"],
+                "qty_in_stock": row["qty_in_stock"],
+                "demand": 0,
+            })
+            item["demand"] += row["demand"]
+
+        for item in stock_vs_demand.values():
+            item["deficit"] = max(0, item["demand"] - item["qty_in_stock"])
+
+        return {
+            "total_parts": len(rows),
+            "zones": ZoneIndexService(self.db).zone_counts(as_of),
+            "red_by_equipment": [
+                {"equipment_name": name, "count": count}
+                for name, count in sorted(red_by_equipment.items(), key=lambda x: -x[1])
+            ],
+            "stock_vs_demand": sorted(stock_vs_demand.values(), key=lambda x: -x["demand"]),
+        }
+
+
+class ZoneIndexService:
+    """
+    Запросы к предрасчитанным датам переходов зон (таблица zone_transition).
+    Зона на дату D: красная, если red_date <= D; жёлтая, если yellow_date <= D < red_date;
+    иначе зелёная. Все запросы - диапазонные по индексам, стоимость не зависит от D.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _count(self, column, start: date | None, end: date, latest_only: bool) -> int:
+        query = self.db.query(func.count(ZoneTransition.replacement_id))
+        # is_latest - первая колонка индексов; IN (0, 1) позволяет использовать их и без фильтра
+        query = query.filter(ZoneTransition.is_latest.in_([True] if latest_only else [False, True]))
+        if start is not None:
+            query = query.filter(column > start)
+        return query.filter(column <= end).scalar()
+
+    def zone_counts(self, as_of: date | None = None, latest_only: bool = True) -> dict:
+        """
+        Число установок по зонам на дату as_of. При latest_only=True учитывается
+        только последняя установка каждой запчасти (как на Dashboard), а запчасти
+        без установок считаются зелёными (кроме выведенных из эксплуатации).
+        """
+        as_of = as_of or date.today()
+        red = self._count(ZoneTransition.red_date, None, as_of, latest_only)
+        # yellow_date <= red_date всегда, поэтому жёлтые = перешедшие в жёлтую - красные
+        yellow = self._count(ZoneTransition.yellow_date, None, as_of, latest_only) - red
+        if latest_only:
+            total = self.db.query(func.count(Part.id)).filter(Part.retired_at.is_(None)).scalar()
+        else:
+            total = self.db.query(func.count(ZoneTransition.replacement_id)).scalar()
+        return {"green": total - yellow - red, "yellow": yellow, "red": red}
+
+    def turning(self, zone: str, start: date | None = None, days: int = 14, latest_only: bool = True) -> int:
+        """Число установок, которые перейдут в зону zone в интервале (start, start + days]."""
+        start = start or date.today()
+        column = ZoneTransition.yellow_date if zone == "yellow" else ZoneTransition.red_date
+        return self._count(column, start, start + timedelta(days=days), latest_only)
+
+
+class ForecastService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def fit_part_lifetimes(self):
+        """
+        Параметры распределения Вейбулла по каждой запчасти.
+
+        Оцениваются по фактическим срокам службы из журнала: закрытые записи -
+        отказы, незаменённые установки и установки, закрытые выводом из
+        эксплуатации, - цензурированные наблюдения. Если отказов мало,
+        используется номинальный срок службы с формой DEFAULT_WEIBULL_SHAPE.
+        """
+        today = date.today()
+        log = replacement_history()
+        rows = self.db.execute(
+            select(log.c.part_id, log.c.installation_date, log.c.replacement_date, log.c.closed_by_retire)
+            .order_by(log.c.id)
+        ).all()
+        durations = {}
+        for part_id, installation_date, replacement_date, closed_by_retire in rows:
+            # Незаменённые установки - цензурированные наблюдения (проработали не меньше текущего срока),
+            # закрытые выводом из эксплуатации - проработали до вывода без отказа
+            end_date = replacement_date or today
+            observed = replacement_date is not None and not closed_by_retire
+            durations.setdefault(part_id, []).append(((end_date - installation_date).days, observed))
+
+        fits = {}
+        for part_id, useful_life_days in self.db.query(Part.id, Part.useful_life_days).all():
+            history = durations.get(part_id, [])
+            n_failures = sum(1 for _, observed in history if observed)
+            fit = fit_weibull(*zip(*history)) if history else None
+            if fit is None:
+                shape = DEFAULT_WEIBULL_SHAPE
+                fits[part_id] = {
+                    "shape": shape,
+                    "scale": weibull_scale_for_mean(useful_life_days, shape),
+                    "source": "nominal",
+                    "n_failures": n_failures,
+                }
+            else:
+                fits[part_id] = {"shape": fit[0], "scale": fit[1], "source": "fitted", "n_failures": n_failures}
+        return fits
+
+    def demand_forecast(self, horizon_days: int = 180, trials: int = 10_000,
+                        quantiles=(0.5, 0.9), seed: int | None = None):
+        """
+        Прогноз числа отказов (= потребности в запчастях) по каждой запчасти и окну
+        закупки на горизонте horizon_days. Возвращает строки со средним и квантилями
+        (p50, p90, ...) только для окон с ненулевой ожидаемой потребностью.
+        """
+        rows, _ = self.demand_forecast_page(horizon_days, trials, quantiles, seed)
+        return rows
+
+    def demand_forecast_page(self, horizon_days: int = 180, trials: int = 10_000,
+                             quantiles=(0.5, 0.9), seed: int | None = None,
+                             offset: int = 0, limit: int | None = None):
+        """
+        Страница строк demand_forecast и их общее число: строки собираются только
+        для окон страницы.
+        """
+        rows_between, total = self._simulate_forecast(horizon_days, trials, quantiles, seed)
+        return rows_between(offset, total if limit is None else offset + limit), total
+
+    def demand_forecast_batches(self, batch_size: int = 1000, horizon_days: int = 180, trials: int = 10_000,
+                                quantiles=(0.5, 0.9), seed: int | None = None):
+        """
+        Все строки demand_forecast пачками по batch_size (как history_batches):
+        симуляция выполняется один раз, строки собираются по пачке.
+        """
+        rows_between, total = self._simulate_forecast(horizon_days, trials, quantiles, seed)
+        for offset in range(0, total, batch_size):
+            yield rows_between(offset, offset + batch_size)
+
+    def _simulate_forecast(self, horizon_days: int, trials: int, quantiles, seed: int | None):
+        """
+        Симуляция по всем запчастям. Возвращает (rows_between, total): функцию,
+        собирающую строки окон с ненулевой потребностью с start по end в порядке
+        (запчасть, окно), и общее число таких окон.
+        """
+        today = date.today()
+        fits = self.fit_part_lifetimes()
+        part_ids = list(fits)
+        position = {part_id: i for i, part_id in enumerate(part_ids)}
+        names = dict(self.db.query(Part.id, Part.name).all())
+
+        open_installations = (
+            self.db.query(ReplacementLog.part_id, ReplacementLog.installation_date)
+            .filter(ReplacementLog.replacement_date.is_(None))
+            .all()
+        )
+        part_index = [position[part_id] for part_id, _ in open_installations if part_id in position]
+        age_days = [
+            max(0, (today - installation_date).days)
+            for part_id, installation_date in open_installations if part_id in position
+        ]
+
+        calendar = PurchaseCalendars.load(self.db).default
+        edges = window_edges(today, horizon_days, calendar.dates_between(today, today + timedelta(days=horizon_days)))
+        mean, by_quantile = simulate_demand(
+            part_index,
+            age_days,
+            [fits[part_id]["shape"] for part_id in part_ids],
+            [fits[part_id]["scale"] for part_id in part_ids],
+            n_parts=len(part_ids),
+            window_edges=edges,
+            trials=trials,
+            quantiles=quantiles,
+            seed=seed,
+        )
+
+        # Окна с ненулевой потребностью в порядке (запчасть, окно)
+        part_cells, window_cells = np.nonzero(mean > 0)
+
+        def rows_between(start: int, end: int) -> list:
+            rows = []
+            for i, w in zip(part_cells[start:end].tolist(), window_cells[start:end].tolist()):
+                part_id = part_ids[i]
+                row = {
+                    "part_id": part_id,
+                    "part_name": names.get(part_id),
+                    "window_start": today + timedelta(days=int(edges[w])),
+                    "window_end": today + timedelta(days=int(edges[w + 1])),
+                    "mean": float(mean[i, w]),
+                    "source": fits[part_id]["source"],
+                }
+                for q in quantiles:
+                    row[f"p{round(q * 100)}"] = int(by_quantile[q][i, w])
+                rows.append(row)
+            return rows
+
+        return rows_between, len(part_cells)
+
+
+# Группировки для статистики фактического срока службы (колонки истории замен)
+LIFETIME_SCOPES = {
+    "part": "part_id",
+    "equipment": "equipment_id",
+    "workshop": "workshop_id",
+}
+
+LIFETIME_STAT_FIELDS = (
+    "n_failures",
+    "n_censored",
+    "mean_observed_days",
+    "km_median_days",
+    "weibull_shape",
+    "weibull_scale",
+    "weibull_mean_days",
+)
+
+
+class LifetimeStatsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, scope: str = "part") -> dict:
+        """Сохранённая статистика по группам: scope_id -> LifetimeStat."""
+        stats = self.db.query(LifetimeStat).filter(LifetimeStat.scope == scope).all()
+        return {stat.scope_id: stat for stat in stats}
+
+    def _signatures(self, column):
+        """
+        Сигнатуры групп одним агрегирующим запросом: число записей, число открытых,
+        число закрытых выводом из эксплуатации, максимальный id и суммы дат.
+        Изменение любой записи группы меняет сигнатуру; перенос записей в архив -
+        нет (считается по всей истории).
+        """
+        history = replacement_history()
+        rows = self.db.execute(
+            select(
+                history.c[column],
+                func.count(history.c.id),
+                func.count(history.c.id) - func.count(history.c.replacement_date),
+                func.total(history.c.closed_by_retire),
+                func.max(history.c.id),
+                func.sum(func.julianday(history.c.installation_date)),
+                func.total(func.julianday(history.c.replacement_date)),
+            )
+            .group_by(history.c[column])
+        ).all()
+        return {
+            scope_id: (f"{count}:{n_open}:{n_retired:.0f}:{max_id}:{inst_sum:.1f}:{repl_sum:.1f}", n_open)
+            for scope_id, count, n_open, n_retired, max_id, inst_sum, repl_sum in rows
+        }
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Инкрементальный пересчёт статистики. Пересчитываются только группы, у которых
+        изменилась сигнатура, а также группы с открытыми установками, если статистика
+        посчитана не сегодня (цензурированные сроки растут каждый день).
+        Возвращает число пересчитанных групп.
+        """
+        today = date.today()
+        stored = {(stat.scope, stat.scope_id): stat for stat in self.db.query(LifetimeStat).all()}
+
+        stale = {scope: {} for scope in LIFETIME_SCOPES}
+        for scope, column in LIFETIME_SCOPES.items():
+            for scope_id, (signature, n_open) in self._signatures(column).items():
+                stat = stored.pop((scope, scope_id), None)
+                if full or stat is None or stat.signature != signature or (n_open and stat.as_of != today):
+                    stale[scope][scope_id] = (stat, signature)
+
+        # Группы, по которым не осталось записей
+        for stat in stored.values():
+            self.db.delete(stat)
+
+        recomputed = sum(len(groups) for groups in stale.values())
+        if recomputed:
+            self._recompute(stale, today)
+        # Без изменений запись не нужна
+        if recomputed or stored:
+            self.db.commit()
+        return recomputed
+
+    def _recompute(self, stale: dict, today: date):
+        # Один запрос на все устаревшие группы всех разрезов
+        history = replacement_history()
+        conditions = [history.c[LIFETIME_SCOPES[scope]].in_(list(groups)) for scope, groups in stale.items() if groups]
+        rows = self.db.execute(
+            select(
+                history.c.part_id,
+                history.c.equipment_id,
+                history.c.workshop_id,
+                history.c.installation_date,
+                history.c.replacement_date,
+                history.c.closed_by_retire,
+            )
+            .where(or_(*conditions))
+        ).all()
+        today_ordinal = today.toordinal()
+        keys = {
+            "part": np.array([r[0] for r in rows], dtype=np.int64),
+            "equipment": np.array([r[1] for r in rows], dtype=np.int64),
+            "workshop": np.array([r[2] for r in rows], dtype=np.int64),
+        }
+        # Установки, закрытые выводом из эксплуатации, - не отказы, а цензурированные наблюдения
+        observed = np.array([r[4] is not None and not r[5] for r in rows], dtype=bool)
+        durations = np.array(
+            [(r[4].toordinal() if r[4] else today_ordinal) - r[3].toordinal() for r in rows],
+            dtype=float,
+        )
+
+        for scope, groups in stale.items():
+            if not groups:
+                continue
+            # Группировка сортировкой: каждая группа - непрерывный отрезок
+            order = np.argsort(keys[scope], kind="stable")
+            group_ids, starts = np.unique(keys[scope][order], return_index=True)
+            bounds = dict(zip(group_ids.tolist(), zip(starts, [*starts[1:], len(order)])))
+
+            for scope_id, (stat, signature) in groups.items():
+                begin, end = bounds[scope_id]
+                members = order[begin:end]
+                summary = summarize_lifetimes(durations[members], observed[members])
+                if stat is None:
+                    stat = LifetimeStat(scope=scope, scope_id=scope_id)
+                    self.db.add(stat)
+                for field in LIFETIME_STAT_FIELDS:
+                    setattr(stat, field, summary[field])
+                stat.signature = signature
+                stat.as_of = today
+
+
+class WearSnapshotService:
+    """Ежедневные снимки износа по оборудованию (core/snapshots.py)."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh(self, until: date | None = None, start: date | None = None) -> int:
+        """Дописать недостающие снимки до until; с start - перезаписать диапазон."""
+        return refresh_snapshots(self.db, until=until, start=start)
+
+    def trend(self, start: date, end: date, step_days: int = 7) -> pd.DataFrame:
+        """
+        Динамика по оборудованию за [start, end] с шагом step_days (отсчёт от end):
+        число установок, средний запас прочности и число установок в красной зоне.
+        """
+        n = func.sum(WearSnapshot.n_installations)
+        query = (
+            select(
+                WearSnapshot.snapshot_date,
+                WearSnapshot.equipment_id,
+                Equipment.name.label("equipment_name"),
+                n.label("n_installations"),
+                (func.sum(WearSnapshot.n_installations * WearSnapshot.mean_percentage_left) / n).label("mean_percentage_left"),
+                func.sum(case((WearSnapshot.zone == "red", WearSnapshot.n_installations), else_=0)).label("n_red"),
+            )
+            .join(Equipment, Equipment.id == WearSnapshot.equipment_id)
+            .where(WearSnapshot.snapshot_date.between(start, end))
+            .group_by(WearSnapshot.snapshot_date, WearSnapshot.equipment_id)
+            .order_by(WearSnapshot.snapshot_date, WearSnapshot.equipment_id)
+        )
+        if step_days > 1:
+            days_before_end = cast(func.julianday(end) - func.julianday(WearSnapshot.snapshot_date), Integer)
+            query = query.where(days_before_end % step_days == 0)
+        return pd.DataFrame(self.db.execute(query).all(), columns=list(query.selected_columns.keys()))
+
+
+class AlertService(BaseService):
+    """Оповещения, выданные планировщиком (core/alerts.py)."""
+
+    model = AlertOutbox
+
+    def pending(self, limit: int | None = None):
+        """Недоставленные оповещения в порядке выдачи."""
+        query = self.db.query(AlertOutbox).filter(AlertOutbox.delivered_at.is_(None)).order_by(AlertOutbox.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    def mark_delivered(self, alert_ids) -> int:
+        updated = (
+            self.db.query(AlertOutbox)
+            .filter(AlertOutbox.id.in_(list(alert_ids)), AlertOutbox.delivered_at.is_(None))
+            .update({AlertOutbox.delivered_at: datetime.now()}, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated
+
+
+class DataVersionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, *tables: str) -> dict:
+        """Текущие версии данных указанных таблиц (все отслеживаемые, если не указаны)."""
+        query = self.db.query(DataVersion)
+        if tables:
+            query = query.filter(DataVersion.table_name.in_(tables))
+        return {v.table_name: v.version for v in query.all()}
+
 
 # -------------------------------
 #  Фабрика сервисов
@@ -385,10 +1526,45 @@ class ProcurementPlanService:
 class ServiceContainer:
     """Удобный контейнер для Streamlit: st.session_state['services']"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, writer=None):
+        self.db = db
+        # Записи через поток групповой фиксации (core/writer.py); без writer - сразу в db
+        self.writes = WriteBehind(self, writer)
         self.parts = PartService(db)
         self.equipment = EquipmentService(db)
         self.workshops = WorkshopService(db)
         self.replacement_types = ReplacementTypeService(db)
         self.replacements = ReplacementService(db)
+        self.suppliers = SupplierService(db)
+        self.holidays = HolidayService(db)
+        self.stock = StockService(db)
         self.procurement = ProcurementPlanService(db)
+        self.schedule = ReplacementScheduleService(db)
+        self.dashboard = DashboardService(db)
+        self.forecast = ForecastService(db)
+        self.zones = ZoneIndexService(db)
+        self.lifetime_stats = LifetimeStatsService(db)
+        self.alerts = AlertService(db)
+        self.wear_snapshots = WearSnapshotService(db)
+        self.data_versions = DataVersionService(db)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: create/update/delete и их *_many внутри блока не фиксируются
+        по отдельности, а выполняются одной транзакцией (одна запись журнала SQLite
+        на диск). При исключении всё откатывается. Вложенные блоки присоединяются
+        к внешнему: фиксирует и откатывает только внешний.
+        """
+        depth = self.db.info.get(TRANSACTION_DEPTH_KEY, 0)
+        self.db.info[TRANSACTION_DEPTH_KEY] = depth + 1
+        try:
+            yield self
+            if depth == 0:
+                self.db.commit()
+        except BaseException:
+            if depth == 0:
+                self.db.rollback()
+            raise
+        finally:
+            self.db.info[TRANSACTION_DEPTH_KEY] = depth
@@ -0,0 +1,247 @@
+"""
+Ежедневные снимки износа (таблица wear_snapshot) для графиков динамики.
+
+Снимок на дату D агрегирует все установки, работавшие в этот день (установлены не
+позже D и не заменены до D включительно), в том числе уже закрытые. Запас прочности
+считается по сроку службы без учёта склада и срока доставки: исторические остатки
+на складе не хранятся.
+
+Заполнение векторизовано: порция дат x установок обрабатывается целиком, агрегаты
+по (дата, оборудование, зона) получаются одним bincount. Перезапись диапазона
+идемпотентна (старые строки диапазона удаляются). При записи в журнал замен или
+изменении срока службы запчасти уже записанные снимки затронутого оборудования
+пересчитываются в той же транзакции, начиная с самой ранней затронутой даты.
+Установки читаются из всей истории, включая архив (core/archive.py).
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import delete, event, func, inspect, insert, or_, select
+from sqlalchemy.orm import Session
+
+from .archive import replacement_history
+from .models import Equipment, Part, ReplacementLog, WearSnapshot
+from .wear import RED_THRESHOLD, YELLOW_THRESHOLD, ZONES
+
+# Ограничение на число элементов (дни x установки) в одной порции
+SNAPSHOT_CHUNK_ELEMENTS = 2_000_000
+
+_DIRTY_KEY = "snapshot_dirty"
+_DIRTY_PARTS_KEY = "snapshot_dirty_parts"
+_DELETED_EQUIPMENT_KEY = "snapshot_deleted_equipment"
+
+
+def aggregate_wear(installation_ordinal, end_ordinal, useful_life_days, equipment_index, n_equipment,
+                   start_ordinal, stop_ordinal):
+    """
+    Агрегаты износа на каждую дату [start_ordinal, stop_ordinal].
+
+    end_ordinal - дата замены (установка работает до неё, не включая); для
+    незаменённых - любое число больше stop_ordinal. Возвращает (count, sum_pct) -
+    массивы формы (дни, оборудование, зона).
+    """
+    installation_ordinal = np.asarray(installation_ordinal, dtype=np.int64)
+    end_ordinal = np.asarray(end_ordinal, dtype=np.int64)
+    life = np.asarray(useful_life_days, dtype=np.int64)
+    equipment_index = np.asarray(equipment_index, dtype=np.int64)
+    n_days = stop_ordinal - start_ordinal + 1
+    n_cells = n_days * n_equipment * len(ZONES)
+
+    count = np.zeros(n_cells, dtype=np.int64)
+    sum_pct = np.zeros(n_cells, dtype=np.float64)
+    n_inst = installation_ordinal.size
+    if n_inst == 0 or n_days <= 0:
+        return count.reshape(max(n_days, 0), n_equipment, len(ZONES)), sum_pct.reshape(max(n_days, 0), n_equipment, len(ZONES))
+
+    inv_life = np.where(life > 0, 1.0 / np.maximum(life, 1), 0.0)
+    chunk = max(1, SNAPSHOT_CHUNK_ELEMENTS // n_inst)
+    for first in range(0, n_days, chunk):
+        days = np.arange(first, min(first + chunk, n_days))[:, None]
+        day_ordinal = start_ordinal + days
+        active = (installation_ordinal <= day_ordinal) & (day_ordinal < end_ordinal)
+
+        pct = np.maximum(0.0, (life - (day_ordinal - installation_ordinal)) * inv_life)
+        zone = np.where(pct > YELLOW_THRESHOLD, 0, np.where(pct > RED_THRESHOLD, 1, 2))
+        cell = (days * n_equipment + equipment_index) * len(ZONES) + zone
+
+        cell, pct = cell[active], pct[active]
+        count += np.bincount(cell, minlength=n_cells)
+        sum_pct += np.bincount(cell, weights=pct, minlength=n_cells)
+
+    shape = (n_days, n_equipment, len(ZONES))
+    return count.reshape(shape), sum_pct.reshape(shape)
+
+
+def write_snapshots(session: Session, start: date, end: date, equipment_ids=None) -> int:
+    """
+    Перезаписывает снимки за [start, end] (только указанного оборудования, если задано).
+    Возвращает число записанных строк.
+    """
+    if start > end:
+        return 0
+    stmt = delete(WearSnapshot).where(WearSnapshot.snapshot_date.between(start, end))
+    history = replacement_history()
+    query = (
+        select(
+            history.c.installation_date,
+            history.c.replacement_date,
+            history.c.equipment_id,
+            Part.useful_life_days,
+        )
+        .join(Part, Part.id == history.c.part_id)
+        .where(
+            history.c.installation_date <= end,
+            or_(history.c.replacement_date.is_(None), history.c.replacement_date > start),
+        )
+    )
+    if equipment_ids is not None:
+        equipment_ids = list(equipment_ids)
+        stmt = stmt.where(WearSnapshot.equipment_id.in_(equipment_ids))
+        query = query.where(history.c.equipment_id.in_(equipment_ids))
+    session.execute(stmt)
+
+    rows = session.execute(query).all()
+    if not rows:
+        return 0
+    installation_dates, replacement_dates, equipment, life = zip(*rows)
+    equipment_codes, equipment_index = np.unique(np.asarray(equipment, dtype=np.int64), return_inverse=True)
+    stop_ordinal = end.toordinal()
+    end_ordinal = [d.toordinal() if d is not None else stop_ordinal + 1 for d in replacement_dates]
+
+    count, sum_pct = aggregate_wear(
+        [d.toordinal() for d in installation_dates], end_ordinal, life,
+        equipment_index, equipment_codes.size, start.toordinal(), stop_ordinal,
+    )
+    day, eq, zone = np.nonzero(count)
+    n = count[day, eq, zone]
+    mean = sum_pct[day, eq, zone] / n
+    records = [
+        {
+            "snapshot_date": date.fromordinal(start.toordinal() + d),
+            "equipment_id": equipment_id,
+            "zone": zone_name,
+            "n_installations": n_installations,
+            "mean_percentage_left": mean_pct,
+        }
+        for d, equipment_id, zone_name, n_installations, mean_pct in zip(
+            day.tolist(), equipment_codes[eq].tolist(), ZONES[zone].tolist(), n.tolist(), mean.tolist()
+        )
+    ]
+    if records:
+        session.execute(insert(WearSnapshot), records)
+    return len(records)
+
+
+def last_snapshot_date(session: Session) -> date | None:
+    return session.execute(select(func.max(WearSnapshot.snapshot_date))).scalar()
+
+
+def _mark_dirty(session: Session, equipment_id, from_date):
+    if equipment_id is None or from_date is None:
+        return
+    dirty = session.info.setdefault(_DIRTY_KEY, {})
+    dirty[equipment_id] = min(from_date, dirty.get(equipment_id, from_date))
+
+
+def mark_snapshots_dirty(session: Session, from_dates: dict):
+    """
+    Отметить снимки оборудования для пересчёта при фиксации: from_dates - {id
+    оборудования: самая ранняя затронутая дата}. Нужно вызывать явно после массовых
+    SQL-операций с журналом замен, которые обходят отслеживание изменений ORM.
+    """
+    for equipment_id, from_date in from_dates.items():
+        _mark_dirty(session, equipment_id, from_date)
+
+
+def _history_values(state, name):
+    history = state.attrs[name].history
+    return [v for v in (*history.added, *history.deleted, *history.unchanged) if v is not None]
+
+
+def _changed_from(obj, state, session):
+    """Самая ранняя дата, с которой запись obj меняет снимки (None - не меняет)."""
+    if obj in session.new or obj in session.deleted or any(
+        state.attrs[name].history.has_changes() for name in ("equipment_id", "part_id")
+    ):
+        return min(_history_values(state, "installation_date"), default=None)
+    dates = []
+    for name in ("installation_date", "replacement_date"):
+        history = state.attrs[name].history
+        if history.has_changes():
+            dates += [v for v in (*history.added, *history.deleted) if v is not None]
+    return min(dates, default=None)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_snapshots(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ReplacementLog):
+            state = inspect(obj)
+            from_date = _changed_from(obj, state, session)
+            for equipment_id in _history_values(state, "equipment_id"):
+                _mark_dirty(session, equipment_id, from_date)
+        elif isinstance(obj, Part) and obj not in session.new:
+            state = inspect(obj)
+            if state.deleted or state.was_deleted or state.attrs.useful_life_days.history.has_changes():
+                session.info.setdefault(_DIRTY_PARTS_KEY, set()).add(obj.id)
+        elif isinstance(obj, Equipment) and obj in session.deleted:
+            session.info.setdefault(_DELETED_EQUIPMENT_KEY, set()).add(obj.id)
+
+
+@event.listens_for(Session, "before_commit")
+def _sync_snapshots(session):
+    # Точка сохранения (begin_nested) не фиксирует транзакцию: пересчёт - при внешней фиксации
+    if session.in_nested_transaction():
+        return
+    session.flush()
+    dirty_parts = session.info.pop(_DIRTY_PARTS_KEY, None)
+    deleted_equipment = session.info.pop(_DELETED_EQUIPMENT_KEY, None)
+    if deleted_equipment:
+        session.execute(delete(WearSnapshot).where(WearSnapshot.equipment_id.in_(deleted_equipment)))
+    if dirty_parts:
+        # Срок службы запчасти меняет запас прочности всех её установок с самой ранней
+        history = replacement_history()
+        for equipment_id, first_date in session.execute(
+            select(history.c.equipment_id, func.min(history.c.installation_date))
+            .where(history.c.part_id.in_(dirty_parts))
+            .group_by(history.c.equipment_id)
+        ):
+            _mark_dirty(session, equipment_id, first_date)
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if not dirty:
+        return
+    last = last_snapshot_date(session)
+    start = min(dirty.values())
+    if last is None or start > last:
+        return
+    write_snapshots(session, start, last, equipment_ids=dirty.keys())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_snapshots(session):
+    # Откат к точке сохранения: отметки внешней транзакции ещё понадобятся (лишние безвредны)
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_DIRTY_PARTS_KEY, None)
+    session.info.pop(_DELETED_EQUIPMENT_KEY, None)
+
+
+def refresh_snapshots(session: Session, until: date | None = None, start: date | None = None) -> int:
+    """
+    Дописывает недостающие снимки до until (сегодня по умолчанию): с дня после
+    последнего снимка, а если снимков нет - с самой ранней установки. Если start
+    задан, диапазон [start, until] перезаписывается целиком. Возвращает число строк.
+    """
+    until = until or date.today()
+    if start is None:
+        last = last_snapshot_date(session)
+        if last is not None:
+            start = last + timedelta(days=1)
+        else:
+            start = session.execute(select(func.min(replacement_history().c.installation_date))).scalar()
+    if start is None or start > until:
+        return 0
+    written = write_snapshots(session, start, until)
+    session.commit()
+    return written
@@ -0,0 +1,217 @@
+"""
+Складской учёт: журнал движений (stock_movement) и контрольные точки остатков.
+
+Part.qty_in_stock - текущий остаток, который поддерживается вместе с журналом:
+каждое движение меняет его одним атомарным UPDATE (qty_in_stock = qty_in_stock + :n
+при условии, что остаток не станет отрицательным) и записывает строку журнала с
+остатком после движения. Два планировщика, одновременно оприходовавшие или
+списавшие одну запчасть, не теряют изменений друг друга, а списание больше
+остатка отклоняется (InsufficientStockError) без изменения данных.
+
+Остаток на прошлую дату считается от последней контрольной точки не позже этой
+даты (stock_checkpoint, пишется периодически - jobs.py stock-checkpoints) плюс
+движения после неё, без пересчёта всего журнала. Движение задним числом удаляет
+контрольные точки запчасти, начиная с даты движения.
+
+Изменения, как и в core/archive.py, не фиксируются здесь: фиксирует вызывающий.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from .models import Part, StockCheckpoint, StockMovement
+
+RECEIPT = "receipt"
+ISSUE = "issue"
+ADJUSTMENT = "adjustment"
+MOVEMENT_KINDS = (RECEIPT, ISSUE, ADJUSTMENT)
+OPENING_BALANCE_COMMENT = "Начальный остаток"
+
+
+class InsufficientStockError(ValueError):
+    """Списание больше остатка на складе."""
+
+    def __init__(self, part_id: int, requested: int, available: int):
+        self.part_id = part_id
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Недостаточно запчасти {part_id} на складе: требуется {requested}, в наличии {available}")
+
+
+def _changed(session: Session, part_id: int, movement_date: date):
+    """Пересчёт зон запчасти и сброс устаревших контрольных точек после движения."""
+    from .zones import mark_parts_dirty
+
+    # Остаток меняется прямым UPDATE, мимо отслеживания изменений ORM
+    mark_parts_dirty(session, [part_id])
+    session.execute(
+        delete(StockCheckpoint)
+        .where(StockCheckpoint.part_id == part_id, StockCheckpoint.checkpoint_date >= movement_date)
+    )
+
+
+def apply_movement(session: Session, part_id: int, qty: int, kind: str, movement_date: date | None = None,
+                   replacement_id: int | None = None, comment: str | None = None) -> StockMovement:
+    """
+    Движение на qty (со знаком): остаток меняется атомарно, отрицательный остаток
+    не допускается (InsufficientStockError). Возвращает строку журнала.
+    """
+    if kind not in MOVEMENT_KINDS:
+        raise ValueError(f"Вид движения должен быть одним из: {', '.join(MOVEMENT_KINDS)}")
+    qty = int(qty)
+    movement_date = movement_date or date.today()
+    balance = session.execute(
+        update(Part)
+        .where(Part.id == part_id, Part.qty_in_stock + qty >= 0)
+        .values(qty_in_stock=Part.qty_in_stock + qty)
+        .returning(Part.qty_in_stock)
+        .execution_options(synchronize_session="fetch")
+    ).scalar()
+    if balance is None:
+        available = session.execute(select(Part.qty_in_stock).where(Part.id == part_id)).scalar()
+        if available is None:
+            raise ValueError(f"Запчасть {part_id} не найдена")
+        raise InsufficientStockError(part_id, -qty, available)
+
+    movement = StockMovement(
+        part_id=part_id, movement_date=movement_date, kind=kind, qty=qty, balance_after=balance,
+        replacement_id=replacement_id, comment=comment,
+    )
+    session.add(movement)
+    _changed(session, part_id, movement_date)
+    return movement
+
+
+def receive(session: Session, part_id: int, qty: int, **kwargs) -> StockMovement:
+    """Приход qty штук на склад."""
+    if int(qty) <= 0:
+        raise ValueError("Количество прихода должно быть положительным")
+    return apply_movement(session, part_id, qty, RECEIPT, **kwargs)
+
+
+def issue(session: Session, part_id: int, qty: int = 1, **kwargs) -> StockMovement:
+    """Списание qty штук со склада (например, на установку)."""
+    if int(qty) <= 0:
+        raise ValueError("Количество списания должно быть положительным")
+    return apply_movement(session, part_id, -int(qty), ISSUE, **kwargs)
+
+
+def set_balance(session: Session, part_id: int, counted: int, movement_date: date | None = None,
+                comment: str | None = None) -> StockMovement | None:
+    """
+    Корректировка по инвентаризации: остаток становится равным counted, в журнал
+    пишется разница. Разница вычисляется в том же INSERT ... SELECT, который
+    захватывает блокировку записи SQLite, поэтому чужое движение не может попасть
+    между чтением остатка и его заменой. Возвращает None, если остаток не изменился.
+    """
+    counted = int(counted)
+    if counted < 0:
+        raise ValueError("Остаток не может быть отрицательным")
+    movement_date = movement_date or date.today()
+    movement_id = session.execute(
+        insert(StockMovement)
+        .from_select(
+            ["part_id", "movement_date", "kind", "qty", "balance_after", "comment", "created_at"],
+            select(
+                Part.id, literal(movement_date), literal(ADJUSTMENT), counted - Part.qty_in_stock,
+                literal(counted), literal(comment), literal(datetime.now()),
+            ).where(Part.id == part_id, Part.qty_in_stock != counted),
+        )
+        .returning(StockMovement.id)
+    ).scalar()
+    if movement_id is None:
+        return None
+    session.execute(
+        # Версия карточки растёт: форма, открытая до инвентаризации, получит конфликт
+        update(Part).where(Part.id == part_id).values(qty_in_stock=counted, version=Part.version + 1)
+        .execution_options(synchronize_session="fetch")
+    )
+    _changed(session, part_id, movement_date)
+    return session.get(StockMovement, movement_id)
+
+
+def record_opening_balances(session: Session, parts, movement_date: date | None = None):
+    """Движение с начальным остатком для новых запчастей (qty_in_stock задан при создании)."""
+    movement_date = movement_date or date.today()
+    session.add_all(
+        StockMovement(
+            part_id=part.id, movement_date=movement_date, kind=ADJUSTMENT, qty=part.qty_in_stock,
+            balance_after=part.qty_in_stock, comment=OPENING_BALANCE_COMMENT,
+        )
+        for part in parts if part.qty_in_stock
+    )
+
+
+def backfill_stock_ledger(session: Session) -> int:
+    """
+    Начальный остаток в журнале для запчастей, остаток которых был задан до появления
+    журнала. Выполняется один раз: у таких запчастей ещё нет движений.
+    """
+    created = session.execute(
+        insert(StockMovement).from_select(
+            ["part_id", "movement_date", "kind", "qty", "balance_after", "comment", "created_at"],
+            select(
+                Part.id, literal(date.today()), literal(ADJUSTMENT), Part.qty_in_stock, Part.qty_in_stock,
+                literal(OPENING_BALANCE_COMMENT), literal(datetime.now()),
+            ).where(
+                Part.qty_in_stock != 0,
+                ~exists().where(StockMovement.part_id == Part.id),
+            ),
+        )
+    ).rowcount
+    return created
+
+
+def stock_as_of(session: Session, as_of: date, part_ids=None) -> dict:
+    """
+    Остаток запчастей на конец дня as_of: part_id -> остаток. Последняя контрольная
+    точка не позже as_of плюс движения после неё (поиск по индексу part_id, movement_date).
+    Запчасти без движений до as_of в результат не попадают (остаток 0).
+    """
+    checkpoints = (
+        select(StockCheckpoint.part_id, func.max(StockCheckpoint.checkpoint_date).label("checkpoint_date"))
+        .where(StockCheckpoint.checkpoint_date <= as_of)
+        .group_by(StockCheckpoint.part_id)
+    )
+    if part_ids is not None:
+        checkpoints = checkpoints.where(StockCheckpoint.part_id.in_(list(part_ids)))
+    checkpoints = checkpoints.subquery("last_checkpoint")
+
+    balances = dict(session.execute(
+        select(StockCheckpoint.part_id, StockCheckpoint.balance)
+        .join(checkpoints, (checkpoints.c.part_id == StockCheckpoint.part_id)
+              & (checkpoints.c.checkpoint_date == StockCheckpoint.checkpoint_date))
+    ).all())
+
+    movements = (
+        select(StockMovement.part_id, func.sum(StockMovement.qty))
+        .outerjoin(checkpoints, checkpoints.c.part_id == StockMovement.part_id)
+        .where(
+            StockMovement.movement_date <= as_of,
+            or_(checkpoints.c.checkpoint_date.is_(None), StockMovement.movement_date > checkpoints.c.checkpoint_date),
+        )
+        .group_by(StockMovement.part_id)
+    )
+    if part_ids is not None:
+        movements = movements.where(StockMovement.part_id.in_(list(part_ids)))
+    for part_id, qty in session.execute(movements):
+        balances[part_id] = balances.get(part_id, 0) + int(qty)
+    return balances
+
+
+def write_checkpoints(session: Session, as_of: date | None = None) -> int:
+    """
+    Контрольные точки остатков на конец дня as_of (по умолчанию - вчера: движения
+    текущего дня ещё могут добавиться) для всех запчастей с движениями до этой даты.
+    Возвращает число записанных точек.
+    """
+    as_of = as_of or date.today() - timedelta(days=1)
+    balances = stock_as_of(session, as_of)
+    session.execute(delete(StockCheckpoint).where(StockCheckpoint.checkpoint_date == as_of))
+    if balances:
+        session.execute(insert(StockCheckpoint), [
+            {"part_id": part_id, "checkpoint_date": as_of, "balance": balance}
+            for part_id, balance in balances.items()
+        ])
+    return len(balances)
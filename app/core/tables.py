@@ -0,0 +1,95 @@
+"""
+Таблицы страниц с постраничным выводом на сервере.
+
+st.dataframe со Styler по всему кадру переводит в pandas и раскрашивает каждую
+строку таблицы, а затем отправляет её в браузер целиком. paged_table хранит данные
+в pyarrow.Table: сортировка - индексы pyarrow.compute.sort_indices, страница -
+take по их срезу, и только строки страницы переводятся в pandas и раскрашиваются
+(стиль считается по колонке целиком, без вызова функции на каждую ячейку).
+Стоимость отрисовки зависит от размера страницы, а не от числа строк.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from .profiling import span
+
+PAGE_SIZES = (25, 50, 100, 500)
+ZONE_COLORS = {
+    'green': 'background-color: #90EE90',
+    'yellow': 'background-color: #FFD700',
+    'red': 'background-color: #FF6B6B',
+}
+NO_STOCK_COLOR = 'background-color: #FFB6C1'
+
+
+def zone_style(column: pd.Series) -> pd.Series:
+    """Цвет ячеек колонки зоны износа."""
+    return column.map(ZONE_COLORS).fillna('')
+
+
+def no_stock_style(column: pd.Series) -> np.ndarray:
+    """Цвет ячеек с нулевым складским запасом."""
+    return np.where(column == 0, NO_STOCK_COLOR, '')
+
+
+def table_page(table: pa.Table, sort_by: str | None = None, descending: bool = False,
+               offset: int = 0, limit: int = PAGE_SIZES[0]) -> pa.Table:
+    """Строки [offset, offset + limit) таблицы, отсортированной по колонке sort_by (без сортировки, если None)."""
+    if sort_by is None:
+        return table.slice(offset, limit)
+    indices = pc.sort_indices(
+        table, sort_keys=[(sort_by, "descending" if descending else "ascending")], null_placement="at_end"
+    )
+    return table.take(indices.slice(offset, limit))
+
+
+def paged_table(table: pa.Table, key: str, columns: dict[str, str] | None = None, styles: dict | None = None,
+                column_config: dict | None = None, page_size: int = PAGE_SIZES[1]):
+    """
+    Таблица с сортировкой и постраничным выводом на сервере.
+
+    columns - колонки table и их заголовки (по умолчанию - все колонки как есть),
+    styles - функции стиля по колонкам table (колонка страницы -> CSS ячеек, см.
+    zone_style), column_config - как у st.dataframe, по заголовкам. Переключение
+    страницы и сортировки перезапускает только таблицу (фрагмент).
+    """
+    _paged_table(table, key, columns or {name: name for name in table.column_names}, styles or {},
+                 column_config, page_size)
+
+
+@st.fragment
+def _paged_table(table: pa.Table, key: str, columns: dict, styles: dict, column_config, page_size: int):
+    if not table.num_rows:
+        st.info("Нет данных")
+        return
+
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        sort_by = st.selectbox(
+            "Сортировка", options=[None, *columns], key=f"{key}_sort",
+            format_func=lambda column: "Исходный порядок" if column is None else columns[column]
+        )
+    with col2:
+        descending = st.toggle("По убыванию", key=f"{key}_descending", disabled=sort_by is None)
+    with col3:
+        page_size = st.selectbox(
+            "Строк на странице", options=PAGE_SIZES, index=PAGE_SIZES.index(page_size), key=f"{key}_page_size"
+        )
+    pages = math.ceil(table.num_rows / page_size)
+    with col4:
+        page = st.number_input(f"Страница (из {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+
+    offset = (page - 1) * page_size
+    with span(f"таблица {key}"):
+        frame = table_page(table.select(list(columns)), sort_by, descending, offset, page_size).to_pandas()
+        styler = frame.rename(columns=columns).style
+        for column, style in styles.items():
+            styler = styler.apply(style, subset=[columns[column]])
+
+        st.dataframe(styler, use_container_width=True, hide_index=True, column_config=column_config)
+    st.caption(f"Строки {offset + 1}-{offset + len(frame)} из {table.num_rows}")
@@ -1,8 +1,25 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
 from sqlalchemy.orm import Session
 import streamlit as st
 from .db import SessionLocal, init_db
 from .services import ServiceContainer
-from .models import Replacements
+from .models import COMPUTED_TABLES, Replacements
+from .profiling import span
+from .writer import GroupCommitWriter
+
+# Запись через общий поток групповой фиксации (core/writer.py), включается переменной окружения
+WRITE_BEHIND = os.environ.get("PARTS_JOURNAL_WRITE_BEHIND") == "1"
+
+# Сколько результатов каждого метода хранит кэш страниц
+CACHE_ENTRIES = 32
+# Потоки предзагрузки данных страниц (общие для всех сессий браузера)
+PREFETCH_WORKERS = 8
+# Показывать на страницах время запросов предзагрузки
+SHOW_TIMINGS = os.environ.get("PARTS_JOURNAL_SHOW_TIMINGS") == "1"
 
 
 def get_db_session() -> Session:
@@ -12,14 +29,151 @@ def get_db_session() -> Session:
     return st.session_state.db_session
 
 
+@st.cache_resource
+def get_writer() -> GroupCommitWriter | None:
+    """Поток записи, общий для всех сессий браузера (один на процесс); None - режим выключен"""
+    return GroupCommitWriter() if WRITE_BEHIND else None
+
+
 def get_services() -> ServiceContainer:
     """Получить контейнер сервисов из session_state или создать новый"""
     if 'services' not in st.session_state:
         db = get_db_session()
-        st.session_state.services = ServiceContainer(db)
+        st.session_state.services = ServiceContainer(db, get_writer())
     return st.session_state.services
 
 
+@dataclass
+class Prefetched:
+    """Данные страницы по именам, время каждого запроса и общее время загрузки (секунды)."""
+    data: dict
+    timings: dict
+    elapsed: float
+
+    def __getitem__(self, name: str):
+        return self.data[name]
+
+
+@st.cache_resource
+def get_prefetch_pool() -> ThreadPoolExecutor:
+    """Пул потоков предзагрузки, общий для всех сессий браузера (один на процесс)"""
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+
+
+def _load(loader):
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        return loader(ServiceContainer(db)), time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def prefetch(**loaders) -> Prefetched:
+    """
+    Одновременная загрузка данных страницы: каждый loader(services) выполняется в
+    пуле потоков со своей короткой сессией (SQLite отпускает GIL на время запроса),
+    поэтому ожидание - самый долгий запрос, а не сумма. Загрузчики только читают;
+    ORM-объекты в результатах отсоединены от сессии, связи у них не подгружаются.
+
+        data = prefetch(types=lambda s: s.replacement_types.list(), n_parts=lambda s: s.parts.count())
+        data["types"], data.timings["types"]
+    """
+    started = time.perf_counter()
+    pool = get_prefetch_pool()
+    with span(f"prefetch: {', '.join(loaders)}"):
+        futures = {name: pool.submit(_load, loader) for name, loader in loaders.items()}
+        data, timings = {}, {}
+        for name, future in futures.items():
+            data[name], timings[name] = future.result()
+    prefetched = Prefetched(data, timings, time.perf_counter() - started)
+    if SHOW_TIMINGS:
+        show_timings(prefetched)
+    return prefetched
+
+
+def show_timings(prefetched: Prefetched):
+    """Время запросов предзагрузки: по каждому, их сумма и фактическое ожидание."""
+    with st.expander(f"Загрузка данных: {prefetched.elapsed * 1000:.0f} мс"):
+        st.dataframe(
+            [{"Данные": name, "мс": round(seconds * 1000, 1)} for name, seconds in prefetched.timings.items()],
+            hide_index=True,
+        )
+        st.caption(
+            f"Сумма запросов {sum(prefetched.timings.values()) * 1000:.0f} мс, "
+            f"ожидание {prefetched.elapsed * 1000:.0f} мс"
+        )
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def catch_up_wear_snapshots(today: date) -> int:
+    """
+    Дописывает недостающие снимки износа до today не чаще раза в день на процесс
+    (ключ кэша - дата). Снимки поддерживают jobs.py wear-snapshots и пересчёт при
+    фиксации записей; здесь - только догонка, если задание не запускалось.
+    """
+    db = SessionLocal()
+    try:
+        return ServiceContainer(db).wear_snapshots.refresh(until=today)
+    finally:
+        db.close()
+
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def catch_up_lifetime_stats(today: date) -> int:
+    """
+    Пересчитывает фактические сроки службы не чаще раза в день на процесс (ключ
+    кэша - дата). Статистику поддерживает jobs.py lifetime-stats; здесь - только
+    догонка, если задание сегодня не запускалось.
+    """
+    db = SessionLocal()
+    try:
+        return ServiceContainer(db).lifetime_stats.refresh()
+    finally:
+        db.close()
+
+
+def data_version(tables=COMPUTED_TABLES) -> tuple:
+    """
+    Ключ кэша рассчитанных данных: версии таблиц (data_version) и текущая дата -
+    износ зависит от неё. Запись в любую из таблиц меняет ключ.
+    """
+    return tuple(sorted(get_services().data_versions.get(*tables).items())), date.today()
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _cached_call(version, service_name: str, method: str, args: tuple, kwargs: dict, _services):
+    return getattr(getattr(_services, service_name), method)(*args, **kwargs)
+
+
+def cached(service_name: str, method: str, *args, **kwargs):
+    """
+    Результат services.<service_name>.<method>(*args, **kwargs) из кэша, общего для
+    всех сессий браузера. Ключ - аргументы и data_version(), поэтому перезапуск
+    страницы или фрагмента без изменения данных не пересчитывает износ и план,
+    а после записи результат считается заново. Метод должен только читать.
+    """
+    with span(f"{service_name}.{method}"):
+        return _cached_call(data_version(), service_name, method, args, kwargs, get_services())
+
+
+def edit_version(form_key: str, obj) -> int:
+    """
+    Версия записи на момент открытия формы редактирования (для expected_version).
+    Отправка формы перезапускает страницу и перечитывает запись, поэтому версию,
+    с которой пользователь начал правку, храним в session_state.
+    """
+    state_key = f"{form_key}_version_{obj.id}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = obj.version
+    return st.session_state[state_key]
+
+
+def reset_edit_version(form_key: str, obj_id: int):
+    """Забыть версию формы: после сохранения или конфликта форма загрузит запись заново."""
+    st.session_state.pop(f"{form_key}_version_{obj_id}", None)
+
+
 def init_seed_data():
     """Инициализация начальных данных для справочников"""
     services = get_services()
@@ -0,0 +1,132 @@
+"""
+Векторизованный расчёт износа по всем незаменённым установкам.
+
+Складской запас запчасти распределяется между её установками в порядке срочности
+(раньше всех откажет - первой получит запчасть со склада). Установкам, которым
+запаса не хватило, из оставшегося срока вычитается срок доставки.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+ZONES = np.array(["green", "yellow", "red"])
+# Границы зон по доле оставшегося срока службы (как в compute_wear)
+YELLOW_THRESHOLD = 0.25
+RED_THRESHOLD = 0.10
+
+
+def allocate_stock(part_index, failure_ordinal, stock_by_part, tiebreak=None):
+    """
+    Распределение складского запаса по установкам.
+
+    part_index - индекс запчасти каждой установки, failure_ordinal - дата окончания
+    срока службы (ordinal), stock_by_part - запас по индексу запчасти. Возвращает
+    булев массив: получила ли установка запчасть со склада.
+
+    Установки сортируются по (запчасть, дата отказа, tiebreak); ранг внутри группы
+    запчасти сравнивается с её запасом - O(n log n) без циклов Python.
+    """
+    part_index = np.asarray(part_index, dtype=np.int64)
+    n = part_index.size
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    failure_ordinal = np.asarray(failure_ordinal, dtype=np.int64)
+    tiebreak = np.zeros(n, dtype=np.int64) if tiebreak is None else np.asarray(tiebreak, dtype=np.int64)
+
+    # Три ключа сортировки упаковываются в одно int64: одна быстрая сортировка
+    # вместо lexsort по трём массивам. Если диапазоны не помещаются - lexsort.
+    failure_offset = failure_ordinal - failure_ordinal.min()
+    tiebreak_offset = tiebreak - tiebreak.min()
+    failure_span = int(failure_offset.max()) + 1
+    tiebreak_span = int(tiebreak_offset.max()) + 1
+    if (int(part_index.max()) + 1) * failure_span * tiebreak_span < 2 ** 62:
+        order = np.argsort((part_index * failure_span + failure_offset) * tiebreak_span + tiebreak_offset)
+    else:
+        order = np.lexsort((tiebreak, failure_ordinal, part_index))
+
+    sorted_parts = part_index[order]
+    group_start = np.searchsorted(sorted_parts, sorted_parts, side="left")
+    rank = np.arange(n) - group_start
+
+    covered = np.empty(n, dtype=bool)
+    covered[order] = rank < np.asarray(stock_by_part)[sorted_parts]
+    return covered
+
+
+def wear_arrays(useful_life_days, installation_ordinal, lead_time_days, has_stock, today_ordinal):
+    """
+    Векторный аналог compute_wear для незаменённых установок.
+    Возвращает (доля остатка, оставшиеся дни, код зоны 0/1/2 - индекс в ZONES).
+    """
+    life = np.asarray(useful_life_days, dtype=np.int64)
+    used = today_ordinal - np.asarray(installation_ordinal, dtype=np.int64)
+    remaining = life - used - np.where(has_stock, 0, np.asarray(lead_time_days, dtype=np.int64))
+
+    percentage_left = np.maximum(0.0, remaining / np.maximum(life, 1))
+    percentage_left = np.where(life > 0, percentage_left, 0.0)
+    remaining = np.maximum(0, remaining)
+
+    zone = np.where(percentage_left > YELLOW_THRESHOLD, 0, np.where(percentage_left > RED_THRESHOLD, 1, 2))
+    return percentage_left, remaining, zone
+
+
+def fleet_wear(frame: pd.DataFrame, today: date | None = None) -> pd.DataFrame:
+    """
+    Износ всех незаменённых установок с распределением складского запаса.
+
+    frame - по строке на установку, с колонками replacement_id, part_id,
+    installation_date, useful_life_days, lead_time_days, qty_in_stock.
+    Добавляет колонки installation_ordinal, failure_ordinal (дата окончания срока
+    службы) - в нумерации date.toordinal, has_stock, percentage_left, remaining_days, zone.
+    """
+    today = today or date.today()
+    result = frame.copy()
+    if result.empty:
+        for column in ("installation_ordinal", "failure_ordinal", "has_stock", "percentage_left", "remaining_days", "zone"):
+            result[column] = pd.Series(dtype=object)
+        return result
+
+    installation_ordinal = np.fromiter((d.toordinal() for d in result["installation_date"]), dtype=np.int64, count=len(result))
+    life = result["useful_life_days"].to_numpy(dtype=np.int64)
+    failure_ordinal = installation_ordinal + life
+
+    part_codes, part_index = np.unique(result["part_id"].to_numpy(), return_inverse=True)
+    stock_by_part = np.zeros(part_codes.size, dtype=np.int64)
+    stock_by_part[part_index] = result["qty_in_stock"].to_numpy(dtype=np.int64)
+
+    has_stock = allocate_stock(part_index, failure_ordinal, stock_by_part, tiebreak=result["replacement_id"].to_numpy())
+    percentage_left, remaining_days, zone = wear_arrays(
+        life, installation_ordinal, result["lead_time_days"].to_numpy(dtype=np.int64), has_stock, today.toordinal()
+    )
+
+    result["installation_ordinal"] = installation_ordinal
+    result["failure_ordinal"] = failure_ordinal
+    result["has_stock"] = has_stock
+    result["percentage_left"] = percentage_left
+    result["remaining_days"] = remaining_days
+    result["zone"] = ZONES[zone]
+    return result
+
+
+def transition_ordinals(useful_life_days, installation_ordinal, lead_time_days, has_stock):
+    """
+    Даты перехода установки в жёлтую и красную зону (date.toordinal).
+
+    Зона определяется долей остатка (life - used - lead) / life, которая линейно
+    убывает со временем, поэтому переходы вычисляются точно в целых числах:
+    жёлтая - с первого дня, когда used >= 0.75 * life - lead, красная - когда
+    used >= 0.90 * life - lead. Зона на любую дату D сводится к сравнению D с
+    этими датами.
+    """
+    life = np.asarray(useful_life_days, dtype=np.int64)
+    installation_ordinal = np.asarray(installation_ordinal, dtype=np.int64)
+    lead = np.where(has_stock, 0, np.asarray(lead_time_days, dtype=np.int64))
+
+    def first_day(percent):
+        # Наименьшее целое used, при котором 100 * (life - used - lead) <= percent * life
+        return -((-((100 - percent) * life - 100 * lead)) // 100)
+
+    yellow = installation_ordinal + first_day(round(YELLOW_THRESHOLD * 100))
+    red = installation_ordinal + first_day(round(RED_THRESHOLD * 100))
+    return yellow, red
@@ -0,0 +1,59 @@
+"""
+Поля выбора записи справочника с поиском.
+
+st.selectbox с полным справочником отправляет в браузер все записи при каждой
+отрисовке страницы. search_select показывает поле поиска по началу названия и
+список из не больше SEARCH_LIMIT найденных записей (service.search - диапазон по
+индексу name_key), а текущее значение находит по id (service.option): стоимость
+отрисовки формы не зависит от размера справочника.
+"""
+import streamlit as st
+
+from .search import SEARCH_LIMIT
+
+
+def option_label(option) -> str:
+    """Подпись варианта: название, уточнение (оборудование, адрес) и id."""
+    if option.detail:
+        return f"{option.name} - {option.detail} (ID: {option.id})"
+    return f"{option.name} (ID: {option.id})"
+
+
+def search_select(label: str, service, key: str, selected_id: int | None = None, none_label: str | None = None,
+                  limit: int = SEARCH_LIMIT, format_func=option_label, include_retired: bool = False):
+    """
+    Поле поиска и список найденных записей справочника service. Запись selected_id
+    (текущее значение поля) всегда есть среди вариантов и выбрана по умолчанию;
+    без неё по умолчанию выбрана первая находка. none_label - вариант "не выбрано",
+    include_retired - предлагать и выведенные из эксплуатации записи (формы
+    редактирования). Возвращает OptionRow или None.
+
+    Поле поиска перезапускает страницу при вводе, а виджеты внутри st.form - нет,
+    поэтому search_select вызывается вне формы.
+    """
+    prefix = st.text_input(f"Поиск: {label.rstrip(' *')}", key=f"{key}_search", placeholder="Начало названия")
+    options = service.search(prefix, limit=limit, include_retired=include_retired)
+    found = len(options)
+
+    if selected_id is not None and all(option.id != selected_id for option in options):
+        current = service.option(selected_id)
+        if current is not None:
+            options.insert(0, current)
+    if none_label is not None:
+        options.insert(0, None)
+
+    if not options:
+        st.info(f"{label.rstrip(' *')}: ничего не найдено")
+        return None
+    if found == limit:
+        st.caption(f"Показаны первые {limit} - уточните поиск")
+    # Выбор пользователя сохраняется, пока он есть среди вариантов; иначе selectbox
+    # возвращается к index - текущему значению поля или первой находке
+    index = next((i for i, option in enumerate(options) if option is not None and option.id == selected_id), 0)
+    return st.selectbox(
+        label,
+        options=options,
+        index=index,
+        format_func=lambda option: none_label if option is None else format_func(option),
+        key=key,
+    )
@@ -0,0 +1,215 @@
+"""
+Запись через один поток с групповой фиксацией (write-behind).
+
+При одновременной работе нескольких сессий каждый create/update/delete фиксируется
+отдельно: сессии по очереди ждут блокировку записи SQLite, и каждая фиксация пишет
+журнал на диск. GroupCommitWriter принимает операции записи из всех сессий в
+очередь, а единственный поток записи выполняет накопившиеся за несколько
+миллисекунд операции одной транзакцией (одна фиксация на пакет) и возвращает
+отправителям Future с результатом.
+
+Каждая операция выполняется в своей точке сохранения (SAVEPOINT): ошибка одной
+операции (ConflictError, InsufficientStockError, ...) откатывает только её и
+попадает в её Future, остальные операции пакета фиксируются.
+
+Read-your-writes: Future, отправленные через services.writes, запоминаются в
+сессии отправителя; перед следующим запросом этой сессии (do_orm_execute) они
+дожидаются фиксации, а объекты сессии помечаются устаревшими и перечитываются.
+
+Режим необязательный: без writer services.writes выполняет операцию сразу в
+сессии контейнера и возвращает завершённый Future.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Наибольшее число операций в одной транзакции
+MAX_BATCH = 500
+# Сколько ждать следующих операций, прежде чем фиксировать неполный пакет, секунд
+MAX_DELAY_SECONDS = 0.002
+# Неподтверждённые операции сессии-отправителя хранятся в session.info
+PENDING_WRITES_KEY = "pending_writes"
+
+_STOP = object()
+
+
+def _call_service(services, service_name: str, method: str, args, kwargs):
+    return getattr(getattr(services, service_name), method)(*args, **kwargs)
+
+
+class GroupCommitWriter:
+    """
+    Поток записи: операции op(services, *args, **kwargs) из очереди выполняются
+    пакетами в собственной сессии потока, по одной фиксации на пакет.
+    Один экземпляр на процесс (на одну БД).
+    """
+
+    def __init__(self, session_factory=None, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY_SECONDS):
+        if session_factory is None:
+            from .db import SessionLocal as session_factory
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.operations = 0
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op, args=(), kwargs=None, session: Session | None = None) -> Future:
+        """
+        Поставить операцию в очередь. session - сессия отправителя: её следующий
+        запрос дождётся фиксации операции (read-your-writes).
+        """
+        if self._closed:
+            raise RuntimeError("Поток записи остановлен")
+        future = Future()
+        self._queue.put((future, op, args, kwargs or {}))
+        if session is not None:
+            session.info.setdefault(PENDING_WRITES_KEY, []).append(future)
+        return future
+
+    def call(self, service_name: str, method: str, *args, session: Session | None = None, **kwargs) -> Future:
+        """Вызов метода сервиса в потоке записи: call("stock", "receive", part_id, 5)."""
+        return self.submit(_call_service, (service_name, method, args, kwargs), session=session)
+
+    def flush(self, timeout: float | None = None):
+        """Дождаться фиксации всех операций, поставленных до вызова."""
+        self.submit(lambda services: None).result(timeout)
+
+    def close(self, timeout: float | None = None):
+        """Зафиксировать очередь и остановить поток."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _next_batch(self):
+        """Первая операция - с ожиданием, затем всё, что успело накопиться (не дольше max_delay)."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        from .services import TRANSACTION_DEPTH_KEY, ServiceContainer
+
+        # Результаты передаются в другие потоки, поэтому после фиксации не устаревают
+        session = self.session_factory(expire_on_commit=False)
+        # Сервисы только сбрасывают изменения (как в services.transaction()), фиксирует поток
+        session.info[TRANSACTION_DEPTH_KEY] = 1
+        services = ServiceContainer(session)
+        try:
+            stopping = False
+            while not stopping:
+                batch = self._next_batch()
+                if batch[-1] is _STOP:
+                    batch.pop()
+                    stopping = True
+                if batch:
+                    self._execute(session, services, batch)
+        finally:
+            session.close()
+
+    def _execute(self, session: Session, services, batch):
+        batch = [item for item in batch if item[0].set_running_or_notify_cancel()]
+        try:
+            # BEGIN IMMEDIATE: блокировка записи берётся сразу, а SAVEPOINT первой
+            # операции не открывает (и не фиксирует при RELEASE) собственную транзакцию
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        except BaseException as e:
+            session.rollback()
+            for future, *_ in batch:
+                future.set_exception(e)
+            return
+        done = []
+        for future, op, args, kwargs in batch:
+            savepoint = session.begin_nested()
+            try:
+                result = op(services, *args, **kwargs)
+                savepoint.commit()
+            except BaseException as e:
+                if savepoint.is_active:
+                    savepoint.rollback()
+                future.set_exception(e)
+            else:
+                done.append((future, result))
+        try:
+            session.commit()
+        except BaseException as e:
+            session.rollback()
+            for future, _ in done:
+                future.set_exception(e)
+        else:
+            for future, result in done:
+                future.set_result(result)
+        finally:
+            # Объекты результатов отсоединяются от сессии потока записи
+            session.expunge_all()
+            self.batches += 1
+            self.operations += len(batch)
+
+
+class _ServiceWrites:
+    def __init__(self, writes: "WriteBehind", service_name: str):
+        self._writes = writes
+        self._service_name = service_name
+
+    def __getattr__(self, method: str):
+        def submit(*args, **kwargs) -> Future:
+            return self._writes.call(self._service_name, method, *args, **kwargs)
+        return submit
+
+
+class WriteBehind:
+    """
+    services.writes: те же методы сервисов, но вызов возвращает Future.
+    services.writes.stock.receive(part_id, 5).result() - дождаться фиксации и результата.
+    """
+
+    def __init__(self, services, writer: GroupCommitWriter | None = None):
+        self._services = services
+        self.writer = writer
+
+    def call(self, service_name: str, method: str, *args, **kwargs) -> Future:
+        if self.writer is not None:
+            return self.writer.call(service_name, method, *args, session=self._services.db, **kwargs)
+        future = Future()
+        try:
+            future.set_result(_call_service(self._services, service_name, method, args, kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __getattr__(self, service_name: str) -> _ServiceWrites:
+        if service_name.startswith("_"):
+            raise AttributeError(service_name)
+        return _ServiceWrites(self, service_name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _wait_for_own_writes(orm_execute_state):
+    session = orm_execute_state.session
+    pending = session.info.pop(PENDING_WRITES_KEY, None)
+    if not pending:
+        return
+    # Ошибки операций получает тот, кто ждёт их Future; здесь важна только фиксация
+    wait(pending)
+    for obj in list(session.identity_map.values()):
+        if obj not in session.dirty:
+            session.expire(obj)
@@ -0,0 +1,230 @@
+"""
+Поддержка таблицы zone_transition в актуальном состоянии.
+
+Даты переходов установки зависят от даты установки, срока службы и срока доставки
+запчасти, а через распределение складского запаса - от всех незаменённых установок
+той же запчасти. Поэтому при любой записи в part или replacement_log запоминаются
+затронутые запчасти, и перед фиксацией транзакции их строки пересчитываются
+целиком (в той же транзакции). Даты плана закупки зависят ещё и от календаря
+закупок: изменение дней закупки поставщика пересчитывает его запчасти, изменение
+праздников - все.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, event, func, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import DataVersion, Holiday, Part, ReplacementLog, Supplier, ZoneTransition
+from .purchase_calendar import EPOCH_ORDINAL, PurchaseCalendar, PurchaseCalendars, supplier_codes
+from .services import ReplacementService
+from .wear import fleet_wear, transition_ordinals
+
+# Поля запчасти, от которых зависят даты переходов и плана закупки
+PART_FIELDS = ("useful_life_days", "lead_time_days", "qty_in_stock", "supplier_id")
+# Поля поставщика, от которых зависит его календарь закупок
+SUPPLIER_FIELDS = ("purchase_days", "holiday_shift")
+
+_DIRTY_KEY = "zone_dirty_parts"
+# Поставщики с изменённым календарём; ALL_SUPPLIERS - изменились праздники
+_DIRTY_SUPPLIERS_KEY = "zone_dirty_suppliers"
+ALL_SUPPLIERS = "all"
+
+
+def _to_dates(ordinals):
+    return (np.asarray(ordinals, dtype=np.int64) - EPOCH_ORDINAL).astype("datetime64[D]").tolist()
+
+
+def plan_frame(frame, today=None, calendars: PurchaseCalendar | PurchaseCalendars | None = None):
+    """
+    Износ (fleet_wear), даты переходов зон и даты плана закупки для кадра
+    незаменённых установок. Добавляет колонки yellow_ordinal, red_ordinal,
+    init_ordinal, purchase_ordinal, receipt_ordinal (date.toordinal).
+
+    calendars - календарь закупок (один для всех строк) или календари поставщиков
+    (по колонке supplier_id); по умолчанию - закупка 10 и 25 числа.
+    """
+    calendars = calendars or PurchaseCalendar()
+    frame = fleet_wear(frame, today=today)
+    if frame.empty:
+        for column in ("yellow_ordinal", "red_ordinal", "init_ordinal", "purchase_ordinal", "receipt_ordinal"):
+            frame[column] = pd.Series(dtype=np.int64)
+        return frame
+    frame["yellow_ordinal"], frame["red_ordinal"] = transition_ordinals(
+        frame["useful_life_days"].to_numpy(),
+        frame["installation_ordinal"].to_numpy(),
+        frame["lead_time_days"].to_numpy(),
+        frame["has_stock"].to_numpy(),
+    )
+    supplier_ids = (
+        supplier_codes(frame["supplier_id"]) if "supplier_id" in frame.columns else None
+    )
+    frame["init_ordinal"], frame["purchase_ordinal"], frame["receipt_ordinal"] = calendars.latest_init_dates(
+        frame["failure_ordinal"].to_numpy(), frame["lead_time_days"].to_numpy(), supplier_ids
+    )
+    return frame
+
+
+def next_revision(session: Session) -> int:
+    """
+    Следующий номер пересчёта zone_transition. Счётчик монотонный (в отличие от
+    max(revision), который уменьшается при удалении строк) и увеличивается в той же
+    транзакции, что и запись строк, поэтому номера фиксируются в порядке возрастания.
+    """
+    revision = session.execute(
+        update(DataVersion)
+        .where(DataVersion.table_name == ZoneTransition.__tablename__)
+        .values(version=DataVersion.version + 1)
+        .returning(DataVersion.version)
+    ).scalar()
+    if revision is None:
+        revision = 1
+        session.add(DataVersion(table_name=ZoneTransition.__tablename__, version=revision))
+    return revision
+
+
+def rebuild_zone_transitions(session: Session, part_ids=None) -> int:
+    """
+    Пересчитывает строки zone_transition для указанных запчастей (для всех, если None).
+    Возвращает число записанных строк.
+    """
+    frame = ReplacementService(session).open_installations_frame(part_ids=part_ids)
+
+    stmt = delete(ZoneTransition)
+    if part_ids is not None:
+        stmt = stmt.where(ZoneTransition.part_id.in_(list(part_ids)))
+    session.execute(stmt)
+    if frame.empty:
+        return 0
+
+    frame = plan_frame(frame, calendars=PurchaseCalendars.load(session))
+    revision = next_revision(session)
+
+    # Последняя установка каждой запчасти
+    latest_ids = set(
+        frame.sort_values(["installation_date", "replacement_id"])
+        .drop_duplicates("part_id", keep="last")["replacement_id"]
+        .tolist()
+    )
+
+    rows = [
+        {
+            "replacement_id": replacement_id,
+            "part_id": part_id,
+            "equipment_id": equipment_id,
+            "installation_date": installation_date,
+            "is_latest": replacement_id in latest_ids,
+            "has_stock": has_stock,
+            "yellow_date": yellow_date,
+            "red_date": red_date,
+            "failure_date": failure_date,
+            "latest_init_date": init_date,
+            "latest_purchase_date": purchase_date,
+            "receipt_date": receipt_date,
+            "revision": revision,
+        }
+        for replacement_id, part_id, equipment_id, installation_date, has_stock,
+            yellow_date, red_date, failure_date, init_date, purchase_date, receipt_date in zip(
+            frame["replacement_id"].tolist(),
+            frame["part_id"].tolist(),
+            frame["equipment_id"].tolist(),
+            frame["installation_date"].tolist(),
+            frame["has_stock"].tolist(),
+            _to_dates(frame["yellow_ordinal"]),
+            _to_dates(frame["red_ordinal"]),
+            _to_dates(frame["failure_ordinal"]),
+            _to_dates(frame["init_ordinal"]),
+            _to_dates(frame["purchase_ordinal"]),
+            _to_dates(frame["receipt_ordinal"]),
+        )
+    ]
+    session.execute(insert(ZoneTransition), rows)
+    return len(rows)
+
+
+def mark_parts_dirty(session: Session, part_ids):
+    """
+    Отметить запчасти для пересчёта при фиксации транзакции. Нужно вызывать явно
+    после массовых SQL-операций, которые обходят отслеживание изменений ORM.
+    """
+    session.info.setdefault(_DIRTY_KEY, set()).update(part_ids)
+
+
+def backfill_zone_transitions(session: Session):
+    """Первичное заполнение таблицы для уже существующей БД."""
+    has_rows = session.execute(select(ZoneTransition.replacement_id).limit(1)).first()
+    has_open = session.execute(
+        select(func.count()).select_from(ReplacementLog).where(ReplacementLog.replacement_date.is_(None))
+    ).scalar()
+    if not has_rows and has_open:
+        rebuild_zone_transitions(session)
+        session.commit()
+
+
+def _changed_part_ids(obj):
+    """Запчасти, чьи даты переходов могли измениться из-за записи obj."""
+    state = inspect(obj)
+    if isinstance(obj, ReplacementLog):
+        history = state.attrs.part_id.history
+        return {obj.part_id, *(history.deleted or ())}
+    if isinstance(obj, Part):
+        if state.deleted or state.was_deleted:
+            return {obj.id}
+        if any(state.attrs[field].history.has_changes() for field in PART_FIELDS):
+            return {obj.id}
+    return set()
+
+
+def _calendar_changed(obj) -> bool:
+    """Изменился ли календарь закупок поставщика (новый поставщик ещё не назначен запчастям)."""
+    state = inspect(obj)
+    return bool(state.deleted or state.was_deleted) or any(
+        state.attrs[field].history.has_changes() for field in SUPPLIER_FIELDS
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_parts(session, flush_context):
+    dirty = set()
+    suppliers = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (ReplacementLog, Part)):
+            dirty |= _changed_part_ids(obj)
+        elif isinstance(obj, Holiday):
+            suppliers.add(ALL_SUPPLIERS)
+        elif isinstance(obj, Supplier) and obj not in session.new and _calendar_changed(obj):
+            suppliers.add(obj.id)
+    dirty.discard(None)
+    if dirty:
+        mark_parts_dirty(session, dirty)
+    if suppliers:
+        session.info.setdefault(_DIRTY_SUPPLIERS_KEY, set()).update(suppliers)
+
+
+@event.listens_for(Session, "before_commit")
+def _sync_zone_transitions(session):
+    # Точка сохранения (begin_nested) не фиксирует транзакцию: пересчёт - при внешней фиксации
+    if session.in_nested_transaction():
+        return
+    # Сначала сбрасываем ожидающие изменения, чтобы after_flush собрал затронутые запчасти
+    session.flush()
+    suppliers = session.info.pop(_DIRTY_SUPPLIERS_KEY, None)
+    if suppliers and ALL_SUPPLIERS in suppliers:
+        session.info.pop(_DIRTY_KEY, None)
+        rebuild_zone_transitions(session)
+        return
+    if suppliers:
+        mark_parts_dirty(session, session.execute(
+            select(Part.id).where(Part.supplier_id.in_(list(suppliers)))
+        ).scalars())
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        rebuild_zone_transitions(session, dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dirty_parts(session):
+    # Откат к точке сохранения: отметки внешней транзакции ещё понадобятся (лишние безвредны)
+    if session.in_nested_transaction():
+        return
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_DIRTY_SUPPLIERS_KEY, None)
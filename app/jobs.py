@@ -0,0 +1,114 @@
+"""
+Пакетные задания журнала запасных частей.
+
+Запуск:
+    python app/jobs.py lifetime-stats [--full]   - пересчёт фактических сроков службы
+    python app/jobs.py alerts [--once] [--sink alerts.jsonl] [--poll 60]
+                                                 - планировщик оповещений о переходах зон
+    python app/jobs.py wear-snapshots [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+                                                 - ежедневные снимки износа (дозапись или перезапись диапазона)
+    python app/jobs.py archive [--age-days 730]  - перенос старых закрытых замен в архив
+    python app/jobs.py query-plans [--verbose]   - проверка планов запросов сервисов (без полных просмотров таблиц)
+    python app/jobs.py stock-checkpoints [--date YYYY-MM-DD]
+                                                 - контрольные точки остатков склада (по умолчанию на вчера)
+"""
+import argparse
+import sys
+from datetime import date
+
+from core.alerts import AlertScheduler, FileSink
+from core.archive import ARCHIVE_AGE_DAYS
+from core.db import SessionLocal, init_db
+from core.query_plans import collect_query_plans, full_scan_violations
+from core.services import ServiceContainer
+
+
+def lifetime_stats(services: ServiceContainer, args):
+    recomputed = services.lifetime_stats.refresh(full=args.full)
+    print(f"Пересчитано групп: {recomputed}")
+
+
+def alerts(services: ServiceContainer, args):
+    sinks = [FileSink(args.sink)] if args.sink else []
+    scheduler = AlertScheduler(services.alerts.db, sinks=sinks)
+
+    def report(new_alerts):
+        for alert in new_alerts:
+            print(f"{alert['event_date']} {alert['kind']}: установка {alert['replacement_id']} "
+                  f"(запчасть {alert['part_id']}, оборудование {alert['equipment_id']})")
+
+    scheduler.run(poll_seconds=args.poll, once=args.once, on_emit=report)
+
+
+def wear_snapshots(services: ServiceContainer, args):
+    written = services.wear_snapshots.refresh(until=args.end, start=args.start)
+    print(f"Записано строк снимков: {written}")
+
+
+def archive(services: ServiceContainer, args):
+    moved = services.replacements.archive(older_than_days=args.age_days)
+    print(f"Перенесено в архив записей: {moved}")
+
+
+def query_plans(services: ServiceContainer, args):
+    plans = collect_query_plans()
+    violations = full_scan_violations(plans)
+    for plan in plans if args.verbose else violations:
+        status = "ПОЛНЫЙ ПРОСМОТР: " + ", ".join(plan.full_scans) if plan.full_scans else "ok"
+        print(f"[{plan.scenario}] {status}")
+        print("    " + " ".join(plan.statement.split()))
+        for detail in plan.details:
+            print(f"        {detail}")
+    print(f"Запросов: {len(plans)}, с полным просмотром таблицы: {len(violations)}")
+    if violations:
+        sys.exit(1)
+
+
+def stock_checkpoints(services: ServiceContainer, args):
+    written = services.stock.write_checkpoints(args.date)
+    print(f"Записано контрольных точек остатков: {written}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетные задания журнала запасных частей")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_lifetime = subparsers.add_parser("lifetime-stats", help="Пересчёт фактических сроков службы")
+    parser_lifetime.add_argument("--full", action="store_true", help="Пересчитать все группы, а не только изменившиеся")
+    parser_lifetime.set_defaults(func=lifetime_stats)
+
+    parser_alerts = subparsers.add_parser("alerts", help="Планировщик оповещений о переходах зон и сроках заявок")
+    parser_alerts.add_argument("--once", action="store_true", help="Выдать наступившие события и завершиться")
+    parser_alerts.add_argument("--sink", help="Файл, в который дописываются новые оповещения (JSON по строке)")
+    parser_alerts.add_argument("--poll", type=float, default=60, help="Интервал проверки изменений, секунд")
+    parser_alerts.set_defaults(func=alerts)
+
+    parser_snapshots = subparsers.add_parser("wear-snapshots", help="Ежедневные снимки износа по оборудованию")
+    parser_snapshots.add_argument("--start", type=date.fromisoformat, help="Перезаписать снимки начиная с даты")
+    parser_snapshots.add_argument("--end", type=date.fromisoformat, help="Последняя дата снимков (по умолчанию сегодня)")
+    parser_snapshots.set_defaults(func=wear_snapshots)
+
+    parser_archive = subparsers.add_parser("archive", help="Перенос старых закрытых замен в архивную таблицу")
+    parser_archive.add_argument("--age-days", type=int, default=ARCHIVE_AGE_DAYS,
+                                help="Переносить замены, закрытые раньше чем столько дней назад")
+    parser_archive.set_defaults(func=archive)
+
+    parser_plans = subparsers.add_parser("query-plans", help="EXPLAIN QUERY PLAN для запросов сервисов на проверочной БД")
+    parser_plans.add_argument("--verbose", action="store_true", help="Показать планы всех запросов, а не только нарушения")
+    parser_plans.set_defaults(func=query_plans)
+
+    parser_checkpoints = subparsers.add_parser("stock-checkpoints", help="Контрольные точки остатков склада на конец дня")
+    parser_checkpoints.add_argument("--date", type=date.fromisoformat, help="Дата точки (по умолчанию вчера)")
+    parser_checkpoints.set_defaults(func=stock_checkpoints)
+
+    args = parser.parse_args()
+    init_db()
+    db = SessionLocal()
+    try:
+        args.func(ServiceContainer(db), args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
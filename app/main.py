@@ -23,5 +23,7 @@ st.markdown(
     - **Equipment** - управление оборудованием
     - **Replacements** - журнал замен
     - **Procurement Plan** - план закупок
+    - **Schedule** - расписание замен по мастерским
+    - **Admin** - профили перезапусков страниц
     """
 )
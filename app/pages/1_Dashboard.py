@@ -1,162 +1,122 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import date, timedelta
-from core.utils import get_services
-from core.services import compute_wear
+from core.profiling import finish_profile, span, start_profile
+from core.tables import paged_table, zone_style
+from core.utils import cached, catch_up_wear_snapshots, get_services
 
 # Настройка matplotlib для русского языка
 plt.rcParams['font.family'] = 'DejaVu Sans'
 plt.rcParams['figure.figsize'] = (10, 6)
 
+# Периоды графика динамики износа, дней
+TREND_PERIODS = (90, 180, 365)
+
 st.set_page_config(page_title="Dashboard", layout="wide")
 st.title("Сводка по статусам")
+start_profile("Dashboard")
 
 services = get_services()
 
-# Получаем все данные
-parts = services.parts.list()
-equipment_list = services.equipment.list()
-replacements = services.replacements.list()
 
-if not parts:
+# Страница разбита на фрагменты (st.fragment): виджет внутри фрагмента перезапускает
+# только его. Данные берутся из кэша (cached), ключ которого меняется при записи,
+# поэтому перезапуск без изменения данных не пересчитывает износ.
+
+# Дата, на которую показывается состояние (по умолчанию - сегодня)
+as_of = st.date_input("Состояние на дату", value=date.today())
+
+# Метрики первыми: счётчики зон - индексные запросы по предрасчитанным датам переходов
+zone_totals = cached("zones", "zone_counts", as_of)
+total_parts = sum(zone_totals.values())
+
+if not total_parts:
     st.info("Нет данных для отображения. Добавьте запчасти и оборудование.")
     st.stop()
 
-# Подсчет статусов износа
-green_count = 0
-yellow_count = 0
-red_count = 0
-
-wear_data = []
-wear_percentage_data = []  # Для агрегации wear % по деталям
-equipment_red_zone_data = []  # Для агрегации красных зон по оборудованию
-wear_timeline_data = []  # Для графика износа по времени
-
-for part in parts:
-    # Находим последнюю установку этой запчасти (которая еще не заменена)
-    part_replacements = [r for r in replacements if r.part_id == part.id and not r.replacement_date]
-
-    if part_replacements:
-        # Берем последнюю установку
-        latest_replacement = max(part_replacements, key=lambda x: x.installation_date)
-        installation_date = latest_replacement.installation_date
-        replacement_date = latest_replacement.replacement_date
-
-        # Получаем оборудование
-        equipment = next((e for e in equipment_list if e.id == latest_replacement.equipment_id), None)
-        equipment_name = equipment.name if equipment else 'N/A'
-
-        percentage, remaining_days, zone = compute_wear(
-            part.useful_life_days,
-            installation_date,
-            replacement_date,
-            part.qty_in_stock,
-            part.lead_time_days
-        )
-
-        wear_percentage = percentage * 100
-
-        # Рассчитываем потребность: количество запчастей на единицу * количество единиц оборудования
-        demand = part.qty_per_unit * (equipment.available_units if equipment else 1)
-
-        wear_data.append({
-            'Запчасть': part.name,
-            'Оборудование': equipment_name,
-            'Осталось дней': int(remaining_days),
-            'Осталось %': f"{wear_percentage:.1f}%",
-            'Осталось % (число)': wear_percentage,
-            'Зона': zone,
-            'Дата установки': installation_date,
-            'На складе': part.qty_in_stock,
-            'Потребность': demand,
-            'ID запчасти': part.id
-        })
-
-        # Агрегат: wear % по детали
-        wear_percentage_data.append({
-            'Запчасть': part.name,
-            'Запас прочности %': wear_percentage,
-            'Зона': zone
-        })
-
-        # Агрегат: красные зоны по оборудованию
-        if zone == 'red':
-            equipment_red_zone_data.append({
-                'Оборудование': equipment_name,
-                'Запчасть': part.name
-            })
-
-        # Данные для графика износа по времени
-        if installation_date != 'N/A':
-            # Генерируем точки для графика износа (каждую неделю)
-            days_since_install = (date.today() - installation_date).days
-            for week in range(0, min(days_since_install + 7, part.useful_life_days + 7), 7):
-                check_date = installation_date + timedelta(days=week)
-                if check_date <= date.today():
-                    used_days = (check_date - installation_date).days
-                    remaining = part.useful_life_days - used_days
-                    # Не допускаем отрицательных процентов
-                    if part.useful_life_days > 0:
-                        wear_pct = max(0, (remaining / part.useful_life_days * 100))
-                    else:
-                        wear_pct = 0
-
-                    wear_timeline_data.append({
-                        'Дата': check_date,
-                        'Оборудование': equipment_name,
-                        'Запчасть': part.name,
-                        'Запас прочности %': wear_pct
-                    })
-
-        if zone == "green":
-            green_count += 1
-        elif zone == "yellow":
-            yellow_count += 1
-        else:
-            red_count += 1
-    else:
-        # Если нет активных замен, считаем что запчасть новая или не установлена
-        wear_data.append({
-            'Запчасть': part.name,
-            'Оборудование': 'Не установлена',
-            'Осталось дней': part.useful_life_days,
-            'Осталось %': '100.0%',
-            'Осталось % (число)': 100.0,
-            'Зона': 'green',
-            'Дата установки': 'N/A',
-            'На складе': part.qty_in_stock,
-            'Потребность': 0,
-            'ID запчасти': part.id
-        })
-        green_count += 1
-
-# Метрики
-col1, col2, col3, col4 = st.columns(4)
+col1, col2, col3, col4, col5 = st.columns(5)
 
 with col1:
-    st.metric("Всего запчастей", len(parts))
+    st.metric("Всего запчастей", total_parts)
 
 with col2:
-    st.metric("Зеленая зона", green_count, delta=None)
+    st.metric("Зеленая зона", zone_totals["green"], delta=None)
 
 with col3:
-    st.metric("Желтая зона", yellow_count, delta=None)
+    st.metric("Желтая зона", zone_totals["yellow"], delta=None)
 
 with col4:
-    st.metric("Красная зона", red_count, delta=None)
+    st.metric("Красная зона", zone_totals["red"], delta=None)
+
+with col5:
+    st.metric("Станут желтыми за 14 дней", cached("zones", "turning", "yellow", as_of, days=14), delta=None)
 
 st.divider()
 
-# Графики
-if wear_data:
-    df = pd.DataFrame(wear_data)
-    df_wear_pct = pd.DataFrame(wear_percentage_data) if wear_percentage_data else pd.DataFrame()
-    df_red_zones = pd.DataFrame(equipment_red_zone_data) if equipment_red_zone_data else pd.DataFrame()
-    df_timeline = pd.DataFrame(wear_timeline_data) if wear_timeline_data else pd.DataFrame()
 
-    # ========== 1. BAR CHART: Количество деталей по зоне ==========
+def wear_frames(as_of):
+    """Кадры графиков и таблиц по состоянию износа каждой запчасти на дату as_of."""
+    wear_data = []
+    wear_percentage_data = []  # Для агрегации wear % по деталям
+    equipment_red_zone_data = []  # Для агрегации красных зон по оборудованию
+
+    for row in cached("dashboard", "wear_rows", as_of):
+        zone = row['zone']
+
+        if row['installation_date'] is not None:
+            installation_date = row['installation_date']
+            equipment_name = row['equipment_name'] or 'N/A'
+            wear_percentage = row['percentage_left'] * 100
+
+            wear_data.append({
+                'Запчасть': row['part_name'],
+                'Оборудование': equipment_name,
+                'Осталось дней': row['remaining_days'],
+                'Осталось % (число)': wear_percentage,
+                'Зона': zone,
+                'Дата установки': installation_date,
+                'На складе': row['qty_in_stock'],
+                'Потребность': row['demand'],
+                'ID запчасти': row['part_id']
+            })
+
+            # Агрегат: wear % по детали
+            wear_percentage_data.append({
+                'Запчасть': row['part_name'],
+                'Запас прочности %': wear_percentage,
+                'Зона': zone
+            })
+
+            # Агрегат: красные зоны по оборудованию
+            if zone == 'red':
+                equipment_red_zone_data.append({
+                    'Оборудование': equipment_name,
+                    'Запчасть': row['part_name']
+                })
+        else:
+            # Если нет активных замен, считаем что запчасть новая или не установлена
+            wear_data.append({
+                'Запчасть': row['part_name'],
+                'Оборудование': 'Не установлена',
+                'Осталось дней': row['remaining_days'],
+                'Осталось % (число)': 100.0,
+                'Зона': zone,
+                'Дата установки': None,
+                'На складе': row['qty_in_stock'],
+                'Потребность': 0,
+                'ID запчасти': row['part_id']
+            })
+
+    return pd.DataFrame(wear_data), pd.DataFrame(wear_percentage_data), pd.DataFrame(equipment_red_zone_data)
+
+
+# ========== 1. BAR CHART: Количество деталей по зоне ==========
+@st.fragment
+def zone_chart(df):
     st.subheader("График 1: Количество деталей по зоне износа")
 
     fig1, ax1 = plt.subplots(figsize=(10, 6))
@@ -181,10 +141,25 @@ if wear_data:
     st.pyplot(fig1)
     plt.close(fig1)
 
-    st.divider()
 
-    # ========== 2. LINE CHART: Износ по времени по оборудованию ==========
+# ========== 2. LINE CHART: Износ по времени по оборудованию ==========
+@st.fragment
+def trend_chart(as_of):
     st.subheader("График 2: Износ по времени по оборудованию")
+    trend_days = st.selectbox(
+        "Период", options=TREND_PERIODS, index=len(TREND_PERIODS) - 1,
+        format_func=lambda days: f"{days} дней", key="dashboard_trend_days"
+    )
+
+    # Динамика износа - из ежедневных снимков (недостающие дни дописываются раз в день)
+    catch_up_wear_snapshots(date.today())
+    trend_end = min(as_of, date.today())
+    trend = cached("wear_snapshots", "trend", trend_end - timedelta(days=trend_days), trend_end, step_days=7)
+    df_timeline = pd.DataFrame({
+        'Дата': trend['snapshot_date'],
+        'Оборудование': trend['equipment_name'],
+        'Запас прочности %': trend['mean_percentage_left'] * 100,
+    })
 
     if not df_timeline.empty:
         fig2, ax2 = plt.subplots(figsize=(12, 6))
@@ -225,9 +200,10 @@ if wear_data:
     else:
         st.info("Нет данных для графика износа по времени. Добавьте установленные запчасти.")
 
-    st.divider()
 
-    # ========== 3. STACKED BAR CHART: Склад/Потребность ==========
+# ========== 3. STACKED BAR CHART: Склад/Потребность ==========
+@st.fragment
+def stock_chart(df):
     st.subheader("График 3: Наличие на складе vs Потребность")
 
     # Подготовка данных для stacked chart
@@ -287,9 +263,10 @@ if wear_data:
     else:
         st.info("Нет данных для графика склад/потребность.")
 
-    st.divider()
 
-    # ========== Дополнительные агрегаты ==========
+# ========== Дополнительные агрегаты ==========
+@st.fragment
+def aggregates(df_wear_pct, df_red_zones):
     st.subheader("Агрегированные данные")
 
     col1, col2 = st.columns(2)
@@ -297,9 +274,14 @@ if wear_data:
     with col1:
         st.write("**Запас прочности % по каждой детали:**")
         if not df_wear_pct.empty:
-            display_wear = df_wear_pct[['Запчасть', 'Запас прочности %', 'Зона']].copy()
-            display_wear = display_wear.sort_values('Запас прочности %')
-            st.dataframe(display_wear, use_container_width=True, hide_index=True)
+            display_wear = df_wear_pct[['Запчасть', 'Запас прочности %', 'Зона']].sort_values('Запас прочности %')
+            paged_table(
+                pa.Table.from_pandas(display_wear, preserve_index=False),
+                key="dashboard_wear_pct",
+                styles={'Зона': zone_style},
+                column_config={'Запас прочности %': st.column_config.NumberColumn(format="%.1f")},
+                page_size=25,
+            )
         else:
             st.info("Нет данных")
 
@@ -313,23 +295,55 @@ if wear_data:
         else:
             st.info("Нет критичных деталей")
 
-    st.divider()
 
-    # Таблица с данными
+# Колонки таблицы "Детальная информация по запчастям"
+DETAIL_COLUMNS = {
+    'Запчасть': 'Запчасть',
+    'Оборудование': 'Оборудование',
+    'Осталось дней': 'Осталось дней',
+    'Осталось % (число)': 'Осталось %',
+    'Зона': 'Зона',
+    'Дата установки': 'Дата установки',
+    'На складе': 'На складе',
+}
+
+
+# Таблица с данными: pyarrow.Table, страницы и сортировка - на сервере
+@st.fragment
+def detail_table(wear):
     st.subheader("Детальная информация по запчастям")
 
-    # Цветовая индикация
-    def color_zone(val):
-        if val == 'green':
-            return 'background-color: #90EE90'
-        elif val == 'yellow':
-            return 'background-color: #FFD700'
-        elif val == 'red':
-            return 'background-color: #FF6B6B'
-        return ''
-
-    display_df = df[['Запчасть', 'Оборудование', 'Осталось дней', 'Осталось %', 'Зона', 'Дата установки', 'На складе']].copy()
-    styled_df = display_df.style.applymap(color_zone, subset=['Зона'])
-    st.dataframe(styled_df, use_container_width=True, hide_index=True)
-else:
-    st.info("Нет данных для графиков")
+    shown_zones = st.multiselect(
+        "Зоны", options=['green', 'yellow', 'red'], default=['green', 'yellow', 'red'], key="dashboard_detail_zones"
+    )
+    paged_table(
+        wear.filter(pc.is_in(wear['Зона'], value_set=pa.array(shown_zones, type=pa.string()))),
+        key="dashboard_detail",
+        columns=DETAIL_COLUMNS,
+        styles={'Зона': zone_style},
+        column_config={'Осталось %': st.column_config.NumberColumn(format="%.1f%%")},
+    )
+
+
+# Графики и таблицы выводятся по очереди: каждый появляется, как только готов
+with span("износ: DataFrame"):
+    df, df_wear_pct, df_red_zones = wear_frames(as_of)
+with span("износ: pyarrow.Table"):
+    wear = pa.Table.from_pandas(df[list(DETAIL_COLUMNS)], preserve_index=False)
+
+with span("график зон (matplotlib)"):
+    zone_chart(df)
+st.divider()
+with span("график динамики (matplotlib)"):
+    trend_chart(as_of)
+st.divider()
+with span("график склада (matplotlib)"):
+    stock_chart(df)
+st.divider()
+with span("агрегаты"):
+    aggregates(df_wear_pct, df_red_zones)
+st.divider()
+with span("детальная таблица"):
+    detail_table(wear)
+
+finish_profile()
@@ -1,46 +1,76 @@
 import streamlit as st
 import pandas as pd
-from core.utils import get_services
+from datetime import date
+from core.stock import InsufficientStockError
+from core.retire import ReferencedError
+from core.services import ConflictError
+from core.utils import catch_up_lifetime_stats, edit_version, get_services, prefetch, reset_edit_version
+from core.widgets import search_select
 
 st.set_page_config(page_title="Запчасти", layout="wide")
 st.title("Управление запчастями")
 
 services = get_services()
 
-# Получаем список оборудования для выбора
-equipment_list = services.equipment.list()
+# Независимые запросы страницы выполняются одновременно
+data = prefetch(
+    suppliers=lambda s: s.suppliers.list(),
+    equipment_count=lambda s: s.equipment.count(),
+    parts=lambda s: s.parts.list_rows(),
+)
 
-if not equipment_list:
+# Поставщик задаёт календарь закупки; None - закупка 10 и 25 числа
+supplier_options = [None, *data["suppliers"]]
+
+
+def supplier_label(supplier):
+    return "Без поставщика (10 и 25 число)" if supplier is None else f"{supplier.name} ({supplier.purchase_days})"
+
+if not data["equipment_count"]:
     st.warning("Сначала добавьте оборудование, чтобы создавать запчасти.")
     st.stop()
 
-# Создание словаря для быстрого поиска
-equipment_dict = {eq.id: eq.name for eq in equipment_list}
-
 # Вкладки
-tab1, tab2, tab3 = st.tabs(["Список запчастей", "Добавить запчасть", "Редактировать запчасть"])
+tab1, tab2, tab3, tab4 = st.tabs(["Список запчастей", "Добавить запчасть", "Редактировать запчасть", "Склад"])
 
 with tab1:
     st.subheader("Список всех запчастей")
-    parts = services.parts.list()
+    # Строки только для чтения, название оборудования - из join
+    parts = data["parts"]
 
     if parts:
+        # Фактический срок службы по журналу замен (пересчёт - jobs.py lifetime-stats,
+        # при отрисовке не чаще раза в день)
+        catch_up_lifetime_stats(date.today())
+        lifetime_stats = services.lifetime_stats.get("part")
+
         # Формируем данные для таблицы
         parts_data = []
         for part in parts:
-            equipment_name = equipment_dict.get(part.parent_equipment_id, "Неизвестно")
+            stat = lifetime_stats.get(part.id)
+            empirical_days = None
+            if stat:
+                empirical_days = stat.km_median_days or stat.weibull_mean_days
             parts_data.append({
                 'ID': part.id,
                 'Наименование': part.name,
-                'Оборудование': equipment_name,
+                'Оборудование': part.equipment_name,
                 'Срок службы (дней)': part.useful_life_days,
+                'Факт. срок службы (дней)': round(empirical_days) if empirical_days else None,
+                'Отклонение от нормы %': round((empirical_days / part.useful_life_days - 1) * 100, 1) if empirical_days else None,
+                'Отказов / в работе': f"{stat.n_failures} / {stat.n_censored}" if stat else "-",
                 'Кол-во в единице': part.qty_per_unit,
                 'На складе': part.qty_in_stock,
-                'Срок закупки (дней)': part.lead_time_days
+                'Срок закупки (дней)': part.lead_time_days,
+                'Выведено': part.retired_at
             })
 
         df = pd.DataFrame(parts_data)
         st.dataframe(df, use_container_width=True, hide_index=True)
+        st.caption(
+            "Факт. срок службы - медиана по Каплану-Мейеру с учётом ещё работающих запчастей "
+            "(или среднее распределения Вейбулла, если медиана ещё не достигнута)."
+        )
 
         # Статистика
         col1, col2, col3 = st.columns(3)
@@ -58,17 +88,14 @@ with tab1:
 with tab2:
     st.subheader("Добавить новую запчасть")
 
+    # Поиск по справочнику перезапускает страницу, поэтому поле выбора - вне формы
+    equipment = search_select("Родительское оборудование *", services.equipment, key="new_equipment")
+
     with st.form("add_part_form", clear_on_submit=True):
         name = st.text_input("Наименование запчасти *", max_chars=50)
 
         col1, col2 = st.columns(2)
         with col1:
-            equipment_id = st.selectbox(
-                "Родительское оборудование *",
-                options=equipment_list,
-                format_func=lambda x: x.name,
-                key="new_equipment"
-            )
             useful_life_days = st.number_input(
                 "Срок полезного использования (дней) *",
                 min_value=1,
@@ -95,21 +122,30 @@ with tab2:
                 value=2,
                 step=1
             )
+            supplier = st.selectbox(
+                "Поставщик",
+                options=supplier_options,
+                format_func=supplier_label,
+                key="new_supplier"
+            )
 
         submitted = st.form_submit_button("Добавить запчасть", type="primary")
 
         if submitted:
             if not name:
                 st.error("Пожалуйста, заполните наименование запчасти")
+            elif equipment is None:
+                st.error("Выберите родительское оборудование")
             else:
                 try:
                     new_part = services.parts.create(
                         name=name,
-                        parent_equipment_id=equipment_id.id,
+                        parent_equipment_id=equipment.id,
                         useful_life_days=useful_life_days,
                         qty_per_unit=qty_per_unit,
                         qty_in_stock=qty_in_stock,
-                        lead_time_days=lead_time_days
+                        lead_time_days=lead_time_days,
+                        supplier_id=supplier.id if supplier else None
                     )
                     st.success(f"Запчасть '{name}' успешно добавлена!")
                     st.rerun()
@@ -119,28 +155,29 @@ with tab2:
 with tab3:
     st.subheader("Редактировать запчасть")
 
-    parts = services.parts.list()
-    if not parts:
+    if not data["parts"]:
         st.info("Нет запчастей для редактирования.")
     else:
-        selected_part = st.selectbox(
-            "Выберите запчасть для редактирования",
-            options=parts,
-            format_func=lambda p: f"{p.name} (ID: {p.id})"
+        selected_option = search_select(
+            "Выберите запчасть для редактирования", services.parts, key="edit_part", include_retired=True
         )
+        selected_part = services.parts.get(selected_option.id) if selected_option else None
 
         if selected_part:
+            selected_part_version = edit_version("part", selected_part)
+            if selected_part.retired_at:
+                st.info(f"Запчасть выведена из эксплуатации {selected_part.retired_at:%d.%m.%Y}")
+            equipment = search_select(
+                "Родительское оборудование *",
+                services.equipment,
+                key=f"part_equipment_{selected_part.id}",
+                selected_id=selected_part.parent_equipment_id
+            )
             with st.form("edit_part_form"):
                 name = st.text_input("Наименование запчасти *", value=selected_part.name, max_chars=50)
 
                 col1, col2 = st.columns(2)
                 with col1:
-                    equipment_id = st.selectbox(
-                        "Родительское оборудование *",
-                        options=equipment_list,
-                        format_func=lambda x: x.name,
-                        index=[eq.id for eq in equipment_list].index(selected_part.parent_equipment_id) if selected_part.parent_equipment_id in [eq.id for eq in equipment_list] else 0
-                    )
                     useful_life_days = st.number_input(
                         "Срок полезного использования (дней) *",
                         min_value=1,
@@ -155,48 +192,146 @@ with tab3:
                     )
 
                 with col2:
-                    qty_in_stock = st.number_input(
-                        "Количество на складе *",
-                        min_value=0,
-                        value=selected_part.qty_in_stock,
-                        step=1
-                    )
+                    # Остаток меняется движениями на вкладке "Склад"
+                    st.text_input("Количество на складе", value=str(selected_part.qty_in_stock), disabled=True)
                     lead_time_days = st.number_input(
                         "Срок закупки запчасти (дней) *",
                         min_value=0,
                         value=selected_part.lead_time_days,
                         step=1
                     )
+                    supplier_ids = [supplier.id if supplier else None for supplier in supplier_options]
+                    supplier = st.selectbox(
+                        "Поставщик",
+                        options=supplier_options,
+                        format_func=supplier_label,
+                        index=supplier_ids.index(selected_part.supplier_id) if selected_part.supplier_id in supplier_ids else 0
+                    )
 
-                col1, col2 = st.columns(2)
+                with_history = st.checkbox(
+                    "Удалить вместе с историей замен",
+                    help="Без отметки запчасть, по которой есть замены, не удаляется"
+                )
+
+                col1, col2, col3 = st.columns(3)
                 with col1:
                     submitted = st.form_submit_button("Сохранить изменения", type="primary")
                 with col2:
+                    retire_clicked = st.form_submit_button(
+                        "Вывести из эксплуатации", disabled=selected_part.retired_at is not None,
+                        help="Запчасть уходит из износа и плана закупок, история сохраняется"
+                    )
+                with col3:
                     delete_clicked = st.form_submit_button("Удалить запчасть", type="secondary")
 
                 if submitted:
                     if not name:
                         st.error("Пожалуйста, заполните наименование запчасти")
+                    elif equipment is None:
+                        st.error("Выберите родительское оборудование")
                     else:
                         try:
                             services.parts.update(
                                 selected_part.id,
+                                expected_version=selected_part_version,
                                 name=name,
-                                parent_equipment_id=equipment_id.id,
+                                parent_equipment_id=equipment.id,
                                 useful_life_days=useful_life_days,
                                 qty_per_unit=qty_per_unit,
-                                qty_in_stock=qty_in_stock,
-                                lead_time_days=lead_time_days
+                                lead_time_days=lead_time_days,
+                                supplier_id=supplier.id if supplier else None
                             )
+                            reset_edit_version("part", selected_part.id)
                             st.success(f"Запчасть '{name}' успешно обновлена!")
                             st.rerun()
+                        except ConflictError as e:
+                            reset_edit_version("part", selected_part.id)
+                            st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                         except Exception as e:
                             st.error(f"Ошибка при обновлении запчасти: {str(e)}")
 
+                if retire_clicked:
+                    try:
+                        services.parts.retire(selected_part.id, expected_version=selected_part_version)
+                        reset_edit_version("part", selected_part.id)
+                        st.success(f"Запчасть '{selected_part.name}' выведена из эксплуатации")
+                        st.rerun()
+                    except ConflictError as e:
+                        reset_edit_version("part", selected_part.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
+                    except Exception as e:
+                        st.error(f"Ошибка при выводе запчасти из эксплуатации: {str(e)}")
+
                 if delete_clicked:
+                    # id и название удалённой записи - из варианта выбора
                     try:
-                        services.parts.delete(selected_part.id)
-                        st.success(f"Запчасть '{selected_part.name}' успешно удалена!")
+                        services.parts.delete(
+                            selected_part.id, expected_version=selected_part_version, with_history=with_history
+                        )
+                        reset_edit_version("part", selected_option.id)
+                        st.success(f"Запчасть '{selected_option.name}' успешно удалена!")
                         st.rerun()
+                    except ReferencedError as e:
+                        st.error(f"{e}. Выведите запчасть из эксплуатации или удалите её вместе с историей.")
+                    except ConflictError as e:
+                        reset_edit_version("part", selected_part.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                     except Exception as e:
                         st.error(f"Ошибка при удалении запчасти: {str(e)}")
+
+with tab4:
+    st.subheader("Движения склада")
+    st.caption(
+        "Остаток меняется приходом, списанием или корректировкой; одновременные движения "
+        "разных пользователей не теряются. Списание на установку выполняется при добавлении замены."
+    )
+
+    stock_part = None
+    if not data["parts"]:
+        st.info("Нет запчастей.")
+    else:
+        stock_part = search_select("Запчасть", services.parts, key="stock_part")
+    if stock_part:
+        st.metric("На складе", services.parts.get(stock_part.id).qty_in_stock)
+
+        movement_kinds = {"receipt": "Приход", "issue": "Списание", "adjustment": "Корректировка (инвентаризация)"}
+        with st.form("stock_movement_form", clear_on_submit=True):
+            col1, col2 = st.columns(2)
+            with col1:
+                kind = st.selectbox("Вид движения", options=list(movement_kinds), format_func=movement_kinds.get)
+                qty = st.number_input("Количество (для корректировки - фактический остаток)", min_value=0, value=1, step=1)
+            with col2:
+                movement_date = st.date_input("Дата движения", value=date.today())
+                comment = st.text_input("Комментарий", max_chars=200)
+            if st.form_submit_button("Провести", type="primary"):
+                try:
+                    if kind == "receipt":
+                        services.writes.stock.receive(stock_part.id, int(qty), movement_date=movement_date, comment=comment or None).result()
+                    elif kind == "issue":
+                        services.writes.stock.issue(stock_part.id, int(qty), movement_date=movement_date, comment=comment or None).result()
+                    else:
+                        services.writes.stock.set_balance(stock_part.id, int(qty), movement_date=movement_date, comment=comment or None).result()
+                        # Инвентаризация меняет версию карточки: форма редактирования перечитает её
+                        reset_edit_version("part", stock_part.id)
+                    st.success("Движение проведено")
+                    st.rerun()
+                except (InsufficientStockError, ValueError) as e:
+                    st.error(str(e))
+
+        as_of = st.date_input("Остаток на дату", value=date.today(), key="stock_as_of")
+        st.write(f"Остаток на конец {as_of}: **{services.stock.as_of(as_of, part_ids=[stock_part.id]).get(stock_part.id, 0)}**")
+
+        movements = services.stock.movements(stock_part.id, limit=100)
+        if movements:
+            st.dataframe(
+                pd.DataFrame([{
+                    'Дата': m.movement_date,
+                    'Вид': movement_kinds.get(m.kind, m.kind),
+                    'Количество': m.qty,
+                    'Остаток после': m.balance_after,
+                    'Установка': m.replacement_id,
+                    'Комментарий': m.comment,
+                } for m in movements]),
+                use_container_width=True,
+                hide_index=True
+            )
@@ -1,32 +1,39 @@
 import streamlit as st
 import pandas as pd
-from core.utils import get_services
+from core.retire import ReferencedError
+from core.services import ConflictError
+from core.utils import edit_version, get_services, prefetch, reset_edit_version
+from core.widgets import search_select
 
 st.set_page_config(page_title="Оборудование", layout="wide")
 st.title("Управление оборудованием")
 
 services = get_services()
 
+# Независимые запросы страницы выполняются одновременно
+data = prefetch(
+    equipment=lambda s: s.equipment.list_rows(),
+    parts_count=lambda s: s.parts.count(),
+)
+
 # Вкладки
 tab1, tab2, tab3 = st.tabs(["Список оборудования", "Добавить оборудование", "Редактировать оборудование"])
 
 with tab1:
     st.subheader("Список всего оборудования")
-    equipment_list = services.equipment.list()
+    # Строки только для чтения, количество запчастей считается в том же запросе
+    equipment_list = data["equipment"]
 
     if equipment_list:
         # Формируем данные для таблицы
         equipment_data = []
         for eq in equipment_list:
-            # Подсчитываем количество запчастей для этого оборудования
-            parts = services.parts.list()
-            parts_count = len([p for p in parts if p.parent_equipment_id == eq.id])
-
             equipment_data.append({
                 'ID': eq.id,
                 'Наименование': eq.name,
                 'Количество в парке': eq.available_units,
-                'Количество запчастей': parts_count
+                'Количество запчастей': eq.part_count,
+                'Выведено': eq.retired_at
             })
 
         df = pd.DataFrame(equipment_data)
@@ -40,8 +47,7 @@ with tab1:
             total_units = sum(eq.available_units for eq in equipment_list)
             st.metric("Всего единиц в парке", total_units)
         with col3:
-            parts = services.parts.list()
-            st.metric("Всего запчастей", len(parts))
+            st.metric("Всего запчастей", data["parts_count"])
     else:
         st.info("Нет оборудования. Добавьте первое оборудование во вкладке 'Добавить оборудование'.")
 
@@ -76,17 +82,18 @@ with tab2:
 with tab3:
     st.subheader("Редактировать оборудование")
 
-    equipment_list = services.equipment.list()
-    if not equipment_list:
+    if not data["equipment"]:
         st.info("Нет оборудования для редактирования.")
     else:
-        selected_equipment = st.selectbox(
-            "Выберите оборудование для редактирования",
-            options=equipment_list,
-            format_func=lambda e: f"{e.name} (ID: {e.id})"
+        selected_option = search_select(
+            "Выберите оборудование для редактирования", services.equipment, key="edit_equipment", include_retired=True
         )
+        selected_equipment = services.equipment.get(selected_option.id) if selected_option else None
 
         if selected_equipment:
+            selected_equipment_version = edit_version("equipment", selected_equipment)
+            if selected_equipment.retired_at:
+                st.info(f"Оборудование выведено из эксплуатации {selected_equipment.retired_at:%d.%m.%Y}")
             with st.form("edit_equipment_form"):
                 name = st.text_input("Наименование оборудования *", value=selected_equipment.name, max_chars=30)
                 available_units = st.number_input(
@@ -96,10 +103,20 @@ with tab3:
                     step=1
                 )
 
-                col1, col2 = st.columns(2)
+                with_history = st.checkbox(
+                    "Удалить вместе с историей замен",
+                    help="Без отметки оборудование, по запчастям которого есть замены, не удаляется"
+                )
+
+                col1, col2, col3 = st.columns(3)
                 with col1:
                     submitted = st.form_submit_button("Сохранить изменения", type="primary")
                 with col2:
+                    retire_clicked = st.form_submit_button(
+                        "Вывести из эксплуатации", disabled=selected_equipment.retired_at is not None,
+                        help="Оборудование и его запчасти уходят из износа и плана закупок, история сохраняется"
+                    )
+                with col3:
                     delete_clicked = st.form_submit_button("Удалить оборудование", type="secondary")
 
                 if submitted:
@@ -109,25 +126,44 @@ with tab3:
                         try:
                             services.equipment.update(
                                 selected_equipment.id,
+                                expected_version=selected_equipment_version,
                                 name=name,
                                 available_units=available_units
                             )
+                            reset_edit_version("equipment", selected_equipment.id)
                             st.success(f"Оборудование '{name}' успешно обновлено!")
                             st.rerun()
+                        except ConflictError as e:
+                            reset_edit_version("equipment", selected_equipment.id)
+                            st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                         except Exception as e:
                             st.error(f"Ошибка при обновлении оборудования: {str(e)}")
 
-                if delete_clicked:
-                    # Проверяем, есть ли запчасти, связанные с этим оборудованием
-                    parts = services.parts.list()
-                    related_parts = [p for p in parts if p.parent_equipment_id == selected_equipment.id]
+                if retire_clicked:
+                    try:
+                        services.equipment.retire(selected_equipment.id, expected_version=selected_equipment_version)
+                        reset_edit_version("equipment", selected_equipment.id)
+                        st.success(f"Оборудование '{selected_equipment.name}' выведено из эксплуатации")
+                        st.rerun()
+                    except ConflictError as e:
+                        reset_edit_version("equipment", selected_equipment.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
+                    except Exception as e:
+                        st.error(f"Ошибка при выводе оборудования из эксплуатации: {str(e)}")
 
-                    if related_parts:
-                        st.error(f"Нельзя удалить оборудование, так как с ним связано {len(related_parts)} запчастей. Сначала удалите или измените запчасти.")
-                    else:
-                        try:
-                            services.equipment.delete(selected_equipment.id)
-                            st.success(f"Оборудование '{selected_equipment.name}' успешно удалено!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Ошибка при удалении оборудования: {str(e)}")
+                if delete_clicked:
+                    # Запчасти оборудования удаляются вместе с ним; id и название удалённой записи - из варианта выбора
+                    try:
+                        services.equipment.delete(
+                            selected_equipment.id, expected_version=selected_equipment_version, with_history=with_history
+                        )
+                        reset_edit_version("equipment", selected_option.id)
+                        st.success(f"Оборудование '{selected_option.name}' успешно удалено!")
+                        st.rerun()
+                    except ReferencedError as e:
+                        st.error(f"{e}. Выведите оборудование из эксплуатации или удалите его вместе с историей.")
+                    except ConflictError as e:
+                        reset_edit_version("equipment", selected_equipment.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
+                    except Exception as e:
+                        st.error(f"Ошибка при удалении оборудования: {str(e)}")
@@ -1,32 +1,36 @@
 import streamlit as st
 import pandas as pd
-from core.utils import get_services
+from core.retire import ReferencedError
+from core.services import ConflictError
+from core.utils import edit_version, get_services, prefetch, reset_edit_version
+from core.widgets import search_select
 
 st.set_page_config(page_title="Мастерские", layout="wide")
 st.title("Управление мастерскими")
 
 services = get_services()
 
+data = prefetch(workshops=lambda s: s.workshops.list_rows())
+
 # Вкладки
 tab1, tab2, tab3 = st.tabs(["Список мастерских", "Добавить мастерскую", "Редактировать мастерскую"])
 
 with tab1:
     st.subheader("Список всех мастерских")
-    workshops = services.workshops.list()
+    # Строки только для чтения, количество замен считается в том же запросе
+    workshops = data["workshops"]
 
     if workshops:
         # Формируем данные для таблицы
         workshops_data = []
         for workshop in workshops:
-            # Подсчитываем количество замен в этой мастерской
-            replacements = services.replacements.list()
-            replacements_count = len([r for r in replacements if r.workshop_id == workshop.id])
-
             workshops_data.append({
                 'ID': workshop.id,
                 'Наименование': workshop.name,
                 'Адрес': workshop.addr,
-                'Количество замен': replacements_count
+                'Замен в день': workshop.daily_capacity,
+                'Количество замен': workshop.replacement_count,
+                'Выведено': workshop.retired_at
             })
 
         df = pd.DataFrame(workshops_data)
@@ -37,7 +41,7 @@ with tab1:
         with col1:
             st.metric("Всего мастерских", len(workshops))
         with col2:
-            total_replacements = sum(len([r for r in services.replacements.list() if r.workshop_id == w.id]) for w in workshops)
+            total_replacements = sum(w.replacement_count for w in workshops)
             st.metric("Всего замен", total_replacements)
     else:
         st.info("Нет мастерских. Добавьте первую мастерскую во вкладке 'Добавить мастерскую'.")
@@ -48,6 +52,9 @@ with tab2:
     with st.form("add_workshop_form", clear_on_submit=True):
         name = st.text_input("Наименование мастерской *", max_chars=50)
         addr = st.text_input("Адрес мастерской *", max_chars=100)
+        daily_capacity = st.number_input(
+            "Замен в день", min_value=0, value=4, step=1, help="Мощность мастерской для расписания замен"
+        )
 
         submitted = st.form_submit_button("Добавить мастерскую", type="primary")
 
@@ -60,7 +67,8 @@ with tab2:
                 try:
                     new_workshop = services.workshops.create(
                         name=name,
-                        addr=addr
+                        addr=addr,
+                        daily_capacity=int(daily_capacity)
                     )
                     st.success(f"Мастерская '{name}' успешно добавлена!")
                     st.rerun()
@@ -70,25 +78,40 @@ with tab2:
 with tab3:
     st.subheader("Редактировать мастерскую")
 
-    workshops = services.workshops.list()
-    if not workshops:
+    if not data["workshops"]:
         st.info("Нет мастерских для редактирования.")
     else:
-        selected_workshop = st.selectbox(
-            "Выберите мастерскую для редактирования",
-            options=workshops,
-            format_func=lambda w: f"{w.name} - {w.addr} (ID: {w.id})"
+        selected_option = search_select(
+            "Выберите мастерскую для редактирования", services.workshops, key="edit_workshop", include_retired=True
         )
+        selected_workshop = services.workshops.get(selected_option.id) if selected_option else None
 
         if selected_workshop:
+            selected_workshop_version = edit_version("workshop", selected_workshop)
+            if selected_workshop.retired_at:
+                st.info(f"Мастерская выведена из эксплуатации {selected_workshop.retired_at:%d.%m.%Y}")
+            # Мастерская, на которую переносится история замен при удалении
+            reassign_to = search_select(
+                "Перенести историю замен при удалении на", services.workshops,
+                key=f"reassign_workshop_{selected_workshop.id}", none_label="Не переносить"
+            )
             with st.form("edit_workshop_form"):
                 name = st.text_input("Наименование мастерской *", value=selected_workshop.name, max_chars=50)
                 addr = st.text_input("Адрес мастерской *", value=selected_workshop.addr, max_chars=100)
+                daily_capacity = st.number_input(
+                    "Замен в день", min_value=0, value=selected_workshop.daily_capacity, step=1,
+                    help="Мощность мастерской для расписания замен"
+                )
 
-                col1, col2 = st.columns(2)
+                col1, col2, col3 = st.columns(3)
                 with col1:
                     submitted = st.form_submit_button("Сохранить изменения", type="primary")
                 with col2:
+                    retire_clicked = st.form_submit_button(
+                        "Вывести из эксплуатации", disabled=selected_workshop.retired_at is not None,
+                        help="Мастерская больше не предлагается при добавлении замен, история сохраняется"
+                    )
+                with col3:
                     delete_clicked = st.form_submit_button("Удалить мастерскую", type="secondary")
 
                 if submitted:
@@ -100,25 +123,46 @@ with tab3:
                         try:
                             services.workshops.update(
                                 selected_workshop.id,
+                                expected_version=selected_workshop_version,
                                 name=name,
-                                addr=addr
+                                addr=addr,
+                                daily_capacity=int(daily_capacity)
                             )
+                            reset_edit_version("workshop", selected_workshop.id)
                             st.success(f"Мастерская '{name}' успешно обновлена!")
                             st.rerun()
+                        except ConflictError as e:
+                            reset_edit_version("workshop", selected_workshop.id)
+                            st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                         except Exception as e:
                             st.error(f"Ошибка при обновлении мастерской: {str(e)}")
 
-                if delete_clicked:
-                    # Проверяем, есть ли замены, связанные с этой мастерской
-                    replacements = services.replacements.list()
-                    related_replacements = [r for r in replacements if r.workshop_id == selected_workshop.id]
+                if retire_clicked:
+                    try:
+                        services.workshops.retire(selected_workshop.id, expected_version=selected_workshop_version)
+                        reset_edit_version("workshop", selected_workshop.id)
+                        st.success(f"Мастерская '{selected_workshop.name}' выведена из эксплуатации")
+                        st.rerun()
+                    except ConflictError as e:
+                        reset_edit_version("workshop", selected_workshop.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
+                    except Exception as e:
+                        st.error(f"Ошибка при выводе мастерской из эксплуатации: {str(e)}")
 
-                    if related_replacements:
-                        st.error(f"Нельзя удалить мастерскую, так как с ней связано {len(related_replacements)} замен. Сначала удалите или измените замены.")
-                    else:
-                        try:
-                            services.workshops.delete(selected_workshop.id)
-                            st.success(f"Мастерская '{selected_workshop.name}' успешно удалена!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Ошибка при удалении мастерской: {str(e)}")
+                if delete_clicked:
+                    # id и название удалённой записи - из варианта выбора
+                    try:
+                        services.workshops.delete(
+                            selected_workshop.id, expected_version=selected_workshop_version,
+                            reassign_to=reassign_to.id if reassign_to else None
+                        )
+                        reset_edit_version("workshop", selected_option.id)
+                        st.success(f"Мастерская '{selected_option.name}' успешно удалена!")
+                        st.rerun()
+                    except ReferencedError as e:
+                        st.error(f"{e}. Выведите мастерскую из эксплуатации или перенесите историю на другую мастерскую.")
+                    except ConflictError as e:
+                        reset_edit_version("workshop", selected_workshop.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
+                    except Exception as e:
+                        st.error(f"Ошибка при удалении мастерской: {str(e)}")
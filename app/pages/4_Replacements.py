@@ -1,24 +1,33 @@
 import streamlit as st
 import pandas as pd
 from datetime import date
-from core.utils import get_services
+from core.services import ConflictError
+from core.utils import edit_version, get_services, prefetch, reset_edit_version
+from core.widgets import search_select
 
 st.set_page_config(page_title="Журнал замен", layout="wide")
 st.title("Журнал замен запчастей")
 
 services = get_services()
 
-# Получаем справочники
-parts = services.parts.list()
-equipment_list = services.equipment.list()
-workshops = services.workshops.list()
-replacement_types = services.replacement_types.list()
+# Запчасти, оборудование и мастерские выбираются поиском (core/widgets.py), целиком
+# загружается только короткий справочник типов замен. Независимые запросы страницы
+# выполняются одновременно
+data = prefetch(
+    replacement_types=lambda s: s.replacement_types.list(),
+    parts_count=lambda s: s.parts.count(),
+    equipment_count=lambda s: s.equipment.count(),
+    workshops_count=lambda s: s.workshops.count(),
+    replacement_rows=lambda s: s.replacements.list_rows(),
+    open_replacements=lambda s: s.replacements.list_rows(replacement_date=None),
+)
+replacement_types = data["replacement_types"]
 
-if not parts:
+if not data["parts_count"]:
     st.warning("Сначала добавьте запчасти.")
     st.stop()
 
-if not equipment_list:
+if not data["equipment_count"]:
     st.warning("Сначала добавьте оборудование.")
     st.stop()
 
@@ -27,7 +36,7 @@ if not replacement_types:
     st.stop()
 
 # Если нет мастерских, показываем форму для создания
-if not workshops:
+if not data["workshops_count"]:
     st.warning("Нет мастерских. Создайте первую мастерскую:")
     with st.form("create_first_workshop", clear_on_submit=True):
         name = st.text_input("Название мастерской *", max_chars=50)
@@ -45,30 +54,22 @@ if not workshops:
                 st.error("Заполните все поля")
     st.stop()
 
-# Создаем словари для быстрого поиска
-parts_dict = {p.id: p.name for p in parts}
-equipment_dict = {eq.id: eq.name for eq in equipment_list}
-workshops_dict = {w.id: w.name for w in workshops}
-types_dict = {t.id: t.name.value for t in replacement_types}
-
 # Вкладки
-tab1, tab2, tab3 = st.tabs(["История замен", "Добавить замену", "Редактировать замену"])
+tab1, tab2, tab3, tab4 = st.tabs(["История замен", "Добавить замену", "Редактировать замену", "Закрыть несколько"])
 
 with tab1:
     st.subheader("История замен")
 
     # Фильтр по оборудованию
-    filter_equipment = st.selectbox(
+    filter_equipment = search_select(
         "Фильтр по оборудованию",
-        options=[None] + equipment_list,
-        format_func=lambda x: "Все оборудование" if x is None else x.name
+        services.equipment,
+        key="filter_equipment",
+        none_label="Все оборудование"
     )
 
-    # Получаем замены
-    if filter_equipment:
-        replacements = services.replacements.get_by_equipment(filter_equipment.id)
-    else:
-        replacements = services.replacements.list()
+    # Получаем замены (строки только для чтения, названия - из join)
+    replacements = services.replacements.history_rows(filter_equipment.id if filter_equipment else None)
 
     if replacements:
         # Формируем данные для таблицы
@@ -76,11 +77,11 @@ with tab1:
         for rep in replacements:
             replacements_data.append({
                 'ID': rep.id,
-                'Запчасть': parts_dict.get(rep.part_id, "Неизвестно"),
-                'Оборудование': equipment_dict.get(rep.equipment_id, "Неизвестно"),
+                'Запчасть': rep.part_name,
+                'Оборудование': rep.equipment_name,
                 'Серийный номер': rep.unit_serial_number,
-                'Мастерская': workshops_dict.get(rep.workshop_id, "Неизвестно"),
-                'Тип замены': types_dict.get(rep.replacement_type_id, "Неизвестно"),
+                'Мастерская': rep.workshop_name,
+                'Тип замены': rep.type_name,
                 'Дата установки': rep.installation_date,
                 'Дата замены': rep.replacement_date if rep.replacement_date else "Не заменена",
                 'Комментарий': rep.comments if rep.comments else "-"
@@ -105,26 +106,20 @@ with tab1:
 with tab2:
     st.subheader("Добавить новую замену")
 
+    # Поиск по справочникам перезапускает страницу, поэтому поля выбора - вне формы
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        selected_part = search_select("Запчасть *", services.parts, key="new_replacement_part")
+    with col2:
+        selected_equipment = search_select("Оборудование *", services.equipment, key="new_replacement_equipment")
+    with col3:
+        selected_workshop = search_select("Мастерская *", services.workshops, key="new_replacement_workshop")
+
     with st.form("add_replacement_form", clear_on_submit=True):
         col1, col2 = st.columns(2)
 
         with col1:
-            selected_part = st.selectbox(
-                "Запчасть *",
-                options=parts,
-                format_func=lambda p: f"{p.name} (ID: {p.id})"
-            )
-            selected_equipment = st.selectbox(
-                "Оборудование *",
-                options=equipment_list,
-                format_func=lambda e: f"{e.name} (ID: {e.id})"
-            )
             unit_serial_number = st.text_input("Серийный номер единицы оборудования *", max_chars=30)
-            selected_workshop = st.selectbox(
-                "Мастерская *",
-                options=workshops,
-                format_func=lambda w: f"{w.name} - {w.addr}"
-            )
 
         with col2:
             selected_type = st.selectbox(
@@ -141,17 +136,21 @@ with tab2:
                 value=None
             )
             comments = st.text_area("Комментарий", max_chars=200)
+            issue_stock = st.checkbox("Списать запчасть со склада", value=True)
 
         submitted = st.form_submit_button("Добавить замену", type="primary")
 
         if submitted:
             if not unit_serial_number:
                 st.error("Пожалуйста, заполните серийный номер")
+            elif selected_part is None or selected_equipment is None or selected_workshop is None:
+                st.error("Выберите запчасть, оборудование и мастерскую")
             elif replacement_date and replacement_date < installation_date:
                 st.error("Дата замены не может быть раньше даты установки")
             else:
                 try:
-                    new_replacement = services.replacements.create(
+                    new_replacement = services.replacements.install(
+                        issue_stock=issue_stock,
                         part_id=selected_part.id,
                         equipment_id=selected_equipment.id,
                         unit_serial_number=unit_serial_number,
@@ -169,44 +168,52 @@ with tab2:
 with tab3:
     st.subheader("Редактировать замену")
 
-    replacements = services.replacements.list()
-    if not replacements:
+    replacement_rows = data["replacement_rows"]
+    if not replacement_rows:
         st.info("Нет записей для редактирования.")
     else:
-        selected_replacement = st.selectbox(
+        selected_row = st.selectbox(
             "Выберите замену для редактирования",
-            options=replacements,
-            format_func=lambda r: f"{parts_dict.get(r.part_id, 'N/A')} - {equipment_dict.get(r.equipment_id, 'N/A')} ({r.installation_date})"
+            options=replacement_rows,
+            format_func=lambda r: f"{r.part_name} - {r.equipment_name} ({r.installation_date})"
         )
+        # Для формы редактирования нужна сама запись
+        selected_replacement = services.replacements.get(selected_row.id) if selected_row else None
 
         if selected_replacement:
+            selected_replacement_version = edit_version("replacement", selected_replacement)
+            # Текущие значения находятся по id, остальные варианты - поиском
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                selected_part = search_select(
+                    "Запчасть *",
+                    services.parts,
+                    key=f"replacement_part_{selected_replacement.id}",
+                    selected_id=selected_replacement.part_id
+                )
+            with col2:
+                selected_equipment = search_select(
+                    "Оборудование *",
+                    services.equipment,
+                    key=f"replacement_equipment_{selected_replacement.id}",
+                    selected_id=selected_replacement.equipment_id
+                )
+            with col3:
+                selected_workshop = search_select(
+                    "Мастерская *",
+                    services.workshops,
+                    key=f"replacement_workshop_{selected_replacement.id}",
+                    selected_id=selected_replacement.workshop_id
+                )
             with st.form("edit_replacement_form"):
                 col1, col2 = st.columns(2)
 
                 with col1:
-                    selected_part = st.selectbox(
-                        "Запчасть *",
-                        options=parts,
-                        format_func=lambda p: f"{p.name} (ID: {p.id})",
-                        index=[p.id for p in parts].index(selected_replacement.part_id) if selected_replacement.part_id in [p.id for p in parts] else 0
-                    )
-                    selected_equipment = st.selectbox(
-                        "Оборудование *",
-                        options=equipment_list,
-                        format_func=lambda e: f"{e.name} (ID: {e.id})",
-                        index=[e.id for e in equipment_list].index(selected_replacement.equipment_id) if selected_replacement.equipment_id in [e.id for e in equipment_list] else 0
-                    )
                     unit_serial_number = st.text_input(
                         "Серийный номер единицы оборудования *",
                         value=selected_replacement.unit_serial_number,
                         max_chars=30
                     )
-                    selected_workshop = st.selectbox(
-                        "Мастерская *",
-                        options=workshops,
-                        format_func=lambda w: f"{w.name} - {w.addr}",
-                        index=[w.id for w in workshops].index(selected_replacement.workshop_id) if selected_replacement.workshop_id in [w.id for w in workshops] else 0
-                    )
 
                 with col2:
                     selected_type = st.selectbox(
@@ -238,12 +245,15 @@ with tab3:
                 if submitted:
                     if not unit_serial_number:
                         st.error("Пожалуйста, заполните серийный номер")
+                    elif selected_part is None or selected_equipment is None or selected_workshop is None:
+                        st.error("Выберите запчасть, оборудование и мастерскую")
                     elif replacement_date and replacement_date < installation_date:
                         st.error("Дата замены не может быть раньше даты установки")
                     else:
                         try:
                             services.replacements.update(
                                 selected_replacement.id,
+                                expected_version=selected_replacement_version,
                                 part_id=selected_part.id,
                                 equipment_id=selected_equipment.id,
                                 unit_serial_number=unit_serial_number,
@@ -253,15 +263,58 @@ with tab3:
                                 replacement_date=replacement_date if replacement_date else None,
                                 comments=comments if comments else None
                             )
+                            reset_edit_version("replacement", selected_replacement.id)
                             st.success(f"Замена успешно обновлена!")
                             st.rerun()
+                        except ConflictError as e:
+                            reset_edit_version("replacement", selected_replacement.id)
+                            st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                         except Exception as e:
                             st.error(f"Ошибка при обновлении замены: {str(e)}")
 
                 if delete_clicked:
                     try:
-                        services.replacements.delete(selected_replacement.id)
+                        services.replacements.delete(selected_replacement.id, expected_version=selected_replacement_version)
+                        reset_edit_version("replacement", selected_replacement.id)
                         st.success(f"Замена успешно удалена!")
                         st.rerun()
+                    except ConflictError as e:
+                        reset_edit_version("replacement", selected_replacement.id)
+                        st.warning(f"{e}. Обновите страницу, чтобы увидеть изменения, и повторите правку.")
                     except Exception as e:
                         st.error(f"Ошибка при удалении замены: {str(e)}")
+
+with tab4:
+    st.subheader("Закрыть несколько установок")
+    st.caption("Например, после планового ТО: все выбранные установки закрываются одной датой замены в одной транзакции.")
+
+    open_replacements = data["open_replacements"]
+    if not open_replacements:
+        st.info("Нет незаменённых установок")
+    else:
+        open_labels = {
+            r.id: f"{r.part_name} - {r.equipment_name} ({r.unit_serial_number}, с {r.installation_date})"
+            for r in open_replacements
+        }
+        with st.form("close_many_form"):
+            selected_ids = st.multiselect(
+                "Установки *",
+                options=list(open_labels),
+                format_func=lambda rid: open_labels[rid],
+            )
+            close_date = st.date_input("Дата замены *", value=date.today())
+            submitted = st.form_submit_button("Закрыть выбранные", type="primary")
+
+            if submitted:
+                installed = {r.id: r.installation_date for r in open_replacements}
+                if not selected_ids:
+                    st.error("Выберите хотя бы одну установку")
+                elif any(installed[rid] > close_date for rid in selected_ids):
+                    st.error("Дата замены не может быть раньше даты установки")
+                else:
+                    try:
+                        services.writes.replacements.close_many(selected_ids, close_date).result()
+                        st.success(f"Закрыто установок: {len(selected_ids)}")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Ошибка при закрытии установок: {str(e)}")
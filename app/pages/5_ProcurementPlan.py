@@ -1,176 +1,322 @@
 import streamlit as st
 import pandas as pd
-from datetime import date
-from core.utils import get_services
-from core.services import compute_wear
+import pyarrow.compute as pc
+from core.profiling import finish_profile, span, start_profile
+from core.scenarios import ScenarioEngine
+from core.services import CRITICAL_ZONES
+from core.tables import no_stock_style, paged_table, zone_style
+from core.utils import cached, get_services, prefetch
+from core.widgets import search_select
 
 st.set_page_config(page_title="План закупок", layout="wide")
 st.title("План закупок запчастей")
+start_profile("План закупок")
 
 services = get_services()
 
-# Получаем данные
-parts = services.parts.list()
-equipment_list = services.equipment.list()
-replacements = services.replacements.list()
+data = prefetch(parts_count=lambda s: s.parts.count(), replacements_count=lambda s: s.replacements.count())
 
-if not parts:
+if not data["parts_count"]:
     st.warning("Нет запчастей для формирования плана закупок.")
     st.stop()
 
-if not replacements:
+if not data["replacements_count"]:
     st.warning("Нет установленных запчастей для формирования плана закупок.")
     st.stop()
 
-# Фильтры
-col1, col2 = st.columns(2)
-with col1:
-    filter_equipment = st.selectbox(
-        "Фильтр по оборудованию",
-        options=[None] + equipment_list,
-        format_func=lambda x: "Все оборудование" if x is None else x.name
+# Разделы страницы - фрагменты (st.fragment): фильтр плана, расчёт прогноза или
+# сценария перезапускают только свой раздел. План и прогноз берутся из кэша
+# (cached), который сбрасывается при записи в справочники и журнал замен.
+
+@st.fragment
+def plan_section():
+    # Фильтры
+    col1, col2 = st.columns(2)
+    with col1:
+        filter_equipment = search_select(
+            "Фильтр по оборудованию",
+            services.equipment,
+            key="plan_filter_equipment",
+            none_label="Все оборудование"
+        )
+
+    with col2:
+        show_only_critical = st.checkbox("Показать только критичные (красная/желтая зона)", value=False)
+
+    # План закупок - pyarrow.Table, уже отсортированный по дате инициации закупки
+    plan = cached(
+        "procurement", "plan_table",
+        equipment_id=filter_equipment.id if filter_equipment else None,
+        zones=CRITICAL_ZONES if show_only_critical else None,
     )
 
-with col2:
-    show_only_critical = st.checkbox("Показать только критичные (красная/желтая зона)", value=False)
+    if plan.num_rows:
+        zones = plan['zone'].to_pandas()
+        stock = plan['qty_in_stock'].to_pandas()
+
+        # Статистика
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Всего позиций", plan.num_rows)
+        with col2:
+            red_count = int((zones == 'red').sum())
+            st.metric("Критичных", red_count)
+        with col3:
+            yellow_count = int((zones == 'yellow').sum())
+            st.metric("Требуют внимания", yellow_count)
+        with col4:
+            no_stock = int((stock == 0).sum())
+            st.metric("Нет на складе", no_stock)
+
+        st.divider()
+
+        # Таблица: сортировка и страницы на сервере, раскрашивается только видимая страница
+        paged_table(
+            plan.append_column('percent_left', pc.multiply(plan['percentage_left'], 100)),
+            key="plan_table",
+            columns={
+                'part_name': 'Запчасть',
+                'equipment_name': 'Оборудование',
+                'unit_serial_number': 'Серийный номер',
+                'installation_date': 'Дата установки',
+                'remaining_days': 'Осталось дней',
+                'percent_left': 'Осталось %',
+                'zone': 'Зона',
+                'qty_in_stock': 'На складе',
+                'has_stock': 'Обеспечена складом',
+                'latest_init_date': 'Последняя дата инициации закупки',
+                'latest_purchase_date': 'Дата закупки',
+                'receipt_date': 'Дата получения',
+                'failure_date': 'Дата окончания срока службы',
+            },
+            styles={'zone': zone_style, 'qty_in_stock': no_stock_style},
+            column_config={
+                'Осталось %': st.column_config.NumberColumn(format="%.1f%%"),
+                'Обеспечена складом': st.column_config.CheckboxColumn(),
+            },
+        )
 
-# Формируем план закупок
-procurement_plan = []
+        # Графики
+        st.divider()
+        st.subheader("Аналитика")
 
-for part in parts:
-    # Находим все установки этой запчасти
-    part_replacements = [r for r in replacements if r.part_id == part.id]
+        col1, col2 = st.columns(2)
 
-    if not part_replacements:
-        continue
+        with col1:
+            st.write("Распределение по зонам износа")
+            zone_counts = zones.value_counts()
+            zone_colors = {'green': '🟢', 'yellow': '🟡', 'red': '🔴'}
+            zone_labels = {k: f"{zone_colors.get(k, '')} {k.capitalize()}" for k in zone_counts.index}
 
-    # Для каждой установки рассчитываем план закупки
-    for replacement in part_replacements:
-        if replacement.replacement_date:
-            # Если уже заменена, пропускаем
-            continue
+            chart_data = pd.DataFrame({
+                'Зона': [zone_labels.get(k, k) for k in zone_counts.index],
+                'Количество': zone_counts.values
+            })
+            st.bar_chart(chart_data.set_index('Зона'))
 
-        equipment = next((e for e in equipment_list if e.id == replacement.equipment_id), None)
-        if not equipment:
-            continue
+        with col2:
+            st.write("Запчасти без запаса на складе")
+            stock_data = stock.value_counts().sort_index()
+            st.bar_chart(stock_data)
 
-        # Применяем фильтр по оборудованию
-        if filter_equipment and equipment.id != filter_equipment.id:
-            continue
+    else:
+        st.info("Нет данных для формирования плана закупок. Убедитесь, что есть установленные запчасти.")
 
-        # Рассчитываем износ
-        percentage, remaining_days, zone = compute_wear(
-            part.useful_life_days,
-            replacement.installation_date,
-            replacement.replacement_date,
-            part.qty_in_stock,
-            part.lead_time_days
+# Вероятностный прогноз потребности
+@st.fragment
+def forecast_section():
+    with st.expander("Прогноз потребности (Монте-Карло)"):
+        st.caption(
+            "Сроки службы моделируются по фактическим заменам из журнала; "
+            "показано число отказов по окнам закупки в медианном (P50) и неблагоприятном (P90) сценарии."
         )
+        col1, col2 = st.columns(2)
+        with col1:
+            horizon_days = st.number_input("Горизонт (дней)", min_value=15, max_value=730, value=180, step=15)
+        with col2:
+            trials = st.number_input("Число испытаний", min_value=1000, max_value=100_000, value=10_000, step=1000)
+
+        if st.button("Рассчитать прогноз"):
+            forecast_rows = cached("forecast", "demand_forecast", horizon_days=int(horizon_days), trials=int(trials), seed=0)
+            if forecast_rows:
+                forecast_df = pd.DataFrame(forecast_rows).rename(columns={
+                    'part_name': 'Запчасть',
+                    'window_start': 'Начало окна',
+                    'window_end': 'Конец окна',
+                    'mean': 'Среднее',
+                    'p50': 'P50',
+                    'p90': 'P90',
+                })
+                st.dataframe(
+                    forecast_df[['Запчасть', 'Начало окна', 'Конец окна', 'Среднее', 'P50', 'P90']],
+                    use_container_width=True,
+                    hide_index=True
+                )
+            else:
+                st.info("На выбранном горизонте отказов не ожидается.")
 
-        # Фильтр по критичности
-        if show_only_critical and zone == "green":
-            continue
 
-        # Рассчитываем план закупки
-        plan_data = services.procurement.calculate_for_part(
-            part,
-            replacement.installation_date
+# Сценарий "что если": пересчёт в памяти без изменения справочника
+@st.fragment
+def scenario_section():
+    with st.expander("Сценарий «что если»"):
+        st.caption(
+            "Оцените влияние изменения срока доставки, срока службы, запаса или дней закупки "
+            "до правки карточки запчасти. Данные в БД не изменяются."
         )
+        scenario_option = search_select("Запчасть", services.parts, key="scenario_part")
+        scenario_part = services.parts.get(scenario_option.id) if scenario_option else None
+        if scenario_part is not None:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                scenario_lead = st.number_input("Срок закупки (дней)", min_value=0, value=scenario_part.lead_time_days, key="scenario_lead")
+            with col2:
+                scenario_life = st.number_input("Срок службы (дней)", min_value=1, value=scenario_part.useful_life_days, key="scenario_life")
+            with col3:
+                scenario_stock = st.number_input("На складе", min_value=0, value=scenario_part.qty_in_stock, key="scenario_stock")
+            with col4:
+                # По умолчанию - дни закупки поставщика запчасти
+                supplier_days = {supplier.id: supplier.purchase_days for supplier in services.suppliers.list()}
+                part_days = supplier_days.get(scenario_part.supplier_id, "10,25")
+                scenario_days = st.text_input("Дни закупки", value=part_days.replace(",", ", "), key="scenario_days")
 
-        procurement_plan.append({
-            'Запчасть': part.name,
-            'Оборудование': equipment.name,
-            'Серийный номер': replacement.unit_serial_number,
-            'Дата установки': replacement.installation_date,
-            'Осталось дней': int(remaining_days),
-            'Осталось %': f"{percentage * 100:.1f}%",
-            'Зона': zone,
-            'На складе': part.qty_in_stock,
-            'Срок закупки (дней)': part.lead_time_days,
-            'Дата окончания срока службы': plan_data['failure_date'],
-            'Последняя дата инициации закупки': plan_data['latest_init_date'],
-            'Дата закупки': plan_data['latest_purchase_date'],
-            'Дата получения': plan_data.get('receipt_date', plan_data['latest_purchase_date'])
-        })
-
-if procurement_plan:
-    df = pd.DataFrame(procurement_plan)
-
-    # Сортируем по дате инициации закупки
-    df = df.sort_values('Последняя дата инициации закупки')
-
-    # Статистика
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Всего позиций", len(df))
-    with col2:
-        red_count = len(df[df['Зона'] == 'red'])
-        st.metric("Критичных", red_count)
-    with col3:
-        yellow_count = len(df[df['Зона'] == 'yellow'])
-        st.metric("Требуют внимания", yellow_count)
-    with col4:
-        no_stock = len(df[df['На складе'] == 0])
-        st.metric("Нет на складе", no_stock)
-
-    st.divider()
-
-    # Цветовая индикация
-    def color_zone(val):
-        if val == 'green':
-            return 'background-color: #90EE90'
-        elif val == 'yellow':
-            return 'background-color: #FFD700'
-        elif val == 'red':
-            return 'background-color: #FF6B6B'
-        return ''
-
-    def color_stock(val):
-        if val == 0:
-            return 'background-color: #FFB6C1'
-        return ''
-
-    # Отображаем таблицу
-    display_df = df[[
-        'Запчасть',
-        'Оборудование',
-        'Серийный номер',
-        'Дата установки',
-        'Осталось дней',
-        'Осталось %',
-        'Зона',
-        'На складе',
-        'Последняя дата инициации закупки',
-        'Дата закупки',
-        'Дата получения',
-        'Дата окончания срока службы'
-    ]].copy()
-
-    styled_df = display_df.style.applymap(color_zone, subset=['Зона']).applymap(color_stock, subset=['На складе'])
-    st.dataframe(styled_df, use_container_width=True, hide_index=True)
-
-    # Графики
-    st.divider()
-    st.subheader("Аналитика")
+            if st.button("Рассчитать сценарий"):
+                try:
+                    purchase_days = [int(day) for day in scenario_days.replace(";", ",").split(",") if day.strip()]
+                    result = ScenarioEngine.from_services(services).run(parts={scenario_part.id: {
+                        "lead_time_days": int(scenario_lead),
+                        "useful_life_days": int(scenario_life),
+                        "qty_in_stock": int(scenario_stock),
+                        "purchase_days": purchase_days,
+                    }})
+                except ValueError as e:
+                    st.error(f"Ошибка в параметрах сценария: {e}")
+                else:
+                    summary = result.summary
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("Изменилось установок", summary["changed_installations"])
+                    with col2:
+                        st.metric("Красная зона", summary["zones_after"]["red"],
+                                  delta=summary["zones_after"]["red"] - summary["zones_before"]["red"], delta_color="inverse")
+                    with col3:
+                        st.metric("Желтая зона", summary["zones_after"]["yellow"],
+                                  delta=summary["zones_after"]["yellow"] - summary["zones_before"]["yellow"], delta_color="inverse")
+                    with col4:
+                        st.metric("Просрочена заявка", summary["overdue_after"],
+                                  delta=summary["overdue_after"] - summary["overdue_before"], delta_color="inverse")
 
-    col1, col2 = st.columns(2)
+                    if result.diff.empty:
+                        st.info("Сценарий не меняет план закупок.")
+                    else:
+                        diff_df = result.diff.rename(columns={
+                            'part_name': 'Запчасть',
+                            'equipment_name': 'Оборудование',
+                            'unit_serial_number': 'Серийный номер',
+                            'zone_before': 'Зона (было)',
+                            'zone_after': 'Зона (стало)',
+                            'remaining_days_before': 'Осталось дней (было)',
+                            'remaining_days_after': 'Осталось дней (стало)',
+                            'latest_init_date_before': 'Инициация закупки (было)',
+                            'latest_init_date_after': 'Инициация закупки (стало)',
+                            'init_shift_days': 'Сдвиг инициации (дней)',
+                        })
+                        st.dataframe(
+                            diff_df[[
+                                'Запчасть', 'Оборудование', 'Серийный номер', 'Зона (было)', 'Зона (стало)',
+                                'Осталось дней (было)', 'Осталось дней (стало)',
+                                'Инициация закупки (было)', 'Инициация закупки (стало)', 'Сдвиг инициации (дней)',
+                            ]],
+                            use_container_width=True,
+                            hide_index=True
+                        )
 
-    with col1:
-        st.write("Распределение по зонам износа")
-        zone_counts = df['Зона'].value_counts()
-        zone_colors = {'green': '🟢', 'yellow': '🟡', 'red': '🔴'}
-        zone_labels = {k: f"{zone_colors.get(k, '')} {k.capitalize()}" for k in zone_counts.index}
 
-        chart_data = pd.DataFrame({
-            'Зона': [zone_labels.get(k, k) for k in zone_counts.index],
-            'Количество': zone_counts.values
-        })
-        st.bar_chart(chart_data.set_index('Зона'))
+# Календарь закупок: дни закупки поставщиков и праздники (переносят дату закупки)
+@st.fragment
+def calendar_section():
+    with st.expander("Календарь закупок"):
+        st.caption(
+            "Запчасти без поставщика закупаются 10 и 25 числа. Дата закупки, выпавшая на праздник, "
+            "переносится на следующий (или предыдущий) рабочий день; план пересчитывается автоматически."
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Поставщики**")
+            suppliers = services.suppliers.list()
+            if suppliers:
+                st.dataframe(
+                    pd.DataFrame([{
+                        'Поставщик': supplier.name,
+                        'Дни закупки': supplier.purchase_days,
+                        'Перенос с праздника': "на следующий день" if supplier.holiday_shift == "next" else "на предыдущий день",
+                    } for supplier in suppliers]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            with st.form("add_supplier_form", clear_on_submit=True):
+                supplier_name = st.text_input("Поставщик *", max_chars=50)
+                supplier_days = st.text_input("Дни закупки *", value="10, 25")
+                supplier_shift = st.selectbox(
+                    "Перенос с праздника",
+                    options=["next", "previous"],
+                    format_func=lambda x: "на следующий день" if x == "next" else "на предыдущий день"
+                )
+                if st.form_submit_button("Добавить поставщика"):
+                    if not supplier_name:
+                        st.error("Пожалуйста, заполните название поставщика")
+                    elif any(supplier.name == supplier_name for supplier in suppliers):
+                        st.error(f"Поставщик '{supplier_name}' уже есть")
+                    else:
+                        try:
+                            services.suppliers.create(name=supplier_name, purchase_days=supplier_days, holiday_shift=supplier_shift)
+                            st.success(f"Поставщик '{supplier_name}' добавлен")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Ошибка при добавлении поставщика: {str(e)}")
 
-    with col2:
-        st.write("Запчасти без запаса на складе")
-        stock_data = df.groupby('На складе').size()
-        st.bar_chart(stock_data)
+        with col2:
+            st.markdown("**Праздники**")
+            holidays = services.holidays.list()
+            if holidays:
+                st.dataframe(
+                    pd.DataFrame([{'Дата': holiday.holiday_date, 'Название': holiday.name} for holiday in holidays]),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            with st.form("add_holiday_form", clear_on_submit=True):
+                holiday_date = st.date_input("Дата *")
+                holiday_name = st.text_input("Название", max_chars=50)
+                if st.form_submit_button("Добавить праздник"):
+                    if any(holiday.holiday_date == holiday_date for holiday in holidays):
+                        st.error(f"Праздник {holiday_date} уже есть")
+                    else:
+                        try:
+                            services.holidays.create(holiday_date=holiday_date, name=holiday_name)
+                            st.success(f"Праздник {holiday_date} добавлен")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Ошибка при добавлении праздника: {str(e)}")
+            if holidays:
+                removed = st.selectbox(
+                    "Удалить праздник",
+                    options=holidays,
+                    format_func=lambda h: f"{h.holiday_date} {h.name}".strip(),
+                    key="removed_holiday"
+                )
+                if st.button("Удалить праздник"):
+                    services.holidays.delete(removed.id)
+                    st.rerun()
+
+
+with span("план"):
+    plan_section()
+st.divider()
+with span("прогноз"):
+    forecast_section()
+with span("сценарий"):
+    scenario_section()
+with span("календарь закупок"):
+    calendar_section()
 
-else:
-    st.info("Нет данных для формирования плана закупок. Убедитесь, что есть установленные запчасти.")
+finish_profile()
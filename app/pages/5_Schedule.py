@@ -0,0 +1,140 @@
+import streamlit as st
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from core.profiling import finish_profile, span, start_profile
+from core.scheduler import DEFAULT_HORIZON_DAYS, WINDOW_DAYS
+from core.tables import paged_table
+from core.utils import cached, get_services, prefetch
+
+LATE_COLOR = 'background-color: #FF6B6B'
+
+st.set_page_config(page_title="Расписание замен", layout="wide")
+st.title("Расписание замен по мастерским")
+start_profile("Расписание замен")
+
+services = get_services()
+
+data = prefetch(workshops=lambda s: s.workshops.list_rows())
+if not any(workshop.retired_at is None and workshop.daily_capacity for workshop in data["workshops"]):
+    st.warning("Нет действующих мастерских с мощностью больше нуля. Укажите мощность на странице мастерских.")
+    st.stop()
+
+st.caption(
+    "Замены незаменённых установок, срок службы которых истекает до конца горизонта, "
+    "распределяются по рабочим дням мастерских с учётом их мощности (замен в день) и "
+    "поступления запчастей: сначала самые срочные, в мастерской, где была установка."
+)
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    horizon_days = st.number_input("Горизонт, дней", min_value=7, max_value=365, value=DEFAULT_HORIZON_DAYS)
+with col2:
+    window_days = st.number_input(
+        "Планировать не раньше чем за, дней до отказа", min_value=0, max_value=90, value=WINDOW_DAYS,
+        help="Раньше замена ставится, только если иначе она будет просрочена (локальный поиск)"
+    )
+with col3:
+    improve = st.toggle("Улучшить локальным поиском", value=True)
+
+result = cached("schedule", "schedule", horizon_days=int(horizon_days), improve=improve, window_days=int(window_days))
+summary = result.summary
+
+if not summary["jobs"]:
+    st.info(f"Нет установок, срок службы которых истекает до {summary['end']:%d.%m.%Y}.")
+    st.stop()
+
+col1, col2, col3, col4, col5, col6 = st.columns(6)
+with col1:
+    st.metric("Замен на горизонте", summary["jobs"])
+with col2:
+    st.metric("Запланировано", summary["scheduled"])
+with col3:
+    st.metric("После отказа", summary["late"])
+with col4:
+    st.metric("Без места", summary["unscheduled"])
+with col5:
+    st.metric("Не в своей мастерской", summary["transfers"])
+with col6:
+    st.metric("Загрузка мастерских", f"{summary['utilization']:.0%}")
+
+st.caption(
+    f"{summary['start']:%d.%m.%Y} - {summary['end']:%d.%m.%Y}. Рабочих дней: {summary['work_days']}, "
+    f"мастерских: {summary['workshops']}. Стоимость расписания: жадный проход {summary['greedy_cost']}, "
+    f"итог {summary['cost']} (перестановок: {summary['moves']}, проходов: {summary['passes']}). "
+    f"Расчёт: {summary['greedy_ms']:.0f} + {summary['improve_ms']:.0f} мс."
+)
+
+st.subheader("Загрузка мастерских")
+with span("календарь загрузки"):
+    calendar = result.calendar
+    load = calendar.assign(
+        day=pd.to_datetime(calendar['date']).dt.strftime('%d.%m'),
+        load=np.where(calendar['capacity'] > 0, calendar['booked'] / calendar['capacity'].clip(lower=1) * 100, np.nan),
+    ).pivot_table(index='workshop_name', columns='day', values='load', sort=False)
+    st.dataframe(
+        load.style.background_gradient(cmap='RdYlGn_r', vmin=0, vmax=100, axis=None).format('{:.0f}', na_rep='-'),
+        use_container_width=True,
+    )
+    st.caption("Доля мощности дня, занятая заменами, %")
+
+
+def late_style(column: pd.Series) -> np.ndarray:
+    """Цвет ячеек замен после отказа."""
+    return np.where(column > 0, LATE_COLOR, '')
+
+
+schedule_columns = {
+    'slot_date': 'Дата замены',
+    'workshop_name': 'Мастерская',
+    'part_name': 'Запчасть',
+    'equipment_name': 'Оборудование',
+    'unit_serial_number': 'Серийный номер',
+    'failure_date': 'Дата отказа',
+    'available_date': 'Запчасть в наличии с',
+    'days_early': 'Дней до отказа',
+    'days_late': 'Дней после отказа',
+    'home_workshop': 'Своя мастерская',
+}
+
+st.subheader("Календарь мастерской")
+workshops = calendar[['workshop_id', 'workshop_name']].drop_duplicates()
+workshop_id = st.selectbox(
+    "Мастерская", options=workshops['workshop_id'].tolist(),
+    format_func=dict(zip(workshops['workshop_id'], workshops['workshop_name'])).get,
+)
+workshop_plan = result.workshop_calendar(workshop_id)
+if len(workshop_plan):
+    st.dataframe(
+        workshop_plan[[c for c in schedule_columns if c != 'workshop_name']].rename(columns=schedule_columns)
+        .style.apply(late_style, subset=['Дней после отказа']),
+        use_container_width=True,
+        hide_index=True,
+    )
+else:
+    st.info("В этой мастерской замен на горизонте нет.")
+
+st.subheader("Все замены")
+paged_table(
+    pa.Table.from_pandas(result.assignments, preserve_index=False),
+    key="schedule_table",
+    columns=schedule_columns,
+    styles={'days_late': late_style},
+)
+
+if len(result.unscheduled):
+    st.subheader("Замены без места")
+    st.dataframe(
+        result.unscheduled.rename(columns={
+            'part_name': 'Запчасть',
+            'equipment_name': 'Оборудование',
+            'unit_serial_number': 'Серийный номер',
+            'failure_date': 'Дата отказа',
+            'available_date': 'Запчасть в наличии с',
+            'reason': 'Причина',
+        })[['Запчасть', 'Оборудование', 'Серийный номер', 'Дата отказа', 'Запчасть в наличии с', 'Причина']],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+finish_profile()
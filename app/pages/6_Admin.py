@@ -0,0 +1,125 @@
+import json
+import streamlit as st
+import pandas as pd
+from core.profiling import PROFILE_HISTORY, PROFILE_MODES, SESSION_MODES_KEY, get_profile_store
+
+st.set_page_config(page_title="Администрирование", layout="wide")
+st.title("Администрирование")
+
+st.subheader("Профилирование перезапусков")
+st.caption(
+    "Профиль - время этапов перезапуска страницы (запросы, расчёт износа, таблицы, графики), "
+    "по выбору - самые долгие функции (cProfile) и прирост памяти (tracemalloc). "
+    "Для всех сессий включается переменной окружения PARTS_JOURNAL_PROFILE, для страницы - "
+    "параметром адреса ?profile=spans,cprofile,memory (или all)."
+)
+st.multiselect(
+    "Профилировать перезапуски страниц в этой сессии",
+    options=PROFILE_MODES,
+    format_func={"spans": "Этапы", "cprofile": "cProfile", "memory": "Память (tracemalloc)"}.get,
+    key=SESSION_MODES_KEY,
+)
+
+# Список общий для всех сессий; копия - на случай записи профиля другой сессией во время отрисовки
+profiles = list(reversed(get_profile_store()))
+
+if not profiles:
+    st.info(f"Профилей пока нет. Здесь показываются последние {PROFILE_HISTORY} профилей.")
+    st.stop()
+
+st.dataframe(
+    pd.DataFrame([{
+        'Время': profile.started_at.strftime('%H:%M:%S'),
+        'Страница': profile.page,
+        'мс': round(profile.total_ms, 1),
+        'Самый долгий этап': max(profile.spans, key=lambda s: s.duration_ms).name if profile.spans else '',
+        'Режимы': ', '.join(profile.modes),
+        'Завершён': profile.completed,
+    } for profile in profiles]),
+    use_container_width=True,
+    hide_index=True,
+    column_config={'Завершён': st.column_config.CheckboxColumn()},
+)
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    selected = st.selectbox(
+        "Профиль",
+        options=range(len(profiles)),
+        format_func=lambda i: f"{profiles[i].started_at:%H:%M:%S} {profiles[i].page} - {profiles[i].total_ms:.0f} мс",
+    )
+with col2:
+    st.download_button(
+        "Выгрузить все (JSON)",
+        data=json.dumps([profile.to_dict() for profile in profiles], ensure_ascii=False, indent=2),
+        file_name="profiles.json",
+        mime="application/json",
+    )
+    if st.button("Очистить"):
+        get_profile_store().clear()
+        st.rerun()
+
+profile = profiles[selected]
+if not profile.completed:
+    st.warning(
+        "Перезапуск не дошёл до конца страницы (st.stop или st.rerun): время - до конца последнего этапа, "
+        "память и cProfile сняты до следующего перезапуска сессии."
+    )
+
+st.write("**Этапы**")
+st.dataframe(
+    pd.DataFrame([{
+        'Этап': '    ' * span.depth + span.name,
+        'Начало, мс': round(span.start_ms, 1),
+        'мс': round(span.duration_ms, 1),
+        '% перезапуска': span.duration_ms / profile.total_ms * 100 if profile.total_ms else 0,
+    } for span in sorted(profile.spans, key=lambda s: (s.start_ms, s.depth))]),
+    use_container_width=True,
+    hide_index=True,
+    column_config={'% перезапуска': st.column_config.ProgressColumn(format="%.0f%%", min_value=0, max_value=100)},
+)
+
+if profile.functions:
+    st.write("**cProfile: функции с наибольшим собственным временем**")
+    st.dataframe(
+        pd.DataFrame(profile.functions).rename(columns={
+            'function': 'Функция', 'calls': 'Вызовов', 'own_ms': 'Собственное, мс', 'total_ms': 'С вложенными, мс',
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'Собственное, мс': st.column_config.NumberColumn(format="%.1f"),
+            'С вложенными, мс': st.column_config.NumberColumn(format="%.1f"),
+        },
+    )
+
+if profile.allocations:
+    st.write(f"**tracemalloc: прирост памяти по строкам кода** (пик за перезапуск {profile.memory_peak_kb:.0f} КБ)")
+    st.dataframe(
+        pd.DataFrame(profile.allocations).rename(columns={
+            'location': 'Строка', 'size_kb': 'Прирост, КБ', 'count': 'Блоков',
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={'Прирост, КБ': st.column_config.NumberColumn(format="%.1f")},
+    )
+elif "memory" in profile.modes:
+    st.info("Память не снималась: tracemalloc в это время был занят профилем другой сессии.")
+
+file_name = f"profile_{profile.started_at:%Y%m%d_%H%M%S}"
+col1, col2 = st.columns(2)
+with col1:
+    st.download_button(
+        "Профиль (JSON)",
+        data=json.dumps(profile.to_dict(), ensure_ascii=False, indent=2),
+        file_name=f"{file_name}.json",
+        mime="application/json",
+    )
+with col2:
+    st.download_button(
+        "Этапы для speedscope",
+        data=json.dumps(profile.to_speedscope(), ensure_ascii=False),
+        file_name=f"{file_name}.speedscope.json",
+        mime="application/json",
+        help="Открыть на https://www.speedscope.app",
+    )
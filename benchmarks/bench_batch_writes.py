@@ -0,0 +1,95 @@
+"""
+Пропускная способность записи: фиксация на каждую строку против пакетной.
+
+Запуск:
+    python benchmarks/bench_batch_writes.py [--rows 2000]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+
+def timed(label, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed:8.3f} с  {rows / elapsed:10.0f} строк/с")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from core.db import SessionLocal, init_db
+    from core.models import Replacements
+    from core.services import ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshop = services.workshops.create(name="Мастерская", addr="-")
+    equipment = services.equipment.create(name="Оборудование", available_units=10)
+    parts = services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment.id, "useful_life_days": 365,
+         "qty_per_unit": 1, "qty_in_stock": 1, "lead_time_days": 30}
+        for i in range(20)
+    ])
+
+    n = args.rows
+    today = date.today()
+
+    def replacement_row(i):
+        return {
+            "part_id": parts[i % len(parts)].id,
+            "equipment_id": equipment.id,
+            "unit_serial_number": f"SN{i}",
+            "workshop_id": workshop.id,
+            "replacement_type_id": 1,
+            "installation_date": today - timedelta(days=i % 300),
+        }
+
+    print(f"Строк: {n}")
+    timed("create: фиксация на каждую строку", n, lambda: [services.replacements.create(**replacement_row(i)) for i in range(n)])
+
+    def create_in_transaction():
+        with services.transaction():
+            for i in range(n):
+                services.replacements.create(**replacement_row(i))
+    timed("create внутри services.transaction()", n, create_in_transaction)
+    timed("create_many", n, lambda: services.replacements.create_many([replacement_row(i) for i in range(n)]))
+
+    ids = [r.id for r in services.replacements.list(limit=n)]
+    half = len(ids) // 2
+    timed("update (закрытие): фиксация на каждую строку", half,
+          lambda: [services.replacements.update(i, replacement_date=today) for i in ids[:half]])
+    timed("close_many (update_many)", len(ids) - half, lambda: services.replacements.close_many(ids[half:], today))
+
+    stock = {part.id: {"qty_in_stock": 5} for part in parts}
+    timed("update_many: корректировка запаса", len(stock), lambda: services.parts.update_many(stock))
+
+    ids = [r.id for r in services.replacements.list(offset=n, limit=n)]
+    half = len(ids) // 2
+    timed("delete: фиксация на каждую строку", half, lambda: [services.replacements.delete(i) for i in ids[:half]])
+    timed("delete_many", len(ids) - half, lambda: services.replacements.delete_many(ids[half:]))
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
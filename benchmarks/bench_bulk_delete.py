@@ -0,0 +1,105 @@
+"""
+Удаление и вывод из эксплуатации оборудования с большим числом запчастей: через
+ORM (загрузка каждой записи, отдельный UPDATE/DELETE на строку) против операций
+набором SQL (core/retire.py).
+
+Запуск:
+    python benchmarks/bench_bulk_delete.py [--parts 10000]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+
+def timed(label, engine, fn):
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "before_cursor_execute", count)
+    print(f"{label:<50} {elapsed:8.3f} с  {statements:7d} SQL")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--parts", type=int, default=10_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from core.db import SessionLocal, engine, init_db
+    from core.models import Replacements
+    from core.services import BaseService, ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshop_id = services.workshops.create(name="Мастерская", addr="-").id
+    today = date.today()
+
+    def equipment_with_parts(name, installed):
+        """Оборудование с args.parts запчастями (начальный остаток на складе) и, если installed, их установками."""
+        equipment_id = services.equipment.create(name=name, available_units=1).id
+        parts = services.parts.create_many([
+            {"name": f"{name} {i}", "parent_equipment_id": equipment_id, "useful_life_days": 365,
+             "qty_per_unit": 1, "qty_in_stock": 1, "lead_time_days": 30}
+            for i in range(args.parts)
+        ])
+        if installed:
+            services.replacements.create_many([
+                {"part_id": part.id, "equipment_id": equipment_id, "unit_serial_number": f"SN{part.id}",
+                 "workshop_id": workshop_id, "replacement_type_id": 1,
+                 "installation_date": today - timedelta(days=part.id % 300)}
+                for part in parts
+            ])
+        # Замер начинается с пустой карты идентичности, как в новой сессии
+        db.expunge_all()
+        return equipment_id
+
+    def orm_retire(equipment_id):
+        # Каждая установка и запчасть загружается и изменяется отдельным UPDATE
+        replacements = services.replacements.get_by_equipment(equipment_id)
+        services.replacements.close_many([r.id for r in replacements if r.replacement_date is None], today)
+        parts = services.parts.list_rows(parent_equipment_id=equipment_id)
+        services.parts.update_many({part.id: {"retired_at": today} for part in parts})
+        services.equipment.update(equipment_id, retired_at=today)
+
+    print(f"Запчастей у оборудования: {args.parts}")
+    # Старый путь удаления: session.delete с cascade="all, delete-orphan" на Equipment.parts
+    equipment_id = equipment_with_parts("ORM", installed=False)
+    timed("delete: ORM cascade (session.delete)", engine,
+          lambda: BaseService.delete(services.equipment, equipment_id))
+    equipment_id = equipment_with_parts("SQL", installed=False)
+    timed("delete: DELETE ... WHERE (core/retire.py)", engine, lambda: services.equipment.delete(equipment_id))
+
+    equipment_id = equipment_with_parts("ORM установки", installed=True)
+    timed("retire: ORM, закрытие установок и запчастей", engine, lambda: orm_retire(equipment_id))
+    equipment_id = equipment_with_parts("SQL установки", installed=True)
+    timed("retire: UPDATE ... WHERE (core/retire.py)", engine, lambda: services.equipment.retire(equipment_id))
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
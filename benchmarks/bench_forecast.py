@@ -0,0 +1,103 @@
+"""
+Прогноз потребности (core/forecast.py, simulate_demand): время и пиковая память
+симуляции Монте-Карло по всему парку в зависимости от числа незаменённых установок.
+
+Парк генерируется без БД, как в bench_procurement_plan: номинальные сроки службы
+запчастей 60-720 дней, установки отработали 0-700 дней, горизонт 180 дней с окнами
+закупки 10-го и 25-го числа. --before <ревизия> сравнивает с core/forecast.py из
+указанной ревизии git (например, HEAD~1).
+
+Запуск:
+    python benchmarks/bench_forecast.py [--installations 10000 50000 200000] [--parts 500] [--trials 10000] [--before HEAD~1]
+"""
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+HORIZON_DAYS = 180
+WEIBULL_SHAPE = 3.0
+
+
+def make_fleet(n_installations: int, n_parts: int, seed: int = 0):
+    """Индексы запчастей и отработанные дни установок, параметры Вейбулла по запчастям."""
+    from core.forecast import weibull_scale_for_mean
+
+    rng = np.random.default_rng(seed)
+    useful_life = rng.integers(60, 721, n_parts)
+    part_index = rng.integers(0, n_parts, n_installations)
+    age_days = rng.integers(0, 701, n_installations)
+    shape = np.full(n_parts, WEIBULL_SHAPE)
+    scale = np.array([weibull_scale_for_mean(days, WEIBULL_SHAPE) for days in useful_life])
+    return part_index, age_days, shape, scale
+
+
+def window_edges(today: date):
+    """Границы окон закупки (10-е и 25-е числа) в днях от today."""
+    from core.forecast import window_edges as edges
+    from core.purchase_calendar import PurchaseCalendar
+
+    calendar = PurchaseCalendar()
+    return edges(today, HORIZON_DAYS, calendar.dates_between(today, today + timedelta(days=HORIZON_DAYS)))
+
+
+def load_revision(revision: str):
+    """Модуль core/forecast.py из ревизии git."""
+    source = subprocess.run(
+        ["git", "show", f"{revision}:app/core/forecast.py"], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    path = os.path.join(tempfile.mkdtemp(), "forecast_before.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("forecast_before", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(simulate, fleet, n_parts, edges, trials):
+    tracemalloc.start()
+    begin = time.perf_counter()
+    mean, by_quantile = simulate(*fleet[:2], *fleet[2:], n_parts=n_parts, window_edges=edges, trials=trials, seed=0)
+    elapsed = time.perf_counter() - begin
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, float(mean.sum()), int(by_quantile[0.9].sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--installations", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--parts", type=int, default=500)
+    parser.add_argument("--trials", type=int, default=10_000)
+    parser.add_argument("--before", help="Ревизия git для сравнения")
+    args = parser.parse_args()
+
+    from core.forecast import simulate_demand
+
+    versions = [("текущая", simulate_demand)]
+    if args.before:
+        versions.insert(0, (args.before, load_revision(args.before).simulate_demand))
+
+    edges = window_edges(date.today())
+    print(f"Запчастей: {args.parts}, испытаний: {args.trials}, окон: {len(edges) - 1}, горизонт {HORIZON_DAYS} дней")
+    print(f"{'установок':>10} {'версия':<10} {'время, с':>9} {'пик, МБ':>8} {'отказов (среднее)':>18} {'сумма P90':>10}")
+    for n_installations in args.installations:
+        fleet = make_fleet(n_installations, args.parts)
+        for name, simulate in versions:
+            elapsed, peak, total, p90 = measure(simulate, fleet, args.parts, edges, args.trials)
+            print(f"{n_installations:>10} {name:<10} {elapsed:>9.2f} {peak:>8.0f} {total:>18.1f} {p90:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Пропускная способность записи при одновременных сессиях: фиксация в каждой сессии
+против потока групповой фиксации (core/writer.py).
+
+Каждый писатель - поток со своей сессией, проводящий --ops приходов на склад
+(services.stock.receive) и ждущий подтверждения каждого. Без writer каждая
+операция фиксируется своей сессией; с writer операции всех писателей выполняются
+пакетами, одна фиксация на пакет.
+
+Запуск:
+    python benchmarks/bench_group_commit.py [--writers 1 10 50] [--ops 50]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+
+def run_writers(n_writers, n_ops, part_ids, writer=None):
+    """Возвращает (секунды, задержки операций, число ошибок)."""
+    from core.db import SessionLocal
+    from core.services import ServiceContainer
+
+    latencies = []
+    errors = []
+    start_barrier = threading.Barrier(n_writers + 1)
+
+    def work(k):
+        db = SessionLocal()
+        services = ServiceContainer(db, writer)
+        part_id = part_ids[k % len(part_ids)]
+        start_barrier.wait()
+        try:
+            for _ in range(n_ops):
+                started = time.perf_counter()
+                try:
+                    if writer is None:
+                        services.stock.receive(part_id, 1)
+                    else:
+                        services.writes.stock.receive(part_id, 1).result()
+                except Exception as e:
+                    db.rollback()
+                    errors.append(e)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(n_writers)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, len(errors)
+
+
+def report(label, elapsed, latencies, n_errors, extra=""):
+    ops = len(latencies) - n_errors
+    p50 = statistics.median(latencies) * 1000
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else p50
+    print(f"{label:<28} {elapsed:7.2f} с {ops / elapsed:9.0f} оп/с  p50 {p50:7.1f} мс  p95 {p95:7.1f} мс"
+          f"  ошибок {n_errors}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--ops", type=int, default=50, help="Операций на писателя")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from core.db import SessionLocal, init_db
+    from core.services import ServiceContainer
+    from core.writer import GroupCommitWriter
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    equipment = services.equipment.create(name="Оборудование", available_units=10)
+    part_ids = [part.id for part in services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment.id, "useful_life_days": 365,
+         "qty_per_unit": 1, "qty_in_stock": 0, "lead_time_days": 30}
+        for i in range(20)
+    ])]
+    db.close()
+
+    for n_writers in args.writers:
+        print(f"Писателей: {n_writers}, операций: {n_writers * args.ops}")
+        report("фиксация в каждой сессии", *run_writers(n_writers, args.ops, part_ids))
+        writer = GroupCommitWriter()
+        elapsed, latencies, n_errors = run_writers(n_writers, args.ops, part_ids, writer)
+        writer.close()
+        report("групповая фиксация", elapsed, latencies, n_errors,
+               f"  пакетов {writer.batches} (в среднем {writer.operations / max(writer.batches, 1):.1f} оп)")
+
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
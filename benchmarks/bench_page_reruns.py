@@ -0,0 +1,178 @@
+"""
+Задержка перезапуска страниц Dashboard и План закупок: первая отрисовка, повторный
+перезапуск без изменений и перезапуск после изменения виджета.
+
+Страницы разбиты на фрагменты (st.fragment) поверх кэша рассчитанных данных
+(core.utils.cached). AppTest всегда выполняет скрипт страницы целиком, поэтому
+кроме времени всей страницы замеряется время фрагмента с изменённым виджетом -
+в браузере перезапускается только он. С --before REV те же замеры выполняются
+для страниц из ревизии git REV (например, до разбиения на фрагменты).
+
+Запуск:
+    python benchmarks/bench_page_reruns.py [--installations 5000] [--repeat 3] [--before REV]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import functools
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app")
+sys.path.insert(0, APP)
+
+PAGES = ("1_Dashboard.py", "5_ProcurementPlan.py")
+N_EQUIPMENT = 20
+N_PARTS = 300
+
+
+def seed(n_installations):
+    from core.db import SessionLocal, init_db
+    from core.models import Replacements
+    from core.services import ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    rng = random.Random(1)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshop_id = services.workshops.create(name="Мастерская", addr="-").id
+    equipment_ids = [e.id for e in services.equipment.create_many(
+        [{"name": f"Оборудование {i}", "available_units": 5} for i in range(N_EQUIPMENT)]
+    )]
+    parts = [(p.id, p.parent_equipment_id) for p in services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment_ids[i % N_EQUIPMENT],
+         "useful_life_days": rng.randint(60, 720), "qty_per_unit": 1, "qty_in_stock": rng.randint(0, 3),
+         "lead_time_days": rng.randint(5, 60)}
+        for i in range(N_PARTS)
+    ])]
+    services.replacements.create_many([
+        {"part_id": part_id, "equipment_id": equipment_id, "unit_serial_number": f"SN{i}",
+         "workshop_id": workshop_id, "replacement_type_id": 1,
+         "installation_date": date.today() - timedelta(days=rng.randint(0, 700))}
+        for i in range(n_installations)
+        for part_id, equipment_id in [parts[i % N_PARTS]]
+    ])
+    services.wear_snapshots.refresh(start=date.today() - timedelta(days=365))
+    db.close()
+
+
+def widget_actions(page):
+    """
+    Изменения виджетов страницы: (подпись, действие над AppTest, фрагмент с виджетом).
+    Отсутствующие виджеты пропускаются.
+    """
+    if page == "1_Dashboard.py":
+        return (
+            ("период графика", lambda at: at.selectbox(key="dashboard_trend_days").set_value(90), "trend_chart"),
+            ("фильтр таблицы по зонам", lambda at: at.multiselect(key="dashboard_detail_zones").set_value(["red"]),
+             "detail_table"),
+        )
+    return (
+        ("только критичные", lambda at: at.checkbox[0].check(), "plan_section"),
+        ("расчёт прогноза", lambda at: next(b for b in at.button if b.label == "Рассчитать прогноз").click(),
+         "forecast_section"),
+    )
+
+
+# Время последнего выполнения каждого фрагмента, мс
+fragment_ms = {}
+
+
+def timed_fragments():
+    """Подменяет st.fragment обёрткой, записывающей время выполнения фрагмента."""
+    import streamlit as st
+
+    fragment = st.fragment
+
+    def timed_fragment(func=None, **kwargs):
+        if func is None:
+            return lambda f: timed_fragment(f, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **func_kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **func_kwargs)
+            finally:
+                fragment_ms[func.__name__] = (time.perf_counter() - start) * 1000
+
+        return fragment(wrapper, **kwargs)
+
+    st.fragment = timed_fragment
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(script, page, repeat):
+    """Медианы задержек (мс) по видам перезапуска страницы."""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for _ in range(repeat):
+        st.cache_data.clear()
+        at = AppTest.from_file(script, default_timeout=600)
+        results.setdefault("первая отрисовка", []).append(timed(at.run))
+        results.setdefault("перезапуск без изменений", []).append(timed(at.run))
+        for label, action, fragment in widget_actions(page):
+            try:
+                action(at)
+            except (KeyError, IndexError, StopIteration):
+                continue
+            fragment_ms.clear()
+            results.setdefault(label, []).append(timed(at.run))
+            if fragment in fragment_ms:
+                results.setdefault(f"{label} (фрагмент)", []).append(fragment_ms[fragment])
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].message}")
+    return {label: statistics.median(values) for label, values in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--installations", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--before", help="Ревизия git со страницами для сравнения")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+    seed(args.installations)
+    timed_fragments()
+
+    print(f"Установок: {args.installations}")
+    print(f"{'страница':<22} {'перезапуск':<36} {'до, мс':>10} {'после, мс':>10}")
+    for page in PAGES:
+        before = {}
+        if args.before:
+            script = os.path.join(tmp.name, page)
+            with open(script, "w", encoding="utf-8") as f:
+                f.write(subprocess.run(
+                    ["git", "-C", ROOT, "show", f"{args.before}:app/pages/{page}"],
+                    check=True, capture_output=True, text=True,
+                ).stdout)
+            before = measure(script, page, args.repeat)
+        after = measure(os.path.join(APP, "pages", page), page, args.repeat)
+        for label in dict.fromkeys([*after, *before]):
+            old = f"{before[label]:.0f}" if label in before else "-"
+            new = f"{after[label]:.0f}" if label in after else "-"
+            print(f"{page:<22} {label:<36} {old:>10} {new:>10}")
+
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
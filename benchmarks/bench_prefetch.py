@@ -0,0 +1,118 @@
+"""
+Загрузка данных страницы Журнал замен: запросы по очереди в одной сессии против
+одновременной предзагрузки (core.utils.prefetch - пул потоков, у каждого запроса
+своя короткая сессия). Выводится время каждого запроса, их сумма и ожидание.
+
+Запуск:
+    python benchmarks/bench_prefetch.py [--replacements 20000] [--repeat 5]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+# Данные страницы Журнал замен (pages/4_Replacements.py)
+LOADERS = {
+    "replacement_types": lambda s: s.replacement_types.list(),
+    "parts_count": lambda s: s.parts.count(),
+    "equipment_count": lambda s: s.equipment.count(),
+    "workshops_count": lambda s: s.workshops.count(),
+    "replacement_rows": lambda s: s.replacements.list_rows(),
+    "open_replacements": lambda s: s.replacements.list_rows(replacement_date=None),
+    "history_rows": lambda s: s.replacements.history_rows(None),
+}
+
+
+def seed(n_replacements):
+    from core.db import SessionLocal, init_db
+    from core.models import Replacements
+    from core.services import ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshop_id = services.workshops.create(name="Мастерская", addr="-").id
+    equipment_ids = [e.id for e in services.equipment.create_many(
+        [{"name": f"Оборудование {i}", "available_units": 5} for i in range(20)]
+    )]
+    parts = [(p.id, p.parent_equipment_id) for p in services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment_ids[i % 20], "useful_life_days": 365,
+         "qty_per_unit": 1, "qty_in_stock": 0, "lead_time_days": 30}
+        for i in range(300)
+    ])]
+    today = date.today()
+    services.replacements.create_many([
+        {"part_id": part_id, "equipment_id": equipment_id, "unit_serial_number": f"SN{i}",
+         "workshop_id": workshop_id, "replacement_type_id": 1,
+         "installation_date": today - timedelta(days=400 + i % 300),
+         "replacement_date": today - timedelta(days=i % 300) if i % 4 else None}
+        for i in range(n_replacements)
+        for part_id, equipment_id in [parts[i % len(parts)]]
+    ])
+    db.close()
+
+
+def sequential():
+    from core.db import SessionLocal
+    from core.services import ServiceContainer
+
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    timings = {}
+    started = time.perf_counter()
+    for name, loader in LOADERS.items():
+        query_started = time.perf_counter()
+        loader(services)
+        timings[name] = time.perf_counter() - query_started
+    elapsed = time.perf_counter() - started
+    db.close()
+    return timings, elapsed
+
+
+def concurrent():
+    from core.utils import prefetch
+
+    prefetched = prefetch(**LOADERS)
+    return prefetched.timings, prefetched.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replacements", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+    seed(args.replacements)
+
+    results = {}
+    for label, run in (("по очереди", sequential), ("prefetch", concurrent)):
+        run()  # прогрев: соединения пула, кэш страниц SQLite
+        runs = [run() for _ in range(args.repeat)]
+        results[label] = (
+            {name: statistics.median(timings[name] for timings, _ in runs) for name in LOADERS},
+            statistics.median(elapsed for _, elapsed in runs),
+        )
+
+    print(f"Записей журнала: {args.replacements}, медианы по {args.repeat} запускам, мс")
+    print(f"{'запрос':<20} " + " ".join(f"{label:>12}" for label in results))
+    for name in LOADERS:
+        print(f"{name:<20} " + " ".join(f"{timings[name] * 1000:>12.1f}" for timings, _ in results.values()))
+    print(f"{'сумма запросов':<20} " + " ".join(f"{sum(timings.values()) * 1000:>12.1f}" for timings, _ in results.values()))
+    print(f"{'ожидание':<20} " + " ".join(f"{elapsed * 1000:>12.1f}" for _, elapsed in results.values()))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Стоимость плана закупок в зависимости от фильтров: полный пересчёт износа по всем
+незаменённым установкам с фильтрацией в pandas (прежний plan()) против запроса к
+zone_transition, где фильтры по оборудованию, зонам и горизонту, сортировка и
+LIMIT выполняются в SQL (services.procurement.plan).
+
+Запуск:
+    python benchmarks/bench_procurement_plan.py [--installations 2000 20000] [--repeat 5]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+N_EQUIPMENT = 50
+N_PARTS = 500
+
+
+def per_call_ms(repeat, fn):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def full_recompute(services, equipment_id=None, critical=False):
+    """Прежний путь: износ и даты плана по всему парку, затем фильтры в pandas."""
+    from core.zones import plan_frame
+
+    frame = plan_frame(services.replacements.open_installations_frame(), calendars=services.procurement.calendars())
+    if equipment_id is not None:
+        frame = frame[frame["equipment_id"] == equipment_id]
+    if critical:
+        frame = frame[frame["zone"] != "green"]
+    return frame.sort_values("init_ordinal", kind="stable").to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--installations", type=int, nargs="+", default=[2000, 20000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from core.db import SessionLocal, init_db
+    from core.models import Replacements
+    from core.services import CRITICAL_ZONES, ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    rng = random.Random(1)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshop_id = services.workshops.create(name="Мастерская", addr="-").id
+    equipment_ids = [e.id for e in services.equipment.create_many(
+        [{"name": f"Оборудование {i}", "available_units": 5} for i in range(N_EQUIPMENT)]
+    )]
+    parts = [(p.id, p.parent_equipment_id) for p in services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment_ids[i % N_EQUIPMENT],
+         "useful_life_days": rng.randint(60, 720), "qty_per_unit": 1, "qty_in_stock": rng.randint(0, 3),
+         "lead_time_days": rng.randint(5, 60)}
+        for i in range(N_PARTS)
+    ])]
+
+    scenarios = (
+        ("без фильтров", {}, {}),
+        ("оборудование", {"equipment_id": equipment_ids[0]}, {"equipment_id": equipment_ids[0]}),
+        ("критичные", {"critical": True}, {"zones": CRITICAL_ZONES}),
+        ("оборудование + критичные", {"equipment_id": equipment_ids[0], "critical": True},
+         {"equipment_id": equipment_ids[0], "zones": CRITICAL_ZONES}),
+        ("горизонт 30 дней, 50 строк", None, {"horizon": 30, "limit": 50}),
+    )
+
+    print(f"{'установок':>10} {'сценарий':<28} {'строк':>7} {'пересчёт':>10} {'SQL':>8}  мс")
+    created = 0
+    for size in sorted(args.installations):
+        services.replacements.create_many([
+            {"part_id": part_id, "equipment_id": equipment_id, "unit_serial_number": f"SN{i}",
+             "workshop_id": workshop_id, "replacement_type_id": 1,
+             "installation_date": date.today() - timedelta(days=rng.randint(0, 700))}
+            for i in range(created, size)
+            for part_id, equipment_id in [parts[i % N_PARTS]]
+        ])
+        created = size
+        db.expunge_all()
+
+        for label, old_kwargs, new_kwargs in scenarios:
+            rows = len(services.procurement.plan(**new_kwargs))
+            new = per_call_ms(args.repeat, lambda: services.procurement.plan(**new_kwargs))
+            old = "-" if old_kwargs is None else f"{per_call_ms(args.repeat, lambda: full_recompute(services, **old_kwargs)):.1f}"
+            print(f"{size:>10} {label:<28} {rows:>7} {old:>10} {new:>8.1f}")
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Чтение списка журнала замен: ORM-объекты против строк только для чтения и Arrow.
+
+Запуск:
+    python benchmarks/bench_read_models.py [--rows 1000000]
+
+Для каждого способа замеряется время и (отдельным проходом, tracemalloc) пиковая
+память. ORM-вариант дополнительно подгружает названия связанных записей, как это
+делали страницы. Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+SEED_BATCH_SIZE = 50_000
+
+
+def measure(label, rows, fn, reset):
+    reset()
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+
+    reset()
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    print(f"{label:<40} {elapsed:8.3f} с  {rows / elapsed:10.0f} строк/с  пик {peak / 2**20:8.1f} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from sqlalchemy import insert
+
+    from core.db import SessionLocal, init_db
+    from core.models import ReplacementLog, Replacements
+    from core.services import ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    for replacement_type in Replacements:
+        services.replacement_types.create(name=replacement_type)
+    workshops = services.workshops.create_many([{"name": f"Мастерская {i}", "addr": "-"} for i in range(5)])
+    equipment = services.equipment.create_many([
+        {"name": f"Оборудование {i}", "available_units": 10} for i in range(10)
+    ])
+    parts = services.parts.create_many([
+        {"name": f"Запчасть {i}", "parent_equipment_id": equipment[i % len(equipment)].id,
+         "useful_life_days": 365, "qty_per_unit": 1, "qty_in_stock": 1, "lead_time_days": 30}
+        for i in range(100)
+    ])
+
+    n = args.rows
+    today = date.today()
+    for first in range(0, n, SEED_BATCH_SIZE):
+        db.execute(insert(ReplacementLog), [
+            {
+                "part_id": parts[i % len(parts)].id,
+                "equipment_id": parts[i % len(parts)].parent_equipment_id,
+                "unit_serial_number": f"SN{i}",
+                "workshop_id": workshops[i % len(workshops)].id,
+                "replacement_type_id": 1 + i % len(Replacements),
+                "installation_date": today - timedelta(days=i % 1000),
+                "replacement_date": today if i % 3 == 0 else None,
+            }
+            for i in range(first, min(first + SEED_BATCH_SIZE, n))
+        ])
+    db.commit()
+
+    def orm_with_names():
+        replacements = services.replacements.list()
+        return [
+            (r.id, r.part.name, r.equipment.name, r.workshop.name, r.replacement_type.name.value)
+            for r in replacements
+        ]
+
+    print(f"Строк: {n}")
+    measure("list(): ORM-объекты", n, services.replacements.list, db.expunge_all)
+    measure("list() + названия через связи", n, orm_with_names, db.expunge_all)
+    measure("list_rows(): строки с join", n, services.replacements.list_rows, db.expunge_all)
+    measure("arrow(): pyarrow.Table", n, services.replacements.arrow, db.expunge_all)
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Расписание замен по мастерским (core/scheduler.py) на квартал: время жадного
+прохода EDF и локального поиска и что поиск даёт (стоимость, переводы в чужие
+мастерские, замены раньше срока) при разной загрузке мастерских.
+
+Задания генерируются без БД: отказы равномерно на горизонте (и часть уже
+просроченных), у части запчастей нет запаса - они поступают позже.
+
+Запуск:
+    python benchmarks/bench_scheduler.py [--jobs 5000 20000] [--workshops 30] [--load 0.7 1.0 1.2]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+# Доля уже просроченных заданий и заданий без складского запаса
+OVERDUE_SHARE = 0.05
+NO_STOCK_SHARE = 0.3
+
+
+def make_jobs(n_jobs: int, n_workshops: int, start: date, horizon_days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    first = start.toordinal()
+    failure = first + rng.integers(0, horizon_days, n_jobs)
+    overdue = rng.random(n_jobs) < OVERDUE_SHARE
+    failure[overdue] = first - rng.integers(1, 30, int(overdue.sum()))
+    available = np.full(n_jobs, first)
+    no_stock = rng.random(n_jobs) < NO_STOCK_SHARE
+    # Без запаса запчасть поступает в пределах месяца до отказа или позже
+    available[no_stock] = failure[no_stock] + rng.integers(-30, 10, int(no_stock.sum()))
+    return pd.DataFrame({
+        "replacement_id": np.arange(1, n_jobs + 1),
+        "part_id": np.arange(1, n_jobs + 1),
+        "part_name": "Запчасть",
+        "equipment_id": 1,
+        "equipment_name": "Оборудование",
+        "unit_serial_number": "SN",
+        "workshop_id": rng.integers(1, n_workshops + 1, n_jobs),
+        "failure_ordinal": failure,
+        "available_ordinal": available,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[5000, 20000])
+    parser.add_argument("--workshops", type=int, default=30)
+    parser.add_argument("--load", type=float, nargs="+", default=[0.7, 1.0, 1.2],
+                        help="Заданий на место мастерских за горизонт")
+    args = parser.parse_args()
+
+    from core.scheduler import DEFAULT_HORIZON_DAYS, ReplacementScheduler, work_days
+
+    start = date.today()
+    n_days = len(work_days(start, date.fromordinal(start.toordinal() + DEFAULT_HORIZON_DAYS - 1)))
+    print(f"Горизонт {DEFAULT_HORIZON_DAYS} дней ({n_days} рабочих), мастерских: {args.workshops}")
+    print(f"{'заданий':>8} {'загрузка':>8} {'EDF, мс':>8} {'поиск, мс':>10} {'стоимость EDF':>14} "
+          f"{'после поиска':>13} {'переводы':>15} {'дней до отказа':>15} {'без места':>10}")
+    for n_jobs in args.jobs:
+        jobs = make_jobs(n_jobs, args.workshops, start, DEFAULT_HORIZON_DAYS)
+        for load in args.load:
+            capacity = max(1, round(n_jobs / load / n_days / args.workshops))
+            workshops = pd.DataFrame({
+                "id": np.arange(1, args.workshops + 1),
+                "name": [f"Мастерская {i}" for i in range(1, args.workshops + 1)],
+                "daily_capacity": capacity,
+            })
+            scheduler = ReplacementScheduler(jobs, workshops, start=start)
+            greedy = scheduler.run(improve=False).summary
+            begin = time.perf_counter()
+            improved = scheduler.run(improve=True).summary
+            elapsed = (time.perf_counter() - begin) * 1000
+            print(f"{n_jobs:>8} {load:>8.1f} {greedy['greedy_ms']:>8.0f} {improved['improve_ms']:>10.0f} "
+                  f"{greedy['cost']:>14} {improved['cost']:>13} "
+                  f"{greedy['transfers']:>6} -> {improved['transfers']:<6} "
+                  f"{greedy['days_early_mean']:>6.1f} -> {improved['days_early_mean']:<6.1f} "
+                  f"{improved['unscheduled']:>10}   (всего {elapsed:.0f} мс)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Стоимость вариантов для поля выбора запчасти: полный справочник (parts.list())
+против поиска по началу названия (parts.search) и поиска текущего значения по id
+(parts.option) - в зависимости от размера справочника.
+
+Запуск:
+    python benchmarks/bench_selectors.py [--sizes 1000 10000 50000] [--repeat 20]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+PREFIXES = ("", "подшипник 1", "фильтр 25", "ремень")
+NAMES = ("Подшипник", "Фильтр", "Ремень", "Уплотнение", "Насос")
+
+
+def per_call_ms(repeat, fn):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "bench.db")
+
+    from core.db import SessionLocal, init_db
+    from core.services import ServiceContainer
+
+    init_db()
+    db = SessionLocal()
+    services = ServiceContainer(db)
+    equipment_id = services.equipment.create(name="Оборудование", available_units=10).id
+
+    print(f"{'запчастей':>10} {'list()':>10} {'search()':>10} {'option()':>10}  мс на отрисовку поля")
+    created = 0
+    for size in sorted(args.sizes):
+        services.parts.create_many([
+            {"name": f"{NAMES[i % len(NAMES)]} {i}", "parent_equipment_id": equipment_id, "useful_life_days": 365,
+             "qty_per_unit": 1, "qty_in_stock": 0, "lead_time_days": 30}
+            for i in range(created, size)
+        ])
+        created = size
+        db.expunge_all()
+
+        def full_list():
+            services.parts.list()
+            db.expunge_all()
+
+        full = per_call_ms(args.repeat, full_list)
+        search = per_call_ms(args.repeat, lambda: [services.parts.search(prefix) for prefix in PREFIXES]) / len(PREFIXES)
+        option = per_call_ms(args.repeat, lambda: services.parts.option(size // 2))
+        print(f"{size:>10} {full:>10.2f} {search:>10.2f} {option:>10.2f}")
+
+    db.close()
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Стоимость отрисовки таблицы плана закупок в зависимости от числа строк: весь
+кадр через Styler.applymap (раскраска каждой ячейки) против paged_table
+(core/tables.py: pyarrow.Table, сортировка и страница на сервере, раскраска
+только видимой страницы). Замер - выполнение скрипта в AppTest, включая
+сериализацию таблицы для браузера. Styler по умолчанию отказывается раскрашивать
+больше styler.render.max_elements ячеек - такой замер выводится как "ошибка".
+
+Запуск:
+    python benchmarks/bench_tables.py [--rows 1000 10000 50000] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+
+def make_table(n_rows):
+    from datetime import date, timedelta
+
+    import numpy as np
+    import pyarrow as pa
+
+    rng = np.random.default_rng(1)
+    start = date.today()
+    return pa.table({
+        "part_name": [f"Запчасть {i % 500}" for i in range(n_rows)],
+        "equipment_name": [f"Оборудование {i % 50}" for i in range(n_rows)],
+        "remaining_days": rng.integers(0, 700, n_rows),
+        "zone": np.array(["green", "yellow", "red"])[rng.integers(0, 3, n_rows)],
+        "qty_in_stock": rng.integers(0, 4, n_rows),
+        "latest_init_date": pa.array([start + timedelta(days=int(d)) for d in rng.integers(0, 700, n_rows)]),
+    })
+
+
+def styled_full(table):
+    import streamlit as st
+
+    def color_zone(val):
+        return {'green': 'background-color: #90EE90', 'yellow': 'background-color: #FFD700',
+                'red': 'background-color: #FF6B6B'}.get(val, '')
+
+    def color_stock(val):
+        return 'background-color: #FFB6C1' if val == 0 else ''
+
+    df = table.to_pandas()
+    st.dataframe(df.style.applymap(color_zone, subset=['zone']).applymap(color_stock, subset=['qty_in_stock']),
+                 use_container_width=True, hide_index=True)
+
+
+def paged(table):
+    from core.tables import no_stock_style, paged_table, zone_style
+
+    paged_table(table, key="bench", styles={'zone': zone_style, 'qty_in_stock': no_stock_style})
+
+
+def run_ms(script, table, repeat):
+    """Медиана времени выполнения скрипта, мс; None - скрипт завершился ошибкой."""
+    from streamlit.testing.v1 import AppTest
+
+    times = []
+    for _ in range(repeat):
+        at = AppTest.from_function(script, args=(table,), default_timeout=600)
+        start = time.perf_counter()
+        at.run()
+        times.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            return None
+    return statistics.median(times)
+
+
+def format_ms(value):
+    return "ошибка" if value is None else f"{value:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'строк':>8} {'Styler, мс':>12} {'paged_table, мс':>16}")
+    for n_rows in args.rows:
+        table = make_table(n_rows)
+        styled = format_ms(run_ms(styled_full, table, args.repeat))
+        print(f"{n_rows:>8} {styled:>12} {format_ms(run_ms(paged, table, args.repeat)):>16}")
+
+
+if __name__ == "__main__":
+    main()
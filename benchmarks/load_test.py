@@ -0,0 +1,459 @@
+"""
+Нагрузочный тест: N одновременных сессий браузера проходят типичные сценарии
+работы - открывают Dashboard и фильтруют таблицу, фильтруют План закупок и
+листают его, добавляют замену через форму журнала замен.
+
+Каждая сессия - отдельный поток со своим streamlit.testing.v1.AppTest (своё
+session_state, переходы между страницами - switch_page), все сессии работают в
+одном процессе с общими кэшами (st.cache_data, st.cache_resource) и одной БД, как
+сессии реального сервера Streamlit. Отчёт: задержки перезапусков p50/p95/p99 по
+шагам и в целом, пропускная способность (перезапусков в секунду), время записи в
+БД с ожиданием блокировок SQLite и ошибки "database is locked", прирост RSS
+процесса в расчёте на сессию.
+
+Данные генерируются детерминированно (seed из bench_page_reruns), шаги сценария
+и паузы между ними зависят только от --seed, поэтому прогоны разных версий
+сравнимы: --output сохраняет результаты с параметрами и версиями окружения в JSON,
+--compare печатает изменения относительно сохранённого прогона.
+
+Запуск:
+    python benchmarks/load_test.py [--sessions 8] [--iterations 3] [--installations 5000]
+        [--think-ms 0] [--seed 1] [--output results.json] [--compare baseline.json]
+
+Используется временная БД (PARTS_JOURNAL_DB), рабочая БД не затрагивается.
+Режим групповой фиксации включается как у приложения: PARTS_JOURNAL_WRITE_BEHIND=1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app")
+sys.path.insert(0, APP)
+
+DASHBOARD = "pages/1_Dashboard.py"
+PLAN = "pages/5_ProcurementPlan.py"
+REPLACEMENTS = "pages/4_Replacements.py"
+# Метрики сводки, которые сравниваются с --compare: (путь в JSON, подпись)
+SUMMARY_METRICS = (
+    (("overall", "p50"), "перезапуск p50, мс"),
+    (("overall", "p95"), "перезапуск p95, мс"),
+    (("overall", "p99"), "перезапуск p99, мс"),
+    (("throughput",), "перезапусков в секунду"),
+    (("db", "write_p95"), "запись в БД p95, мс"),
+    (("db", "write_max"), "запись в БД max, мс"),
+    (("db", "locked_errors"), "ошибок database is locked"),
+    (("rss", "per_session_mb"), "RSS на сессию, МБ"),
+)
+
+
+def shared_runtime():
+    """
+    Готовит AppTest к запуску из нескольких потоков.
+
+    AppTest.run на время каждого перезапуска подменяет глобальный Runtime._instance
+    и параметры конфигурации, а после - сбрасывает их, поэтому одновременные
+    перезапуски мешают друг другу. Здесь подмена выполняется один раз на процесс:
+    общий Runtime с общим хранилищем кэшей (как у сервера Streamlit), флаг
+    global.appTest выставлен заранее, а AppTest получает заглушки вместо Runtime и
+    patch_config_options. Кэш байт-кода скриптов тоже общий, как у сервера: AppTest
+    компилирует скрипт при каждом перезапуске, а ast.parse в Python 3.11 падает при
+    одновременном вызове из нескольких потоков.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    class RuntimeStub:
+        _instance = None
+
+    app_test.Runtime = RuntimeStub
+    app_test.patch_config_options = lambda options: contextlib.nullcontext()
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+    config.set_option("global.appTest", True)
+
+
+class DbMonitor:
+    """
+    Время записи в БД по событиям SQLAlchemy: выполнение INSERT/UPDATE/DELETE и
+    фиксация транзакции. SQLite ждёт освобождения блокировки внутри этих вызовов
+    (busy timeout), поэтому их время включает ожидание других сессий; ошибки
+    "database is locked" (ожидание дольше busy timeout) считаются отдельно.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.writes_ms = []
+        self.commits_ms = []
+        self.locked_errors = 0
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+
+        from core.db import engine
+
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+        event.listen(engine, "commit", self.before_commit)
+        event.listen(Session, "after_commit", self.after_commit)
+        event.listen(engine, "handle_error", self.handle_error)
+
+    def before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.local.execute_start = time.perf_counter()
+
+    def after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(self.local, "execute_start", None)
+        if start is not None and statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            with self.lock:
+                self.writes_ms.append((time.perf_counter() - start) * 1000)
+
+    def before_commit(self, conn):
+        self.local.commit_start = time.perf_counter()
+
+    def after_commit(self, session):
+        start = getattr(self.local, "commit_start", None)
+        if start is not None:
+            self.local.commit_start = None
+            with self.lock:
+                self.commits_ms.append((time.perf_counter() - start) * 1000)
+
+    def handle_error(self, context):
+        if "database is locked" in str(context.original_exception):
+            with self.lock:
+                self.locked_errors += 1
+
+    def summary(self) -> dict:
+        writes = self.writes_ms + self.commits_ms
+        return {
+            "statements": len(self.writes_ms),
+            "commits": len(self.commits_ms),
+            "write_p50": percentile(writes, 50),
+            "write_p95": percentile(writes, 95),
+            "write_max": max(writes, default=0.0),
+            "write_total_s": sum(writes) / 1000,
+            "commit_p95": percentile(self.commits_ms, 95),
+            "locked_errors": self.locked_errors,
+        }
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса, МБ (Linux - /proc, иначе - пиковый RSS из resource)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2 ** 20 if sys.platform == "darwin" else maxrss / 2 ** 10
+
+
+class RssMonitor(threading.Thread):
+    """Пиковый RSS процесса за время теста (опрос каждые interval секунд)."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self) -> float:
+        self.stopped.set()
+        self.join()
+        return max(self.peak, rss_mb())
+
+
+def percentile(values, p) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+
+
+def latency_summary(values) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": statistics.fmean(values) if values else 0.0,
+    }
+
+
+def first_option(service_name, prefix):
+    """Первая запись справочника, найденная по началу названия (как в search_select)."""
+    from core.db import SessionLocal
+    from core.services import ServiceContainer
+
+    with SessionLocal() as db:
+        return getattr(ServiceContainer(db), service_name).search(prefix, limit=1)[0]
+
+
+class Session:
+    """Одна сессия браузера: AppTest главной страницы, шаги сценария и их задержки."""
+
+    def __init__(self, number, seed, think_ms, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.rng = random.Random(seed * 1000 + number)
+        self.think_ms = think_ms
+        self.at = AppTest.from_file(os.path.join(APP, "main.py"), default_timeout=timeout)
+        self.latencies = {}
+        self.errors = []
+        self.added = 0
+
+    def step(self, name, action=None):
+        """Действие над виджетами и перезапуск страницы; время перезапуска записывается в шаг name."""
+        if self.think_ms:
+            time.sleep(self.rng.expovariate(1 / self.think_ms) / 1000)
+        try:
+            if action is not None:
+                action(self.at)
+            start = time.perf_counter()
+            self.at.run()
+            self.latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            self.errors.append(f"{name}: {type(e).__name__}: {e}")
+            return
+        if self.at.exception:
+            self.errors.append(f"{name}: {self.at.exception[0].message}")
+
+    def open(self, name, page):
+        self.step(name, lambda at: at.switch_page(page))
+
+    def dashboard(self):
+        self.open("dashboard.open", DASHBOARD)
+        zones = self.rng.choice((["red"], ["yellow", "red"], ["green", "yellow", "red"]))
+        self.step("dashboard.filter", lambda at: at.multiselect(key="dashboard_detail_zones").set_value(zones))
+
+    def plan(self):
+        self.open("plan.open", PLAN)
+
+        def toggle_critical(at):
+            checkbox = next(c for c in at.checkbox if c.label.startswith("Показать только критичные"))
+            checkbox.set_value(not checkbox.value)
+
+        self.step("plan.critical", toggle_critical)
+        prefix = f"оборудование {self.rng.randrange(10)}"
+        self.step("plan.search", lambda at: at.text_input(key="plan_filter_equipment_search").set_value(prefix))
+        # Selectbox с format_func принимает значение, а не подпись: первая находка поиска
+        equipment = first_option("equipment", prefix)
+        self.step("plan.equipment", lambda at: at.selectbox(key="plan_filter_equipment").set_value(equipment))
+        self.step("plan.page", lambda at: at.number_input(key="plan_table_page").increment())
+
+    def add_replacement(self):
+        self.open("replacements.open", REPLACEMENTS)
+        prefix = f"запчасть {self.rng.randrange(100)}"
+        self.step("replacements.search", lambda at: at.text_input(key="new_replacement_part_search").set_value(prefix))
+        self.added += 1
+        serial = f"LT{self.number}-{self.added}"
+
+        def fill_form(at):
+            next(t for t in at.text_input if t.label.startswith("Серийный номер")).set_value(serial)
+            # На складе может не быть запчасти - замена вносится без списания
+            next(c for c in at.checkbox if c.label == "Списать запчасть со склада").uncheck()
+            next(b for b in at.button if b.label == "Добавить замену").click()
+
+        self.step("replacements.add", fill_form)
+        errors = [e.value for e in self.at.error]
+        if errors:
+            self.errors.append(f"replacements.add: {errors[0]}")
+
+    def run(self, iterations, barrier):
+        self.step("main.open")
+        barrier.wait()
+        for _ in range(iterations):
+            self.dashboard()
+            self.plan()
+            self.add_replacement()
+
+
+def environment() -> dict:
+    import sqlalchemy
+    import streamlit
+
+    try:
+        revision = subprocess.run(
+            ["git", "-C", ROOT, "describe", "--always", "--dirty"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "sqlalchemy": sqlalchemy.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "write_behind": os.environ.get("PARTS_JOURNAL_WRITE_BEHIND") == "1",
+    }
+
+
+def run_load_test(args) -> dict:
+    import streamlit as st
+    from streamlit.logger import set_log_level
+
+    shared_runtime()
+    # Предупреждения Streamlit о запуске вне сервера повторяются на каждом перезапуске
+    set_log_level("error")
+    db_monitor = DbMonitor()
+    db_monitor.install()
+
+    # Прогрев: первая отрисовка страниц (импорт, компиляция скриптов) не входит в замеры
+    warmup = Session(-1, args.seed, 0, args.timeout)
+    warmup.step("main.open")
+    for page in (DASHBOARD, PLAN, REPLACEMENTS):
+        warmup.open("warmup", page)
+    if warmup.errors:
+        raise RuntimeError(f"Ошибка прогрева: {warmup.errors[0]}")
+    st.cache_data.clear()
+    db_monitor.reset()
+
+    sessions = [Session(i, args.seed, args.think_ms, args.timeout) for i in range(args.sessions)]
+    barrier = threading.Barrier(args.sessions + 1)
+    threads = [threading.Thread(target=s.run, args=(args.iterations, barrier), name=f"session-{s.number}")
+               for s in sessions]
+    rss_before = rss_mb()
+    rss_monitor = RssMonitor()
+    rss_monitor.start()
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_peak = rss_monitor.stop()
+
+    steps = {}
+    for session in sessions:
+        for name, values in session.latencies.items():
+            if name != "main.open":
+                steps.setdefault(name, []).extend(values)
+    reruns = [value for values in steps.values() for value in values]
+    return {
+        "config": {
+            "sessions": args.sessions,
+            "iterations": args.iterations,
+            "installations": args.installations,
+            "think_ms": args.think_ms,
+            "seed": args.seed,
+            "date": date.today().isoformat(),
+        },
+        "environment": environment(),
+        "elapsed_s": elapsed,
+        "reruns": len(reruns),
+        "throughput": len(reruns) / elapsed,
+        "overall": latency_summary(reruns),
+        "steps": {name: latency_summary(values) for name, values in steps.items()},
+        "db": db_monitor.summary(),
+        "rss": {
+            "before_mb": rss_before,
+            "peak_mb": rss_peak,
+            "per_session_mb": (rss_peak - rss_before) / args.sessions,
+        },
+        "errors": [error for session in sessions for error in session.errors],
+    }
+
+
+def print_report(results):
+    config = results["config"]
+    print(f"Сессий: {config['sessions']}, итераций: {config['iterations']}, "
+          f"установок: {config['installations']}, ревизия: {results['environment']['git_revision']}")
+    print(f"{'шаг':<22} {'n':>5} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for name, summary in [*results["steps"].items(), ("всего", results["overall"])]:
+        print(f"{name:<22} {summary['count']:>5} {summary['p50']:>9.0f} {summary['p95']:>9.0f} {summary['p99']:>9.0f}")
+    db = results["db"]
+    rss = results["rss"]
+    print(f"Пропускная способность: {results['throughput']:.1f} перезапусков/с за {results['elapsed_s']:.1f} с")
+    print(f"Запись в БД (с ожиданием блокировок): {db['statements']} запросов, {db['commits']} фиксаций, "
+          f"p50 {db['write_p50']:.1f} мс, p95 {db['write_p95']:.1f} мс, max {db['write_max']:.1f} мс, "
+          f"всего {db['write_total_s']:.2f} с; database is locked: {db['locked_errors']}")
+    print(f"RSS: {rss['before_mb']:.0f} -> {rss['peak_mb']:.0f} МБ, на сессию {rss['per_session_mb']:.1f} МБ")
+    if results["errors"]:
+        print(f"Ошибок: {len(results['errors'])}")
+        for error in results["errors"][:10]:
+            print(f"  {error}")
+
+
+def print_comparison(baseline, results):
+    if baseline["config"] != results["config"]:
+        print(f"Параметры прогонов различаются: {baseline['config']} и {results['config']}")
+    print(f"{'метрика':<30} {'база':>10} {'сейчас':>10} {'изменение':>10}")
+    print(f"{'ревизия':<30} {baseline['environment']['git_revision']!s:>10} "
+          f"{results['environment']['git_revision']!s:>10}")
+    for path, label in SUMMARY_METRICS:
+        old, new = baseline, results
+        for key in path:
+            old, new = old[key], new[key]
+        change = f"{(new - old) / old * 100:+.0f}%" if old else "-"
+        print(f"{label:<30} {old:>10.1f} {new:>10.1f} {change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--installations", type=int, default=5000)
+    parser.add_argument("--think-ms", type=float, default=0, help="Средняя пауза пользователя между шагами")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=600, help="Предельное время перезапуска, с")
+    parser.add_argument("--output", help="Файл JSON для результатов")
+    parser.add_argument("--compare", help="Файл JSON с результатами прошлого прогона")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["PARTS_JOURNAL_DB"] = os.path.join(tmp.name, "load.db")
+
+    from bench_page_reruns import seed
+
+    seed(args.installations)
+    results = run_load_test(args)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), results)
+
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()